@@ -0,0 +1,573 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Benchmarks.py
+	- Micro-benchmarks for the scan / probe / encode pipeline.
+	- Usage: python Benchmarks.py <name> [options]   (python Benchmarks.py -h for the list)
+	- Synthetic corpora are created in a temp dir and removed afterwards.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import random
+import threading
+import statistics
+import subprocess as sp
+
+from typing 	import Any, Callable, Dict, List
+from pathlib 	import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import Scan_cache
+import Scheduler
+import Media_walk
+import Probe_native
+
+BENCHES: Dict[str, Callable[[argparse.Namespace], None]] = {}
+
+def bench(name: str):
+	def deco(fn):
+		BENCHES[name] = fn
+		return fn
+	return deco
+
+def _timeit(fn: Callable[[], object], repeat: int) -> List[float]:
+	out = []
+	for _ in range(repeat):
+		t0 = time.perf_counter()
+		fn()
+		out.append(time.perf_counter() - t0)
+	return out
+
+def _fmt_ms(samples: List[float]) -> str:
+	return f"median {statistics.median(samples)*1000:8.2f} ms | min {min(samples)*1000:8.2f} ms"
+
+# =============================================================================
+# Fingerprint vs ffprobe spawn
+# =============================================================================
+
+@bench("fingerprint")
+def bench_fingerprint(args: argparse.Namespace) -> None:
+	"""Cost of Scan_cache.content_fingerprint versus one ffprobe process per file."""
+	tmp = Path(tempfile.mkdtemp(prefix="bench_fp_"))
+	try:
+		files = []
+		for i in range(args.files):
+			p = tmp / f"sample_{i:03d}.bin"
+			with p.open("wb") as f:
+				for _ in range(args.size_mb):
+					f.write(os.urandom(1024 * 1024))
+			files.append(p)
+
+		fp_t = _timeit(lambda: [Scan_cache.content_fingerprint(str(p)) for p in files], args.repeat)
+		per_file = [t / len(files) for t in fp_t]
+		print(f"Fingerprint ({len(files)} x {args.size_mb} MB): {_fmt_ms(per_file)} per file")
+
+		ffprobe = shutil.which("ffprobe")
+		if not ffprobe:
+			print("ffprobe not found: skipping the spawn comparison.")
+			return
+		cmd = lambda p: sp.run([ffprobe, "-v", "error", "-show_streams", "-show_format", "-of", "json", str(p)],
+							   stdout=sp.DEVNULL, stderr=sp.DEVNULL)
+		pr_t = _timeit(lambda: [cmd(p) for p in files], args.repeat)
+		per_probe = [t / len(files) for t in pr_t]
+		print(f"ffprobe spawn               : {_fmt_ms(per_probe)} per file")
+		print(f"Ratio ffprobe / fingerprint : {statistics.median(per_probe) / max(1e-9, statistics.median(per_file)):.1f}x")
+	finally:
+		shutil.rmtree(tmp, ignore_errors=True)
+
+# =============================================================================
+# Probe locality (seek model)
+# =============================================================================
+
+class _SeekDisk:
+	"""Single-head disk model: a read costs settle time plus a seek that grows with the head travel."""
+	def __init__(self, span: int, settle_ms: float = 0.5, full_seek_ms: float = 12.0):
+		self.span, self.settle, self.full = max(1, span), settle_ms / 1000, full_seek_ms / 1000
+		self.head = 0
+		self.lock = threading.Lock()
+
+	def read(self, pos: int) -> None:
+		with self.lock:
+			time.sleep(self.settle + self.full * (abs(pos - self.head) / self.span) ** 0.5)
+			self.head = pos
+
+@bench("probe-locality")
+def bench_probe_locality(args: argparse.Namespace) -> None:
+	"""Probes/s on a synthetic HDD corpus: walk order on the full pool vs Scheduler.ProbeScheduler."""
+	rng = random.Random(1)
+	n, folders = args.probes, max(1, args.probes // 25)
+	inodes = list(range(1, n + 1))
+	rng.shuffle(inodes)				# Files were copied in a different order than their names sort
+	corpus = [Media_walk.MediaEntry(f"/lib/d{i % folders:03d}/f{i:05d}.mkv", 1, 0, ino, 1)
+			  for i, ino in enumerate(inodes)]
+	parse_s = args.parse_ms / 1000
+
+	def probe(disk: _SeekDisk, e) -> None:
+		disk.read(e.ino)				# Header read
+		time.sleep(parse_s)				# ffprobe start-up + parsing (CPU, not on the disk)
+
+	def run_pool() -> None:
+		disk = _SeekDisk(n)
+		with ThreadPoolExecutor(max_workers=args.workers) as ex:
+			list(ex.map(lambda e: probe(disk, e), corpus))
+
+	def run_sched() -> None:
+		disk = _SeekDisk(n)
+		with Scheduler.ProbeScheduler(args.workers, args.hdd_lanes, rotational=True) as sched:
+			for e in corpus:
+				sched.submit(e, probe, disk, e)
+
+	print(f"Seek model: {n} probes, {folders} folders, {args.workers} workers, {args.parse_ms} ms parse per probe")
+	for label, fn in (("before: walk order, full pool", run_pool),
+					  (f"after : inode order, {args.hdd_lanes} lane(s)", run_sched)):
+		t = statistics.median(_timeit(fn, args.repeat))
+		print(f"  {label:<32}: {n / t:8.1f} probes/s  ({t:6.2f} s)")
+
+# =============================================================================
+# Native header parser vs ffprobe
+# =============================================================================
+
+_NATIVE_SAMPLES = [		# (file name, ffmpeg output options)
+	("h264_aac_sub.mp4",   ["-c:v", "libx264", "-c:a", "aac", "-c:s", "mov_text", "-metadata", "comment=bench"]),
+	("hevc10_aac.mp4",     ["-c:v", "libx265", "-pix_fmt", "yuv420p10le", "-c:a", "aac", "-ac", "6", "-tag:v", "hvc1"]),
+	("h264_ac3_srt.mkv",   ["-c:v", "libx264", "-c:a", "ac3", "-c:s", "srt"]),
+	("hevc_eac3.mkv",      ["-c:v", "libx265", "-c:a", "eac3"]),
+	("h264_aac_frag.mp4",  ["-c:v", "libx264", "-c:a", "aac", "-movflags", "frag_keyframe+empty_moov"]),
+]
+_COMPARE_STREAM = ("codec_type", "codec_name", "width", "height", "pix_fmt", "avg_frame_rate", "channels", "sample_rate")
+
+@bench("probe-native")
+def bench_probe_native(args: argparse.Namespace) -> None:
+	"""Probe_native.probe vs one ffprobe process on generated MP4 / Matroska files (and a field check)."""
+	ffmpeg = shutil.which("ffmpeg")
+	if not ffmpeg:
+		print("ffmpeg not found: can't generate the test files.")
+		return
+	tmp = Path(tempfile.mkdtemp(prefix="bench_native_"))
+	try:
+		srt = tmp / "s.srt"
+		srt.write_text("1\n00:00:00,000 --> 00:00:01,000\nHello\n\n", encoding="utf-8")
+		files = []
+		for name, opts in _NATIVE_SAMPLES:
+			out = tmp / name
+			src = ["-f", "lavfi", "-i", "testsrc2=size=640x360:rate=24000/1001", "-f", "lavfi", "-i", "sine=r=48000"]
+			maps = ["-map", "0", "-map", "1"]
+			if "-c:s" in opts:
+				src += ["-i", str(srt)]
+				maps += ["-map", "2"]
+			r = sp.run([ffmpeg, "-v", "error", "-y", *src, "-t", "2", *maps, *opts, str(out)], stderr=sp.PIPE)
+			if r.returncode == 0: files.append(out)
+			else: print(f"  skipped {name}: {r.stderr.decode(errors='replace').strip()[:80]}")
+		files = files * max(1, args.files // max(1, len(files)))
+
+		native = {str(p): Probe_native.probe(str(p)) for p in files}
+		hits = sum(v is not None for v in native.values())
+		print(f"Native parser handled {hits}/{len(native)} files (the rest fall back to ffprobe)")
+		nt = _timeit(lambda: [Probe_native.probe(str(p)) for p in files], args.repeat)
+		print(f"Native probe                : {_fmt_ms([t / len(files) for t in nt])} per file")
+
+		ffprobe = shutil.which("ffprobe")
+		if not ffprobe:
+			# Lower bound: an ffmpeg process that only opens the input and prints its header
+			st = _timeit(lambda: [sp.run([ffmpeg, "-hide_banner", "-i", str(p)], stdout=sp.DEVNULL, stderr=sp.DEVNULL)
+								  for p in files], args.repeat)
+			print(f"ffmpeg -i spawn (no ffprobe): {_fmt_ms([t / len(files) for t in st])} per file")
+			print(f"Speed-up (lower bound)      : {statistics.median(st) / max(1e-9, statistics.median(nt)):.1f}x")
+			print("ffprobe not found: skipping the field check.")
+			return
+		cmd = lambda p: sp.run([ffprobe, "-v", "error", "-show_streams", "-show_format", "-of", "json", str(p)],
+							   stdout=sp.PIPE, stderr=sp.DEVNULL).stdout
+		pt = _timeit(lambda: [json.loads(cmd(p)) for p in files], args.repeat)
+		print(f"ffprobe + json.loads        : {_fmt_ms([t / len(files) for t in pt])} per file")
+		print(f"Speed-up                    : {statistics.median(pt) / max(1e-9, statistics.median(nt)):.1f}x")
+
+		mismatches = 0
+		for path, mine in native.items():
+			if mine is None: continue
+			ref = json.loads(cmd(path))
+			if len(ref["streams"]) != len(mine["streams"]):
+				print(f"  {Path(path).name}: {len(mine['streams'])} streams vs ffprobe {len(ref['streams'])}")
+				mismatches += 1
+				continue
+			for a, b in zip(mine["streams"], ref["streams"]):
+				for k in _COMPARE_STREAM:
+					if k in b and str(a.get(k)) != str(b[k]):
+						print(f"  {Path(path).name} #{b['index']} {k}: {a.get(k)} vs ffprobe {b[k]}")
+						mismatches += 1
+			if abs(float(mine["format"]["duration"]) - float(ref["format"].get("duration", 0))) > 0.05:
+				print(f"  {Path(path).name} duration: {mine['format']['duration']} vs ffprobe {ref['format'].get('duration')}")
+				mismatches += 1
+		print(f"Field check: {mismatches} mismatch(es)")
+	finally:
+		shutil.rmtree(tmp, ignore_errors=True)
+
+# =============================================================================
+# Scale mode memory: legacy file list vs File_table
+# =============================================================================
+
+def _fake_metadata(i: int) -> Dict:
+	"""ffprobe-shaped metadata of a typical 1 video + 2 audio + 1 subtitle file."""
+	return {
+		"format": {"filename": f"/media/Show {i % 97}/file_{i:07d}.mkv", "duration": "2580.123000",
+				   "size": str(1_500_000_000 + i), "bit_rate": "4650123", "format_name": "matroska,webm",
+				   "tags": {"title": f"Episode {i}", "encoder": "libebml v1.4.2 + libmatroska v1.6.4"}},
+		"streams": [
+			{"index": 0, "codec_type": "video", "codec_name": "hevc", "width": 1920, "height": 1080,
+			 "pix_fmt": "yuv420p10le", "avg_frame_rate": "24000/1001", "bit_rate": "4000000",
+			 "disposition": {"default": 1, "attached_pic": 0}, "tags": {"language": "und"}},
+			*({"index": k, "codec_type": "audio", "codec_name": "eac3", "channels": 6, "sample_rate": "48000",
+			   "bit_rate": "640000", "disposition": {"default": int(k == 1)}, "tags": {"language": lang}}
+			  for k, lang in ((1, "eng"), (2, "fre"))),
+			{"index": 3, "codec_type": "subtitle", "codec_name": "subrip",
+			 "disposition": {"default": 0, "forced": 0}, "tags": {"language": "eng"}},
+		],
+	}
+
+def _memory_child(mode: str, count: int) -> None:
+	"""Runs in a fresh interpreter: builds the file list and prints peak RSS (KB) as JSON."""
+	import File_table
+	t0 = time.perf_counter()
+	if mode == "legacy":
+		files = []
+		for i in range(count):
+			path = f"/media/Show {i % 97}/file_{i:07d}.mkv"
+			files.append({"path": path, "name": os.path.basename(path), "size": 1_500_000_000 + i,
+						  "date": None, "duration": 2580.123, "metadata": _fake_metadata(i)})
+	else:
+		files = File_table.FileTable()
+		for i in range(count):
+			files.append(f"/media/Show {i % 97}/file_{i:07d}.mkv", 1_500_000_000 + i, 1_600_000_000.5 + i,
+						 2580.123, File_table.F_LAZY)
+		files.sort([("size", True)])
+	took = time.perf_counter() - t0
+	try:
+		import resource
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		peak = peak // 1024 if sys.platform == "darwin" else peak		# macOS reports bytes
+	except ImportError:
+		import psutil
+		peak = psutil.Process().memory_info().peak_wset // 1024
+	print(json.dumps({"peak_kb": peak, "seconds": took}))
+
+@bench("memory")
+def bench_memory(args: argparse.Namespace) -> None:
+	"""Peak RSS of the Trans_code file list: list of dicts with metadata vs scale mode's FileTable."""
+	here = os.path.dirname(os.path.abspath(__file__))
+	def run(mode: str, count: int) -> Dict:
+		code = f"import Benchmarks; Benchmarks._memory_child({mode!r}, {count})"
+		r = sp.run([sys.executable, "-c", code], cwd=here, stdout=sp.PIPE, text=True, check=True)
+		return json.loads(r.stdout)
+	base = run("table", 0)["peak_kb"]
+	print(f"Interpreter baseline: {base / 1024:.1f} MB")
+	for count in args.counts:
+		for mode in ("legacy", "table"):
+			if mode == "legacy" and count > args.legacy_max:
+				print(f"  {count:>9,} {mode:<6}: skipped (> --legacy-max)")
+				continue
+			res = run(mode, count)
+			grown = max(0, res["peak_kb"] - base) * 1024
+			print(f"  {count:>9,} {mode:<6}: peak {res['peak_kb'] / 1024:8.1f} MB | {grown / max(1, count):8.0f} B/file"
+				  f" | build {res['seconds']:6.2f} s")
+
+# =============================================================================
+# Encode CPU budget vs one default-threaded encoder per worker
+# =============================================================================
+
+@bench("encode-budget")
+def bench_encode_budget(args: argparse.Namespace) -> None:
+	"""Aggregate libx265 fps: MAX_WORKERS-style default-threaded jobs vs Scheduler.CpuBudget sized jobs."""
+	ffmpeg = shutil.which("ffmpeg")
+	if not ffmpeg:
+		print("ffmpeg not found.")
+		return
+	cpus = args.cpus or os.cpu_count() or 4
+	jobs = args.jobs or max(1, int(cpus * 0.6))
+	tmp = Path(tempfile.mkdtemp(prefix="bench_enc_"))
+	try:
+		clips = []		# (path, width, height, frames)
+		for spec in args.mix.split(","):
+			size, _, count = spec.partition(":")
+			w, h = (int(x) for x in size.lower().split("x"))
+			src = tmp / f"src_{w}x{h}.mkv"
+			sp.run([ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate=25",
+					"-t", str(args.seconds), "-c:v", "libx264", "-preset", "ultrafast", "-qp", "0", str(src)], check=True)
+			clips += [(src, w, h, int(args.seconds * 25))] * int(count or 1)
+		frames = sum(c[3] for c in clips)
+		print(f"{len(clips)} clip(s), {frames} frames, {cpus} CPU(s), {jobs} concurrent job(s) max")
+
+		def encode(path: Path, threads: int) -> None:
+			limits = ["-threads", str(threads)] if threads else []
+			params = f"log-level=error:{Scheduler.x265_params(threads)}" if threads else "log-level=error"
+			sp.run([ffmpeg, "-v", "error", "-y", "-i", str(path), "-c:v", "libx265", "-preset", args.preset,
+					*limits, "-x265-params", params, "-f", "null", "-"], check=True)
+
+		def run(budgeted: bool) -> float:
+			budget = Scheduler.CpuBudget(cpus)
+			def job(clip):
+				path, w, h, _ = clip
+				if not budgeted:
+					return encode(path, 0)
+				with budget.hold(Scheduler.encode_threads(w, h, cpus)) as n:
+					encode(path, n)
+			t0 = time.perf_counter()
+			with ThreadPoolExecutor(max_workers=jobs) as ex:
+				list(ex.map(job, clips))
+			return time.perf_counter() - t0
+
+		for label, budgeted in (("default threads x MAX_WORKERS", False), ("CPU budget (threads / pools)", True)):
+			t = statistics.median(run(budgeted) for _ in range(args.repeat))
+			print(f"  {label:<32}: {frames / t:8.1f} fps aggregate  ({t:6.2f} s)")
+	finally:
+		shutil.rmtree(tmp, ignore_errors=True)
+
+# =============================================================================
+# Job order: size-first vs savings per CPU-second (projection, no encodes)
+# =============================================================================
+
+# name -> (container, video codec, WxH, fps, video bps, audio codec, channels, audio bps, minutes)
+_LIBRARY_KINDS = {
+	"remux": (".mkv", "hevc", (1920, 1080), 23.976, 2_000_000, "aac", 2, 160_000, 120),		# Efficient HEVC, wrong container
+	"h264":  (".mkv", "h264", (1920, 1080), 23.976, 9_000_000, "ac3", 6, 640_000, 130),		# Big 1080p H.264 rips
+	"mpeg2": (".mpg", "mpeg2video", (720, 576), 25.0, 8_000_000, "mp2", 2, 256_000, 45),	# Bloated SD captures
+	"audio": (".mp4", "hevc", (1920, 1080), 23.976, 2_500_000, "dts", 6, 1_536_000, 100),	# HEVC with DTS audio
+}
+
+def _library_metadata(kind: str) -> Dict:
+	ext, vcodec, (w, h), fps, vbr, acodec, ch, abr, minutes = _LIBRARY_KINDS[kind]
+	dur = minutes * 60.0
+	return {
+		"duration": dur, "bitrate": vbr + abr, "size": int((vbr + abr) * dur / 8), "format_tags": {},
+		"streams": [
+			{"index": 0, "codec_type": "video", "codec_name": vcodec, "width": w, "height": h,
+			 "avg_frame_rate": f"{round(fps * 1000)}/1000", "pix_fmt": "yuv420p", "disposition": {}},
+			{"index": 1, "codec_type": "audio", "codec_name": acodec, "channels": ch, "bit_rate": str(abr)},
+		],
+	}
+
+@bench("job-order")
+def bench_job_order(args: argparse.Namespace) -> None:
+	"""Projected GB saved over time for a synthetic library: size-first vs Scheduler.priority order."""
+	import FFMpeg
+	jobs = []
+	for spec in args.library.split(","):
+		kind, _, count = spec.partition(":")
+		meta = _library_metadata(kind)
+		jobs += [FFMpeg.estimate_job(f"x{_LIBRARY_KINDS[kind][0]}", meta)] * int(count or 1)
+	by_size = sorted(jobs, key=lambda e: e.size, reverse=True)
+	by_gain = sorted(jobs, key=Scheduler.priority, reverse=True)
+	print(Scheduler.order_report(by_size, by_gain, args.cpus or os.cpu_count() or 4))
+
+# =============================================================================
+# Resumable encode: kill mid-job, rerun, compare with a one-piece encode
+# =============================================================================
+
+def _resume_child(src: str, dest: str, resume: bool, chunk_s: int) -> None:
+	"""Runs in a fresh interpreter: plans and encodes src like Trans_code, copies the result to dest."""
+	import FFMpeg
+	import Chunk_encode
+	import Trans_code
+	Chunk_encode.RESUME_ENCODES, Chunk_encode.RESUME_MIN_DURATION_S = resume, 0
+	Chunk_encode.CHUNK_ENCODE, Chunk_encode.CHUNK_SECONDS = False, chunk_s
+	meta, _, err = FFMpeg.ffprobe_run(src, FFMpeg.FFPROBE, False, False)
+	cmd, skip, _ = FFMpeg.parse_finfo(src, meta, False)
+	out = Trans_code._encode(src, cmd, meta.duration, "T1", 0)
+	if out: shutil.copyfile(out, dest)
+	print(json.dumps({"ok": bool(out)}))
+
+def _layout(path: str) -> List[tuple]:
+	data = Probe_native.probe(path) or {"streams": []}
+	return [(s.get("codec_type"), s.get("codec_name"), s.get("width"), s.get("height"), s.get("channels"))
+			for s in data["streams"]]
+
+def resume_check(tmp: Path, seconds: float, chunk_s: int, kill_after: int = 1,
+				size: str = "640x360", gop: int = 48) -> Dict[str, Any]:
+	"""Encodes a synthetic clip chunked + resumable, kills the process tree once kill_after chunks are
+	checkpointed, reruns it, and encodes it once more in one piece -> what bench / tests compare."""
+	import psutil
+	import Chunk_encode
+	ffmpeg = shutil.which("ffmpeg")
+	here = os.path.dirname(os.path.abspath(__file__))
+	env = dict(os.environ, ONE_TRANS_WORK_DIR=str(tmp / "work"))		# RESUME_DIR lives under WORK_DIR
+	src = tmp / "src.mkv"
+	sp.run([ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=24000/1001",
+			"-f", "lavfi", "-i", "sine=r=48000", "-t", str(seconds), "-map", "0", "-map", "1",
+			"-c:v", "libx264", "-preset", "ultrafast", "-qp", "0", "-g", str(gop), "-c:a", "ac3", str(src)],
+		   check=True)		# Lossless source: the size guard never refuses the re-encode
+	def child(dest: Path, resume: bool) -> sp.Popen:
+		code = f"import Benchmarks; Benchmarks._resume_child({str(src)!r}, {str(dest)!r}, {resume}, {chunk_s})"
+		return sp.Popen([sys.executable, "-c", code], cwd=here, env=env, stdout=sp.PIPE, stderr=sp.STDOUT, text=True)
+	def checkpoints() -> int:
+		return len(list((tmp / "work").glob("__resume/*/enc_*.ok")))
+	out: Dict[str, Any] = {}
+
+	# 1. Start, and kill the whole process tree (ffmpeg included) once chunks are checkpointed
+	p = child(tmp / "killed.mp4", True)
+	t0 = time.perf_counter()
+	while p.poll() is None and checkpoints() < kill_after:
+		time.sleep(0.1)
+	try:
+		parent = psutil.Process(p.pid)
+		procs = parent.children(recursive=True) + [parent]
+	except psutil.NoSuchProcess:
+		procs = []		# Finished before the kill: nothing was interrupted
+	for c in procs:
+		try: c.kill()
+		except psutil.Error: pass
+	p.communicate()
+	out["killed"] = p.returncode is not None and p.returncode < 0
+	out["kill_s"] = time.perf_counter() - t0
+	out["checkpointed"] = checkpoints()
+
+	# 2. Rerun: must pick up the checkpointed chunks
+	t0 = time.perf_counter()
+	log = child(tmp / "resumed.mp4", True).communicate()[0]
+	out["resume_s"] = time.perf_counter() - t0
+	out["resume_log"] = next((l.split("Chunked encode:")[-1].strip() for l in log.splitlines() if "Chunked encode:" in l), "")
+
+	# 3. Reference: one-piece encode
+	child(tmp / "single.mp4", False).communicate()
+	files = {"resumed": tmp / "resumed.mp4", "single": tmp / "single.mp4"}
+	out["missing"] = [k for k, f in files.items() if not f.exists()]
+	if out["missing"]:
+		return out
+	out["durations"] = {k: float((Probe_native.probe(str(f)) or {"format": {"duration": 0}})["format"]["duration"])
+						for k, f in files.items()}
+	out["frames"] = {k: Chunk_encode.count_frames(str(f)) for k, f in dict(source=src, **files).items()}
+	out["layouts"] = {k: _layout(str(f)) for k, f in files.items()}
+	return out
+
+@bench("resume")
+def bench_resume(args: argparse.Namespace) -> None:
+	"""Kills a resumable chunked encode mid-job, reruns it, and checks it against a one-piece encode."""
+	if not shutil.which("ffmpeg"):
+		print("ffmpeg not found.")
+		return
+	tmp = Path(tempfile.mkdtemp(prefix="bench_resume_"))
+	try:
+		r = resume_check(tmp, args.resume_s, args.chunk_s, args.kill_after)
+		if r["killed"]:
+			print(f"Killed after {r['kill_s']:.1f} s with {r['checkpointed']} chunk(s) checkpointed")
+		else:
+			print(f"Finished in {r['kill_s']:.1f} s before the kill: use a longer --resume-s or a smaller --chunk-s")
+		print(f"Resumed run ({r['resume_s']:.1f} s): {r['resume_log']}")
+		if r["missing"]:
+			print(f"FAILED: missing output(s): {', '.join(r['missing'])}")
+			return
+		durs, frames, layouts = r["durations"], r["frames"], r["layouts"]
+		same_layout = layouts["resumed"] == layouts["single"]
+		print(f"Duration  resumed {durs['resumed']:.3f} s | single {durs['single']:.3f} s")
+		print(f"Frames    source {frames['source']} | resumed {frames['resumed']} | single {frames['single']}")
+		print(f"Layout    {'same' if same_layout else 'DIFFERENT'}: {layouts['resumed']}")
+		ok = (r["killed"] and same_layout and frames["source"] == frames["resumed"] == frames["single"]
+			  and abs(durs["resumed"] - durs["single"]) <= 0.1)
+		print("PASS" if ok else "FAIL")
+	finally:
+		shutil.rmtree(tmp, ignore_errors=True)
+
+# =============================================================================
+# MP4 output layout: bytes written and tail latency
+# =============================================================================
+
+def _layout_job(cmd: List[str]) -> Dict[str, float]:
+	"""Runs one ffmpeg with -progress -> wall time, tail latency (last progress sample to exit), bytes read / written."""
+	p = sp.Popen(cmd + ["-progress", "pipe:1", "-stats_period", "0.1"], stdout=sp.PIPE, stderr=sp.DEVNULL, text=True)
+	t0 = last = time.perf_counter()
+	for line in p.stdout:
+		if line.strip() == "progress=continue":
+			last = time.perf_counter()
+	io = {}
+	if sys.platform.startswith("linux"):
+		os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOWAIT)		# Exited but not reaped: its /proc io totals are still there
+		with open(f"/proc/{p.pid}/io") as f:
+			io = dict((k, int(v)) for k, v in (l.split(":") for l in f))
+	end = time.perf_counter()
+	p.wait()
+	return {"rc": p.returncode, "wall": end - t0, "tail": end - last, "read": io.get("rchar", 0), "written": io.get("wchar", 0)}
+
+@bench("output-layout")
+def bench_output_layout(args: argparse.Namespace) -> None:
+	"""Remuxes one source to MP4 in each OUTPUT_LAYOUT: bytes written per job and the stall after the last frame."""
+	import FFMpeg
+	ffmpeg = shutil.which("ffmpeg")
+	if not ffmpeg:
+		print("ffmpeg not found.")
+		return
+	tmp = Path(tempfile.mkdtemp(prefix="bench_layout_"))
+	try:
+		src = Path(args.src) if args.src else tmp / "src.mkv"
+		if not args.src:
+			kbps = int(args.size_mb * 8 * 1024 / args.layout_s)
+			sp.run([ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30",
+					"-f", "lavfi", "-i", "sine=r=48000", "-t", str(args.layout_s), "-map", "0", "-map", "1",
+					"-c:v", "libx264", "-preset", "ultrafast", "-b:v", f"{kbps}k", "-minrate", f"{kbps}k", "-maxrate", f"{kbps}k",
+					"-bufsize", f"{kbps}k", "-x264-params", "nal-hrd=cbr", "-c:a", "aac", str(src)], check=True)
+		data = Probe_native.probe(str(src))
+		if not data:
+			print(f"Can't probe {src}.")
+			return
+		dur = float(data["format"]["duration"])
+		reserve = FFMpeg.moov_reserve(data["streams"], dur)
+		FFMpeg.srik_update(str(src), plan={"moov_reserve": reserve})
+		size = src.stat().st_size
+		print(f"Source {src.name}: {size / 2**20:.1f} MB, {dur:.0f} s, {len(data['streams'])} stream(s), moov reserve {reserve / 1024:.0f} KB")
+		print(f"{'layout':<11}| {'written/job':>12} | {'x output':>8} | {'read/job':>10} | {'wall':>8} | {'tail':>8} | moov")
+		for layout in ("faststart", "reserve", "fragmented", "end"):
+			out = tmp / f"{layout}.mp4"
+			cmd = [ffmpeg, "-v", "error", "-y", "-i", str(src), "-map", "0", "-c", "copy"] + FFMpeg.output_layout(str(src), layout) + [str(out)]
+			runs = []
+			for _ in range(args.repeat):
+				runs.append(_layout_job(cmd))
+				os.sync()
+			if any(r["rc"] for r in runs):
+				print(f"{layout:<11}| FAILED (exit {runs[-1]['rc']})")
+				continue
+			med = {k: statistics.median(r[k] for r in runs) for k in ("written", "read", "wall", "tail")}
+			with open(out, "rb") as f:
+				f.seek(int.from_bytes(f.read(4), "big") + 4)		# The box after ftyp
+				second = f.read(4)
+			print(f"{layout:<11}| {med['written'] / 2**20:9.1f} MB | {med['written'] / out.stat().st_size:7.2f}x | "
+				  f"{med['read'] / 2**20:7.1f} MB | {med['wall']:6.2f} s | {med['tail']:6.2f} s | "
+				  f"{'front' if second == b'moov' and layout != 'fragmented' else layout if layout == 'fragmented' else 'end'}")
+			out.unlink()
+	finally:
+		shutil.rmtree(tmp, ignore_errors=True)
+
+# =============================================================================
+# Main
+# =============================================================================
+
+def main(argv=None) -> int:
+	ap = argparse.ArgumentParser(description="Scan / probe / encode micro-benchmarks")
+	ap.add_argument("name", choices=sorted(BENCHES), help="benchmark to run")
+	ap.add_argument("--files", type=int, default=20, help="synthetic files to create")
+	ap.add_argument("--size-mb", type=int, default=32, help="size of each synthetic file (MB)")
+	ap.add_argument("--repeat", type=int, default=3, help="repetitions per measurement")
+	ap.add_argument("--probes", type=int, default=400, help="probe-locality: synthetic files to probe")
+	ap.add_argument("--workers", type=int, default=8, help="probe-locality: probe pool size")
+	ap.add_argument("--hdd-lanes", type=int, default=2, help="probe-locality: lanes per spinning disk")
+	ap.add_argument("--parse-ms", type=float, default=3.0, help="probe-locality: CPU time per probe (ms)")
+	ap.add_argument("--counts", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="memory: file counts")
+	ap.add_argument("--legacy-max", type=int, default=1_000_000, help="memory: largest count for the legacy list")
+	ap.add_argument("--mix", default="1280x720:6,1920x1080:2,3840x2160:1", help="encode-budget: WxH:count clips")
+	ap.add_argument("--seconds", type=float, default=2.0, help="encode-budget: clip length")
+	ap.add_argument("--preset", default="medium", help="encode-budget: libx265 preset")
+	ap.add_argument("--cpus", type=int, default=0, help="encode-budget / job-order: CPU budget (default: all cores)")
+	ap.add_argument("--jobs", type=int, default=0, help="encode-budget: max concurrent jobs (default: 0.6 x cores)")
+	ap.add_argument("--library", default="remux:20,h264:40,mpeg2:200,audio:30", help="job-order: kind:count (remux, h264, mpeg2, audio)")
+	ap.add_argument("--resume-s", type=float, default=40.0, help="resume: clip length (s)")
+	ap.add_argument("--chunk-s", type=int, default=8, help="resume: chunk length (s)")
+	ap.add_argument("--src", default="", help="output-layout: source to remux (default: a synthetic --size-mb clip)")
+	ap.add_argument("--layout-s", type=float, default=120.0, help="output-layout: synthetic clip length (s)")
+	ap.add_argument("--kill-after", type=int, default=1, help="resume: kill once this many chunks are done")
+	args = ap.parse_args(argv)
+	BENCHES[args.name](args)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
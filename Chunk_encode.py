@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Chunk_encode.py
+	- Chunked parallel encode of one long file: the video stream is split at keyframes (stream copy,
+	  segment muxer), the chunks are encoded in parallel, joined with the concat demuxer, and audio /
+	  subtitles are muxed back in one final pass that copies the joined video.
+	- RESUME_ENCODES: finished chunks are checkpointed in a persistent job dir (RESUME_DIR, keyed by the
+	  source fingerprint + planned command, preset aside), so a rerun after a crash / kill continues where it stopped.
+	- Every boundary is checked: chunk frame counts must add up to the source, each encoded chunk must
+	  keep its frame count, and the result must match the source duration. Any mismatch -> None
+	  (the caller falls back to a normal single-process encode).
+"""
+import os
+import json
+import math
+import time
+import random
+import shutil
+import hashlib
+import subprocess as sp
+
+from pathlib 				import Path
+from contextlib 			import nullcontext
+from typing 				import Dict, List, Optional, Tuple
+from concurrent.futures 	import ThreadPoolExecutor
+
+from Utils 					import *
+
+import FFMpeg
+import Staging
+import Scheduler
+import Scan_cache
+
+# =============================================================================
+# 1. PLAN
+# =============================================================================
+
+def video_args(input_file: str) -> Optional[List[str]]:
+	"""The planned video arguments (parse_finfo's SRIK plan) if the file can be chunked, else None.
+
+	Only one software-encoded video stream qualifies; copies and hardware encoders don't.
+	"""
+	v_cmd = (FFMpeg.srik_get(input_file) or {}).get("plan", {}).get("video") or []
+	if v_cmd.count("-map") != 1 or "libx265" not in v_cmd:
+		return None
+	return v_cmd
+
+def wants_chunks(input_file: str, duration: float) -> bool:
+	"""Chunked path: parallel chunks for long files, and / or resumable checkpoints (RESUME_ENCODES)."""
+	long_file = ((CHUNK_ENCODE and duration >= CHUNK_MIN_DURATION_S)
+				 or (RESUME_ENCODES and duration >= RESUME_MIN_DURATION_S))
+	return long_file and video_args(input_file) is not None
+
+def chunk_times(duration: float, workers: int) -> List[float]:
+	"""Requested cut points (the segment muxer moves each one to the next keyframe)."""
+	n = max(workers, math.ceil(duration / max(1, CHUNK_SECONDS)))
+	return [round(duration * i / n, 3) for i in range(1, n)]
+
+# =============================================================================
+# 2. HELPERS
+# =============================================================================
+
+def _run(cmd: List[str], capture: bool = False) -> Tuple[int, str]:
+	"""Runs a tracked ffmpeg process -> (returncode, stdout if capture else stderr tail)."""
+	p = FFMpeg._popen_managed(cmd, stdout=sp.PIPE if capture else sp.DEVNULL, stderr=sp.PIPE, text=True)
+	try:
+		out, err = p.communicate()
+	finally:
+		FFMpeg.PROC_MGR.unregister(p)
+	return p.returncode, (out if capture else err[-500:])
+
+def count_frames(path: str) -> int:
+	"""Video packets in a file (stream copy to framecrc: no decode). -1 on error."""
+	rc, out = _run([FFMPEG, "-v", "error", "-i", path, "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"], capture=True)
+	if rc != 0:
+		return -1
+	return sum(1 for line in out.splitlines() if line and not line.startswith("#"))
+
+def _concat_line(path: Path) -> str:
+	return "file '" + str(path).replace("'", "'\\''") + "'\n"
+
+def final_cmd(planned: List[str], v_cmd: List[str], concat_list: Path) -> List[str]:
+	"""The planned command with its video arguments replaced by a copy of the joined chunks."""
+	for pos in range(len(planned) - len(v_cmd) + 1):
+		if planned[pos:pos + len(v_cmd)] == v_cmd:
+			break
+	else:
+		raise ValueError("planned command does not contain its video arguments")
+	head = planned[:pos]
+	k = head.count("-i")		# Index the concat input gets (after the source and any sidecar inputs)
+	return (head + ["-f", "concat", "-safe", "0", "-i", str(concat_list)]
+			+ ["-map", f"{k}:0", "-c:v:0", "copy"] + planned[pos + len(v_cmd):])
+
+# =============================================================================
+# 3. RESUME STATE
+# =============================================================================
+
+def job_dir(input_file: str, cmd: List[str]) -> Optional[Path]:
+	"""Persistent work dir for one encode: keyed by the source content fingerprint and the planned command.
+
+	The x265 preset is left out: --until / --budget may swap it between runs, and the rerun must still
+	find its chunks (chunk_encode keeps encoding them on the preset the manifest recorded).
+	"""
+	fp = Scan_cache.content_fingerprint(input_file)
+	if not fp:
+		return None
+	key = list(cmd)
+	if "-preset" in key:
+		key[key.index("-preset") + 1] = ""
+	return RESUME_DIR / hashlib.sha1("\0".join([fp, *key]).encode("utf-8", "surrogateescape")).hexdigest()[:20]
+
+def _write_json(path: Path, data: Dict) -> None:
+	tmp = path.with_suffix(".tmp")
+	tmp.write_text(json.dumps(data), encoding="utf-8")
+	os.replace(tmp, path)		# A crash leaves the old file or the new one, never half of it
+
+def _read_json(path: Path) -> Optional[Dict]:
+	try:
+		return json.loads(path.read_text(encoding="utf-8"))
+	except (OSError, ValueError):
+		return None
+
+def prune_resume_dirs(max_age_days: float = RESUME_KEEP_DAYS) -> int:
+	"""Deletes resume dirs untouched for max_age_days (sources changed or jobs abandoned)."""
+	if not RESUME_DIR.exists():
+		return 0
+	cutoff, removed = time.time() - max_age_days * 86400, 0
+	for d in RESUME_DIR.iterdir():
+		try:
+			if d.is_dir() and max((f.stat().st_mtime for f in d.rglob("*")), default=d.stat().st_mtime) < cutoff:
+				shutil.rmtree(d, ignore_errors=True)
+				removed += 1
+		except OSError:
+			continue
+	return removed
+
+# =============================================================================
+# 4. CHUNKED ENCODE
+# =============================================================================
+
+def _split(input_file: str, v_map: str, times: List[float], split_dir: Path) -> Tuple[List[Path], str]:
+	"""Video-only stream copy into keyframe-aligned chunks -> (chunk files, error text)."""
+	shutil.rmtree(split_dir, ignore_errors=True)
+	split_dir.mkdir(parents=True)
+	rc, err = _run([FFMPEG, "-v", "error", "-y", "-i", input_file, "-map", v_map,
+					"-c", "copy", "-f", "segment", "-segment_times", ",".join(map(str, times)),
+					"-reset_timestamps", "1", "-segment_format", "matroska", str(split_dir / "src_%04d.mkv")])
+	return (sorted(split_dir.glob("src_*.mkv")) if rc == 0 else []), err
+
+def chunk_encode(
+	input_file: str,
+	cmd: List[str],
+	duration: float,
+	de_bug: bool,
+	task_id: str,
+	budget: Optional[Scheduler.CpuBudget] = None,
+	threads: int = 0,
+	local: Optional[str] = None
+) -> Optional[str]:
+	"""Encodes input_file in CHUNK_WORKERS parallel chunks; returns the temp output like ffmpeg_run, or None.
+
+	budget / threads: each chunk holds `threads` of the shared budget while it encodes
+	(threads 0: the cores are split evenly between the chunk workers instead).
+	RESUME_ENCODES: finished chunks are kept in a persistent job dir (job_dir), so a rerun after a
+	crash / kill only encodes the missing ones.
+	local: the source's staged copy (STAGING) to read instead of input_file; cmd stays the planned
+	command on input_file, so the resume key doesn't change with the per-run staging path.
+	"""
+	read = local or input_file
+	v_cmd = video_args(input_file)
+	if v_cmd is None:
+		return None
+	workers = max(1, CHUNK_WORKERS) if CHUNK_ENCODE else 1
+	if not threads:
+		threads, budget = max(1, (os.cpu_count() or 4) // workers), None
+	work = job_dir(input_file, cmd) if RESUME_ENCODES else None
+	keep = work is not None
+	if work is None:
+		work = RUN_TMP / f"chunks_{Path(input_file).stem}_{random.randint(1000, 9999)}"
+	work.mkdir(parents=True, exist_ok=True)
+	manifest_p = work / "manifest.json"
+	outs: List[Optional[str]] = []
+	ok = False
+	try:
+		# 1. Chunk layout: reuse the recorded cut points on resume so finished chunks stay valid
+		manifest = _read_json(manifest_p) if keep else None
+		times = manifest["times"] if manifest else chunk_times(duration, workers)
+		n_chunks = len(times) + 1
+		preset = v_cmd[v_cmd.index("-preset") + 1] if "-preset" in v_cmd else None
+		if manifest and manifest.get("preset") and manifest["preset"] != preset:
+			safe_print(f"   [{task_id}] Resuming on the recorded preset {manifest['preset']} (planned {preset})")
+			preset = manifest["preset"]		# One preset for every chunk of the file
+		done = {i for i in range(n_chunks)
+				if manifest and (work / f"enc_{i:04d}.ok").exists() and (work / f"enc_{i:04d}.mp4").exists()}
+
+		sources: List[Optional[Path]] = [None] * n_chunks
+		if len(done) < n_chunks:
+			# 2. Split the video stream at keyframes (no re-encode, exact frames)
+			split, err = _split(read, v_cmd[v_cmd.index("-map") + 1], times, work / "split")
+			if not split:
+				safe_print(f"   [{task_id}] Chunk split failed: {err.strip()[-200:]}")
+				return None
+			src_frames = [count_frames(str(p)) for p in split]
+			total = count_frames(read)
+			if min(src_frames) <= 0 or sum(src_frames) != total:
+				safe_print(f"   [{task_id}] Chunk split check failed: {sum(src_frames)} frames in chunks vs {total} in source")
+				return None
+			if manifest and (manifest["frames"] != src_frames or manifest["total"] != total):
+				safe_print(f"   [{task_id}] Resume state does not match the source: starting over")
+				for f in work.glob("enc_*"): f.unlink()
+				done = set()
+			sources = list(split)
+			manifest = {"source": input_file, "times": times, "frames": src_frames, "total": total, "preset": preset}
+			if keep: _write_json(manifest_p, manifest)
+		src_frames, total = manifest["frames"], manifest["total"]
+		resumed = f", {len(done)} already done" if done else ""
+		safe_print(f"   [{task_id}] Chunked encode: {n_chunks} chunk(s), {total} frames, "
+				   f"{workers} worker(s) x {threads} thread(s){resumed}")
+
+		# 3. Encode the missing chunks in parallel (the video arguments now read from input 0, stream 0)
+		chunk_v = list(v_cmd)
+		chunk_v[chunk_v.index("-map") + 1] = "0:0"
+		if preset:
+			chunk_v[chunk_v.index("-preset") + 1] = preset
+		def encode(i: int) -> bool:
+			src = str(sources[i])
+			if FFMpeg.srik_get(input_file).get("output", {}).get("not_worth"):
+				os.unlink(src)
+				return False		# Another chunk already tripped the size guard
+			c_cmd = [FFMPEG, "-y", "-hide_banner", "-i", src, *chunk_v, "-fps_mode", "passthrough"]
+			with (budget.hold(threads) if budget else nullcontext()):
+				out = FFMpeg.ffmpeg_run(src, c_cmd, duration * src_frames[i] / total, False, de_bug, f"{task_id}.{i + 1}", threads)
+			not_worth = FFMpeg.srik_get(src).get("output", {}).get("not_worth")
+			FFMpeg.srik_clear(src)
+			os.unlink(src)		# Free the temp space as soon as the chunk is done
+			if not_worth:		# Size guard tripped on this chunk's video: the whole file isn't worth it
+				FFMpeg.srik_update(input_file, output={"not_worth": f"{not_worth} in chunk {i + 1}"})
+			if not out:
+				return False
+			got = count_frames(out)
+			if got != src_frames[i]:
+				safe_print(f"   [{task_id}] Chunk {i + 1} check failed: {got} frames encoded vs {src_frames[i]} in source")
+				Path(out).unlink(missing_ok=True)
+				return False
+			# Checkpoint: the chunk is only "done" once its marker exists next to it
+			shutil.move(out, str(work / f"enc_{i:04d}.mp4"))
+			_write_json(work / f"enc_{i:04d}.ok", {"frames": got})
+			return True
+		todo = [i for i in range(n_chunks) if i not in done]
+		with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunk") as ex:
+			failed = list(ex.map(encode, todo)).count(False)
+		if failed:
+			kept = " (finished chunks kept for a rerun)" if keep else ""
+			safe_print(f"   [{task_id}] Chunk encode failed ({failed} of {len(todo)} chunk(s)){kept}")
+			return None
+
+		# 4. Join the chunks and mux audio / subtitles from the plan in one pass
+		concat = work / "concat.txt"
+		concat.write_text("".join(_concat_line(work / f"enc_{i:04d}.mp4") for i in range(n_chunks)), encoding="utf-8")
+		joined = final_cmd(Staging.with_input(cmd, input_file, read), v_cmd, concat)
+		result = FFMpeg.ffmpeg_run(input_file, joined, duration, False, de_bug, task_id)
+		if not result:
+			return None
+		outs.append(result)
+
+		# 5. Validate the joined result against the source
+		got = count_frames(result)
+		meta, _, _ = FFMpeg.ffprobe_run(result, FFMpeg.FFPROBE, de_bug, False)
+		out_dur = meta.duration if meta is not None else 0.0
+		if got != total or abs(out_dur - duration) > max(DURATION_TOLERANCE_ABS, DURATION_TOLERANCE_PCT * duration):
+			safe_print(f"   [{task_id}] Chunked result check failed: {got}/{total} frames, {hm_tm(out_dur)} vs {hm_tm(duration)}")
+			keep = False		# Don't resume from chunks that produced a bad result
+			return None
+		ok = True
+		return result
+	finally:
+		if not ok:
+			for o in outs: Path(o).unlink(missing_ok=True)
+		if keep and not ok:
+			shutil.rmtree(work / "split", ignore_errors=True)	# Finished chunks + manifest stay for the rerun
+		else:
+			shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Control.py
+	- Control channel for a running Trans_code batch: commands appended to CONTROL_FILE (one per
+	  line) are applied within CONTROL_POLL_S, without a restart and without losing encode progress.
+		drain			finish the running jobs, start no new ones (undrain takes it back)
+		pause / resume	freeze / thaw every managed ffmpeg (SIGSTOP / SIGCONT to its process group)
+		workers N		concurrent jobs (parallel mode, up to MAX_WORKERS_CAP)
+		bump PATH		start PATH next, ahead of the queue
+		status			write the state to the .status file next to CONTROL_FILE
+	- From another console: python Control.py drain | pause | resume | workers 3 | bump "D:\\x.mkv" | status
+"""
+import os
+import sys
+import json
+import time
+import threading
+
+from collections 	import deque
+from contextlib 	import contextmanager
+from pathlib 		import Path
+from typing 		import Deque, Iterator, List, Optional, Set
+
+from Utils 			import *
+
+import FFMpeg
+
+# =============================================================================
+# 1. WORKER SLOTS
+# =============================================================================
+
+class Slots:
+	"""Concurrency gate whose size can change while jobs hold it (shrinking waits for running jobs)."""
+	def __init__(self, limit: int):
+		self.limit = max(1, limit)
+		self.busy = 0
+		self._cond = threading.Condition()
+
+	def resize(self, limit: int) -> None:
+		with self._cond:
+			self.limit = max(1, limit)
+			self._cond.notify_all()
+
+	@contextmanager
+	def hold(self) -> Iterator[None]:
+		with self._cond:
+			while self.busy >= self.limit:
+				self._cond.wait()
+			self.busy += 1
+		try:
+			yield
+		finally:
+			with self._cond:
+				self.busy -= 1
+				self._cond.notify_all()
+
+# =============================================================================
+# 2. CONTROLLER
+# =============================================================================
+
+class Controller:
+	"""Watches the control file and applies its commands to the running batch."""
+	def __init__(self, path: Path, workers: int, max_workers: int, poll_s: float = 1.0):
+		self.path = Path(path)
+		self.status_path = self.path.with_suffix(".status")
+		self.poll_s = poll_s
+		self.max_workers = max(1, max_workers)
+		self.slots = Slots(min(workers, self.max_workers))
+		self.draining = threading.Event()
+		self._bumps: Deque[str] = deque()
+		self._bumped: Set[str] = set()
+		self._lock = threading.Lock()
+		self._stop = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+
+	def start(self) -> "Controller":
+		self._thread = threading.Thread(target=self._loop, name="control", daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self) -> None:
+		self._stop.set()
+		if self._thread:
+			self._thread.join()
+		if FFMpeg.PROC_MGR.paused:
+			FFMpeg.PROC_MGR.resume()
+
+	def _loop(self) -> None:
+		while not self._stop.wait(self.poll_s):
+			try:
+				self.poll()
+			except Exception as e:
+				safe_print(f"   [Warning] Control channel: {e}")
+
+	def poll(self) -> List[str]:
+		"""Takes the control file (renamed away first, so appends made meanwhile start a new one) and applies it."""
+		if not self.path.exists():
+			return []
+		taken = self.path.with_suffix(".taken")
+		try:
+			os.replace(self.path, taken)
+		except OSError:
+			return []		# Writer still has it open (Windows): next poll
+		try:
+			lines = taken.read_text(encoding="utf-8", errors="replace").splitlines()
+		finally:
+			taken.unlink(missing_ok=True)
+		out = [self.apply(line) for line in lines if line.strip() and not line.lstrip().startswith("#")]
+		for msg in out:
+			safe_print(f"\n🎛  Control: {msg}")
+		self.write_status()
+		return out
+
+	def apply(self, line: str) -> str:
+		cmd, _, arg = line.strip().partition(" ")
+		cmd, arg = cmd.lower(), arg.strip().strip('"')
+		if cmd == "drain":
+			self.draining.set()
+			return "draining: running jobs finish, no new ones start"
+		if cmd == "undrain":
+			self.draining.clear()
+			return "drain cancelled"
+		if cmd == "pause":
+			return f"paused {FFMpeg.PROC_MGR.pause()} ffmpeg process(es); new ones wait for resume"
+		if cmd == "resume":
+			return f"resumed {FFMpeg.PROC_MGR.resume()} ffmpeg process(es)"
+		if cmd == "workers":
+			try: n = int(arg)
+			except ValueError: return f"workers needs a number, got {arg!r}"
+			self.slots.resize(min(n, self.max_workers))
+			return f"workers: {self.slots.limit} (running {self.slots.busy}, max {self.max_workers})"
+		if cmd == "bump":
+			if not arg: return "bump needs a path"
+			path = os.path.abspath(arg)
+			with self._lock:
+				self._bumps.append(path)
+			return f"bumped to the front: {path}"
+		if cmd == "status":
+			return self.status()
+		return f"unknown command {line.strip()!r} (drain, undrain, pause, resume, workers N, bump PATH, status)"
+
+	def take_bump(self) -> Optional[str]:
+		"""Next bumped path not started yet (None when there is none)."""
+		with self._lock:
+			while self._bumps:
+				path = self._bumps.popleft()
+				if path not in self._bumped:
+					self._bumped.add(path)
+					return path
+		return None
+
+	def was_bumped(self, path: str) -> bool:
+		"""True if path already ran out of turn (the queue then skips it)."""
+		if not self._bumped:
+			return False
+		with self._lock:
+			return os.path.abspath(path) in self._bumped
+
+	def state(self) -> dict:
+		return {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "pid": os.getpid(), "draining": self.draining.is_set(),
+				"paused": FFMpeg.PROC_MGR.paused, "workers": self.slots.limit, "running": self.slots.busy,
+				"bumps_waiting": len(self._bumps)}
+
+	def status(self) -> str:
+		s = self.state()
+		return (f"{'draining' if s['draining'] else 'running'}{', paused' if s['paused'] else ''},"
+				f" workers {s['workers']} ({s['running']} busy), {s['bumps_waiting']} bump(s) waiting")
+
+	def write_status(self) -> None:
+		try:
+			self.status_path.write_text(json.dumps(self.state(), indent=1), encoding="utf-8")
+		except OSError:
+			pass
+
+CONTROL: Optional[Controller] = None		# Set by Trans_code.main (CONTROL_CHANNEL)
+
+def open_control(workers: int) -> Controller:
+	global CONTROL
+	CONTROL = Controller(CONTROL_FILE, workers, MAX_WORKERS_CAP, CONTROL_POLL_S).start()
+	CONTROL.write_status()
+	return CONTROL
+
+def close_control() -> None:
+	global CONTROL
+	if CONTROL is not None:
+		CONTROL.stop()
+		CONTROL.status_path.unlink(missing_ok=True)
+		CONTROL = None
+
+# =============================================================================
+# 3. COMMAND LINE
+# =============================================================================
+
+def send(command: str, path: Optional[Path] = None) -> None:
+	"""Appends one command for the running batch."""
+	with open(path or CONTROL_FILE, "a", encoding="utf-8") as f:
+		f.write(command.strip() + "\n")
+
+def main(argv: List[str]) -> int:
+	if not argv:
+		print(Rev)
+		return 2
+	status = Path(CONTROL_FILE).with_suffix(".status")
+	if not status.exists():
+		print(f"No running batch (no {status}).")
+		return 1
+	before = status.stat().st_mtime
+	send(" ".join(f'"{a}"' if " " in a else a for a in argv))
+	deadline = time.time() + 3 * CONTROL_POLL_S + 1
+	while time.time() < deadline:
+		time.sleep(0.2)
+		if status.exists() and status.stat().st_mtime != before:
+			print(status.read_text(encoding="utf-8"))
+			return 0
+	print("Sent; the batch has not picked it up yet.")
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
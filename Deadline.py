@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Deadline.py
+	- Maintenance-window mode for Trans_code (--until HH:MM / --budget 7h): each job's wall time is
+	  predicted from its resolution, duration and the encoder's measured speed, and only jobs that
+	  fit in what is left of the window are started.
+	- DEADLINE_DRAIN_S before the deadline no new job starts; running ones finish.
+	- When the queue is far behind the window, x265 drops to DEADLINE_FAST_PRESET.
+	- Encoder speed history (media seconds per wall second) persists in SPEED_HISTORY.
+"""
+import re
+import json
+import time
+import threading
+
+from pathlib 	import Path
+from datetime 	import datetime, timedelta
+from typing 	import Dict, List, Optional
+
+from Utils 		import *
+
+# x265 speed relative to "medium" (first guess until the history has a measurement for the preset)
+PRESET_SPEED = {"ultrafast": 6.0, "superfast": 5.0, "veryfast": 4.0, "faster": 3.0, "fast": 1.6,
+				"medium": 1.0, "slow": 0.5, "slower": 0.25, "veryslow": 0.1}
+HISTORY_ALPHA = 0.3		# Weight of the newest measurement in the running average
+
+# =============================================================================
+# 1. WINDOW PARSING
+# =============================================================================
+
+def parse_until(hhmm: str, now: Optional[datetime] = None) -> float:
+	"""'06:30' -> timestamp of the next 06:30 (tomorrow if that time has passed today)."""
+	now = now or datetime.now()
+	m = re.fullmatch(r"\s*(\d{1,2}):(\d{2})\s*", hhmm)
+	if not m or int(m[1]) > 23 or int(m[2]) > 59:
+		raise ValueError(f"--until expects HH:MM, got {hhmm!r}")
+	end = now.replace(hour=int(m[1]), minute=int(m[2]), second=0, microsecond=0)
+	if end <= now:
+		end += timedelta(days=1)
+	return end.timestamp()
+
+def parse_budget(text: str) -> float:
+	"""'7h', '90m', '1h30m', '45s' or plain seconds -> seconds."""
+	text = text.strip().lower()
+	if re.fullmatch(r"\d+(\.\d+)?", text):
+		return float(text)
+	parts = re.findall(r"(\d+(?:\.\d+)?)\s*([hms])", text)
+	if not parts or re.sub(r"(\d+(?:\.\d+)?)\s*([hms])", "", text).strip():
+		raise ValueError(f"--budget expects e.g. 7h, 90m or 1h30m, got {text!r}")
+	return sum(float(n) * {"h": 3600, "m": 60, "s": 1}[u] for n, u in parts)
+
+# =============================================================================
+# 2. SPEED HISTORY
+# =============================================================================
+
+def pixel_class(width: int, height: int) -> str:
+	px = width * height
+	if px <= 0: return "unknown"
+	if px <= 720 * 576: return "sd"
+	if px <= 1280 * 720: return "720p"
+	if px <= 1920 * 1088: return "1080p"
+	return "2160p"
+
+def cmd_preset(cmd: List[str]) -> str:
+	"""The -preset an encode command uses ('copy' when nothing is re-encoded as video)."""
+	if not any(x.startswith("-c:v") and i + 1 < len(cmd) and cmd[i + 1] != "copy" for i, x in enumerate(cmd)):
+		return "copy"
+	try: return cmd[cmd.index("-preset") + 1]
+	except (ValueError, IndexError): return "default"
+
+class SpeedHistory:
+	"""Running average of media seconds encoded per wall second, per encoder / preset / resolution class."""
+	def __init__(self, path: Path):
+		self.path = Path(path)
+		self._lock = threading.Lock()
+		try:
+			self._data: Dict[str, Dict[str, float]] = json.loads(self.path.read_text(encoding="utf-8"))
+		except (OSError, ValueError):
+			self._data = {}
+
+	@staticmethod
+	def key(encoder: str, preset: str, px_class: str) -> str:
+		return f"{encoder}|{preset}|{px_class}"
+
+	def speed(self, encoder: str, preset: str, px_class: str) -> Optional[float]:
+		"""Measured speed, or one derived from another preset of the same class; None when nothing is known."""
+		with self._lock:
+			rec = self._data.get(self.key(encoder, preset, px_class))
+			if rec:
+				return rec["speed"]
+			for other, factor in PRESET_SPEED.items():
+				rec = self._data.get(self.key(encoder, other, px_class))
+				if rec and preset in PRESET_SPEED:
+					return rec["speed"] * PRESET_SPEED[preset] / factor
+		return None
+
+	def record(self, encoder: str, preset: str, px_class: str, media_s: float, wall_s: float) -> None:
+		if media_s <= 0 or wall_s <= 0:
+			return
+		k, sp = self.key(encoder, preset, px_class), media_s / wall_s
+		with self._lock:
+			rec = self._data.get(k)
+			if rec:
+				rec["speed"] = (1 - HISTORY_ALPHA) * rec["speed"] + HISTORY_ALPHA * sp
+				rec["n"] += 1
+			else:
+				self._data[k] = {"speed": sp, "n": 1}
+			try:
+				tmp = self.path.with_suffix(".tmp")
+				tmp.write_text(json.dumps(self._data, indent=1), encoding="utf-8")
+				tmp.replace(self.path)
+			except OSError as e:
+				safe_print(f"   [Warning] Speed history: {e}")
+
+# =============================================================================
+# 3. WINDOW
+# =============================================================================
+
+class Window:
+	"""A run's time budget: admission of jobs, drain before the deadline, preset fallback."""
+	def __init__(self, deadline: float, history: SpeedHistory, workers: int = 1):
+		self.deadline = deadline
+		self.history = history
+		self.workers = max(1, workers)
+		self.queued_media_s = 0.0		# Media seconds not started yet (set by the caller, decreased per job)
+		self.refused = 0
+		self._lock = threading.Lock()
+
+	def remaining(self) -> float:
+		return self.deadline - time.time()
+
+	def closed(self) -> bool:
+		"""True once no new job may start (DEADLINE_DRAIN_S before the deadline)."""
+		return self.remaining() <= DEADLINE_DRAIN_S
+
+	def predict(self, encoder: str, preset: str, px_class: str, media_s: float, fallback_s: float) -> float:
+		"""Predicted wall seconds of one job (fallback_s: model estimate when there is no history)."""
+		sp = self.history.speed(encoder, preset, px_class)
+		return media_s / sp if sp else fallback_s
+
+	def behind(self, encoder: str, preset: str, px_class: str) -> bool:
+		"""The remaining queue at this speed would overrun the window by DEADLINE_BEHIND x."""
+		sp = self.history.speed(encoder, preset, px_class)
+		if not sp:
+			return False
+		need = self.queued_media_s / (sp * self.workers)
+		return need > DEADLINE_BEHIND * max(1.0, self.remaining())
+
+	def start(self, media_s: float) -> None:
+		with self._lock:
+			self.queued_media_s = max(0.0, self.queued_media_s - media_s)
+
+	def admit(self, predicted_s: float) -> bool:
+		"""Can a job of predicted_s (with DEADLINE_SAFETY margin) still finish before the deadline?"""
+		ok = not self.closed() and predicted_s * DEADLINE_SAFETY <= self.remaining()
+		if not ok:
+			with self._lock:
+				self.refused += 1
+		return ok
+
+	def summary(self) -> str:
+		left = self.remaining()
+		state = f"{hm_tm(left)} left" if left > 0 else f"deadline passed {hm_tm(-left)} ago"
+		return (f"Window: until {datetime.fromtimestamp(self.deadline).strftime('%a %H:%M')} ({state}),"
+				f" {self.refused} job(s) left for the next window")
+
+WINDOW: Optional[Window] = None		# Set by Trans_code.main for --until / --budget runs
+_HISTORY: Optional[SpeedHistory] = None
+_HISTORY_LOCK = threading.Lock()
+
+def history() -> SpeedHistory:
+	"""The shared speed history (loaded from SPEED_HISTORY on first use)."""
+	global _HISTORY
+	with _HISTORY_LOCK:
+		if _HISTORY is None:
+			_HISTORY = SpeedHistory(SPEED_HISTORY)
+		return _HISTORY
+
+def open_window(until: Optional[str], budget: Optional[str], workers: int) -> Optional[Window]:
+	"""Builds the run's Window from the command line (None: no deadline)."""
+	global WINDOW
+	if not (until or budget):
+		WINDOW = None
+		return None
+	ends = []
+	if until: ends.append(parse_until(until))
+	if budget: ends.append(time.time() + parse_budget(budget))
+	WINDOW = Window(min(ends), history(), workers)
+	return WINDOW
@@ -7,6 +7,7 @@ import sys
 import json
 import time
 import shlex
+import errno
 
 import atexit
 import signal
@@ -20,6 +21,7 @@ import random
 import string
 import shutil
 import charset_normalizer
+import psutil
 
 from typing 		import Any, Dict, List, Optional, Tuple, Callable, Iterable, Union
 from pathlib 		import Path
@@ -29,6 +31,10 @@ from collections 	import defaultdict
 
 from Utils 			import *
 
+import Probe_native
+import Scheduler
+import Job_store
+
 IS_WIN = sys.platform.startswith("win")
 
 # =============================================================================
@@ -87,10 +93,19 @@ if IS_WIN:
 	PROCESS_ALL_ACCESS = 0x1F0FFF
 
 class ChildProcessManager:
-	"""Registry for subprocesses to ensure cleanup on exit."""
+	"""Registry for subprocesses to ensure cleanup on exit (and pause / resume from the control channel).
+
+	Only pausable processes (encodes, remuxes, frame counts) are frozen; probes and checks that run
+	under a timeout keep going, or a pause would turn them into cached timeouts.
+	"""
 	def __init__(self):
 		self._procs = []
+		self._unpausable = set()
 		self._lock = threading.Lock()
+		self._running = threading.Event()
+		self._running.set()
+		self._paused_at: Optional[float] = None
+		self._paused_s = 0.0
 		atexit.register(self.terminate_all)
 		signal.signal(signal.SIGINT, lambda s,f: self.terminate_all())
 		signal.signal(signal.SIGTERM, lambda s,f: self.terminate_all())
@@ -101,18 +116,91 @@ class ChildProcessManager:
 	def unregister(self, proc):
 		with self._lock:
 			if proc in self._procs: self._procs.remove(proc)
+			self._unpausable.discard(proc)
+
+	def start(self, cmd: List[str], pausable: bool = True, **kwargs) -> sp.Popen:
+		"""Starts and registers a process; a pausable one waits while paused.
+
+		The paused check and the register share the lock, so pause() either sees the new process or
+		the process sees the pause: none starts unfrozen in between.
+		"""
+		while True:
+			if pausable:
+				self._running.wait()
+			with self._lock:
+				if pausable and not self._running.is_set():
+					continue		# Paused between the wait and the lock
+				proc = sp.Popen(cmd, **kwargs)
+				self._procs.append(proc)
+				if not pausable:
+					self._unpausable.add(proc)
+				return proc
 
 	def terminate_all(self):
+		self._running.set()		# Never leave stopped children behind
 		with self._lock:
 			for p in self._procs:
 				try: p.kill()
 				except: pass
 			self._procs.clear()
 
+	def _signal(self, proc, stop: bool) -> None:
+		"""SIGSTOP / SIGCONT to the child's process group (own group via setsid); psutil on Windows."""
+		if IS_WIN:
+			pp = psutil.Process(proc.pid)
+			pp.suspend() if stop else pp.resume()
+		else:
+			os.killpg(os.getpgid(proc.pid), signal.SIGSTOP if stop else signal.SIGCONT)
+
+	def pause(self) -> int:
+		"""Freezes every pausable ffmpeg in place; ones started meanwhile wait for resume(). Returns the count."""
+		with self._lock:
+			self._running.clear()
+			if self._paused_at is None:
+				self._paused_at = time.monotonic()
+			n = 0
+			for p in self._procs:
+				if p in self._unpausable:
+					continue
+				try:
+					self._signal(p, True)
+					n += 1
+				except Exception: pass
+		return n
+
+	def resume(self) -> int:
+		with self._lock:
+			n = 0
+			for p in self._procs:
+				if p in self._unpausable:
+					continue
+				try:
+					self._signal(p, False)
+					n += 1
+				except Exception: pass
+			self._running.set()
+			if self._paused_at is not None:
+				self._paused_s += time.monotonic() - self._paused_at
+				self._paused_at = None
+		return n
+
+	def paused_s(self) -> float:
+		"""Seconds spent paused so far this run (a running pause included): subtract the change from a wall time."""
+		with self._lock:
+			return self._paused_s + (time.monotonic() - self._paused_at if self._paused_at is not None else 0.0)
+
+	@property
+	def paused(self) -> bool:
+		return not self._running.is_set()
+
+	def wait_running(self) -> None:
+		"""Blocks while paused."""
+		self._running.wait()
+
 PROC_MGR = ChildProcessManager()
 
-def _popen_managed(cmd: List[str], **kwargs) -> sp.Popen:
-	"""Starts a subprocess and registers it for cleanup."""
+def _popen_managed(cmd: List[str], pausable: bool = True, **kwargs) -> sp.Popen:
+	"""Starts a subprocess and registers it for cleanup (pausable=False: not frozen by a pause, e.g. under a timeout)."""
 	if IS_WIN: kwargs.setdefault("creationflags", sp.CREATE_NEW_PROCESS_GROUP)
 	else: kwargs.setdefault("preexec_fn", os.setsid)
 
@@ -120,33 +208,38 @@ def _popen_managed(cmd: List[str], **kwargs) -> sp.Popen:
 	kwargs.setdefault("encoding", "utf-8")
 	kwargs.setdefault("errors", "replace")
 
-	proc = sp.Popen(cmd, **kwargs)
-	PROC_MGR.register(proc)
-	return proc
+	return PROC_MGR.start(cmd, pausable, **kwargs)		# Paused from the control channel: the next ffmpeg starts on resume
 
 # =============================================================================
 # 3. SRIK (PERSISTENCE)
 # =============================================================================
 
 _SRIK_LOCK = threading.RLock()
-_GLOBAL_SRIK = {}
+_GLOBAL_SRIK = {}	# Used only while no Job_store is open (Job_store.STORE is None)
 
 def srik_update(path: str, *, source=None, plan=None, output=None):
-	"""Updates the global state record for a file."""
+	"""Updates the global state record for a file (in the job store when one is open)."""
 	k = str(Path(path).resolve())
+	store = Job_store.STORE
 	with _SRIK_LOCK:
-		entry = _GLOBAL_SRIK.get(k, {})
+		entry = store.srik_get(k) if store else _GLOBAL_SRIK.get(k, {})
 		if source: entry["source"] = source
 		if plan: entry["plan"] = plan
-		_GLOBAL_SRIK[k] = entry
+		if output: entry["output"] = output
+		if store: store.srik_put(k, entry)
+		else: _GLOBAL_SRIK[k] = entry
 
 def srik_get(path: str):
 	k = str(Path(path).resolve())
-	with _SRIK_LOCK: return _GLOBAL_SRIK.get(k, {}).copy()
+	store = Job_store.STORE
+	with _SRIK_LOCK: return store.srik_get(k) if store else _GLOBAL_SRIK.get(k, {}).copy()
 
 def srik_clear(path: str):
 	k = str(Path(path).resolve())
-	with _SRIK_LOCK: _GLOBAL_SRIK.pop(k, None)
+	store = Job_store.STORE
+	with _SRIK_LOCK:
+		if store: store.srik_clear(k)
+		else: _GLOBAL_SRIK.pop(k, None)
 
 # =============================================================================
 # 4. METADATA & PROBING
@@ -164,46 +257,93 @@ class VideoMeta:
 	streams: List[Dict] = field(default_factory=list)
 	format_tags: Dict = field(default_factory=dict)
 
-def ffprobe_run(input_file: str, execu=None, de_bug=False, check_corruption=False):
-	"""Runs ffprobe to extract metadata and optionally checks for corruption."""
-	cmd = [execu or FFPROBE, "-v", "error", "-show_streams", "-show_format", "-of", "json", input_file]
-	meta_obj, corrupt, err_msg = None, False, None
-
+def _meta_from_probe(data: Dict) -> VideoMeta:
+	"""Builds VideoMeta from ffprobe-shaped {"format": ..., "streams": ...} data."""
+	fmt = data.get("format", {})
+	streams = data.get("streams", [])
+	vid = next((s for s in streams if s.get('codec_type') == 'video'), {})
+
+	br = int(fmt.get('bit_rate', 0) or 0)
+	sz = int(fmt.get('size', 0) or 0)
+
+	return VideoMeta(
+		width=int(vid.get('width', 0)),
+		height=int(vid.get('height', 0)),
+		duration=float(fmt.get('duration', 0)),
+		bitrate=br,
+		size=sz,
+		codec=vid.get('codec_name', 'unknown'),
+		streams=streams,
+		format_tags=fmt.get("tags", {})
+	)
+
+def _ffprobe_tier(exe: str, input_file: str, tier: str) -> Tuple[Optional[str], Optional[str]]:
+	"""Runs one ffprobe tier -> (stdout, None) or (None, error message)."""
+	try:
+		p = _popen_managed(Probe_native.ffprobe_cmd(exe, input_file, tier), False, stdout=sp.PIPE, stderr=sp.PIPE)
+	except Exception as e:
+		return None, str(e)
 	try:
-		p = _popen_managed(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
 		out, err = p.communicate(timeout=PROBE_TIMEOUT_S)
+	except sp.TimeoutExpired as e:
+		p.kill()
+		p.communicate()
+		return None, str(e)
+	finally:
 		PROC_MGR.unregister(p)
+	if p.returncode != 0:
+		return None, f"FFprobe failed: {err}"
+	if not out:
+		return None, "FFprobe failed: no output"
+	return out, None
 
-		if p.returncode != 0:
-			err_msg = f"FFprobe failed: {err}"
-		elif out:
+def ffprobe_run(input_file: str, execu=None, de_bug=False, check_corruption=False):
+	"""Runs ffprobe to extract metadata and optionally checks for corruption.
+
+	Tiers (timed in Probe_native.STATS):
+	  native:  with PROBE_NATIVE, MP4 / Matroska headers are parsed in-process (no subprocess).
+	  shallow: with PROBE_TIERED, small probesize and only the fields the planner reads (MP4 / Matroska
+	           only: other containers can show a stream past the small probesize).
+	  deep:    full dump with a large probesize, only if the shallow pass failed or left
+	           required fields missing / inconsistent.
+	"""
+	meta_obj, corrupt, err_msg = None, False, None
+
+	t0 = time.perf_counter()
+	native = Probe_native.probe(input_file) if PROBE_NATIVE else None
+	if native is not None:
+		meta_obj = _meta_from_probe(native)
+		Probe_native.STATS.record("native", time.perf_counter() - t0)
+	else:
+		data, reasons = None, []
+		for tier in (Probe_native.probe_tiers(input_file) if PROBE_TIERED else ("deep",)):
+			if tier == "deep" and data is not None and not reasons:
+				break
+			t0 = time.perf_counter()
+			out, failed = _ffprobe_tier(execu or FFPROBE, input_file, tier)
+			Probe_native.STATS.record(tier, time.perf_counter() - t0, reasons if tier == "deep" else ())
+			if failed is None:
+				try:
+					data, err_msg = json.loads(out), None
+				except Exception as e:
+					err_msg = f"JSON Parse Error: {e}"
+			elif data is None:
+				err_msg = failed
+			if tier == "shallow":
+				if failed is not None and not failed.startswith("FFprobe failed"):
+					break		# Timeout / missing binary: a deeper pass won't help
+				reasons = Probe_native.missing_fields(data) if data is not None else ["error"]
+				if de_bug and reasons: print(f"    Deep probe ({', '.join(reasons)}): {input_file}")
+		if data is not None:
 			try:
-				data = json.loads(out)
-				fmt = data.get("format", {})
-				streams = data.get("streams", [])
-				vid = next((s for s in streams if s.get('codec_type') == 'video'), {})
-
-				br = int(fmt.get('bit_rate', 0) or 0)
-				sz = int(fmt.get('size', 0) or 0)
-
-				meta_obj = VideoMeta(
-					width=int(vid.get('width', 0)),
-					height=int(vid.get('height', 0)),
-					duration=float(fmt.get('duration', 0)),
-					bitrate=br,
-					size=sz,
-					codec=vid.get('codec_name', 'unknown'),
-					streams=streams,
-					format_tags=fmt.get("tags", {})
-				)
+				meta_obj = _meta_from_probe(data)
 			except Exception as e:
 				err_msg = f"JSON Parse Error: {e}"
-	except Exception as e:
-		err_msg = str(e)
 
 	if not err_msg and check_corruption:
 		try:
-			p2 = _popen_managed([FFMPEG, "-v", "error", "-xerror", "-i", input_file, "-t", "10", "-f", "null", "-"], stdout=sp.DEVNULL, stderr=sp.PIPE)
+			p2 = _popen_managed([FFMPEG, "-v", "error", "-xerror", "-i", input_file, "-t", "10", "-f", "null", "-"], False,
+								stdout=sp.DEVNULL, stderr=sp.PIPE)
 			_, c_err = p2.communicate(timeout=CORRUPTION_CHECK_TIMEOUT_S)
 			PROC_MGR.unregister(p2)
 			if p2.returncode != 0: corrupt = True
@@ -373,6 +513,25 @@ def _get_aspect_ratio(w, h):
 	if abs(r - 1.33) < 0.05: return "4:3"
 	return f"{w}:{h}"
 
+def _video_target(s: Dict, br: int) -> Tuple[int, int, float, int, int, int, bool, bool]:
+	"""One video stream's plan: (w, h, fps, target w, target h, ideal bps, needs scale, copy as is)."""
+	w = int(s.get("width", 0))
+	h = int(s.get("height", 0))
+	fps_str = s.get("avg_frame_rate", "24/1")
+	try: fps = float(Fraction(fps_str))
+	except: fps = 24.0
+
+	scale_trigger = (w > 2600 or h > 1188)
+	tgt_h = 1080 if scale_trigger else h
+	tgt_w = int(tgt_h * (w/h)) if h > 0 else w
+	if tgt_w % 2: tgt_w += 1
+
+	ideal = _ideal_hevc_bps(tgt_w, tgt_h, fps, br)
+	is_hevc = (s.get("codec_name", "").lower() == 'hevc')
+	is_bloated = (br > ideal * 1.5)
+	needs_scale = (w != tgt_w or h != tgt_h) and (w > tgt_w)
+	return w, h, fps, tgt_w, tgt_h, ideal, needs_scale, (is_hevc and not needs_scale and not is_bloated and w > 0)
+
 def parse_video(streams, ctx):
 	"""Generates FFmpeg arguments for video streams."""
 	logs, cmd = [], []
@@ -383,36 +542,21 @@ def parse_video(streams, ctx):
 		if s.get("codec_type") != "video" or s.get("disposition", {}).get("attached_pic"):
 			continue
 
-		w = int(s.get("width", 0))
-		h = int(s.get("height", 0))
-		fps_str = s.get("avg_frame_rate", "24/1")
-		try: fps = float(Fraction(fps_str))
-		except: fps = 24.0
+		w, h, fps, tgt_w, tgt_h, ideal, needs_scale, copy_ok = _video_target(s, ctx.estimated_video_bitrate)
 		codec = s.get("codec_name", "")
 		pix = s.get("pix_fmt", "")
 
-		scale_trigger = (w > 2600 or h > 1188)
-		tgt_h = 1080 if scale_trigger else h
-		tgt_w = int(tgt_h * (w/h)) if h > 0 else w
-		if tgt_w % 2: tgt_w += 1
-
 		br = ctx.estimated_video_bitrate
-		ideal = _ideal_hevc_bps(tgt_w, tgt_h, fps, br)
-
 		pct = int(((br - ideal) / br) * 100) if br > 0 else 0
 		change = "reduction" if pct > 0 else "increase"
 		method = "(Pixel-Math)" if (w > 0 and h > 0) else "(Source-Ratio)"
 		br_log = f"Source: {hm_sz(br, 'bps')} <=> Ideal: {hm_sz(ideal, 'bps')} {method} => App: {abs(pct)}% BitRate {change}"
 		logs.append(f"   |{br_log}")
 
-		is_hevc = (codec.lower() == 'hevc')
-		is_bloated = (br > ideal * 1.5)
-		needs_scale = (w != tgt_w or h != tgt_h) and (w > tgt_w)
-
 		cmd.extend(["-map", f"0:{s['index']}"])
 
 		status = ""
-		if is_hevc and not needs_scale and not is_bloated and w > 0:
+		if copy_ok:
 			cmd.extend([f"-c:v:{out_idx}", "copy"])
 			logs.append(f"   |Skip: HEVC + bitrate below ideal|")
 			status = "=> Copy (HEVC + Efficient Bitrate)|#COPY"
@@ -470,6 +614,12 @@ def parse_video(streams, ctx):
 	if skip_all: logs.append("\033[91m  .Skip: Video streams are optimal.\033[0m")
 	return cmd, skip_all, logs
 
+def _audio_target_bps(s: Dict) -> int:
+	"""AAC bitrate an audio stream is re-encoded to (0 = copied as is)."""
+	if s.get('codec_name', '') == 'aac' and int(s.get('channels', 0)) <= 6:
+		return 0
+	return 384_000 if int(s.get('channels', 0)) > 6 else 192_000
+
 def parse_audio(streams, ctx):
 	"""Generates FFmpeg arguments for audio streams."""
 	cmd, logs = [], []
@@ -485,7 +635,7 @@ def parse_audio(streams, ctx):
 
 		cmd.extend(["-map", f"0:{idx}"])
 		action = ""
-		if codec == 'aac' and ch <= 6:
+		if not _audio_target_bps(s):
 			cmd.extend([f"-c:a:{out_idx}", "copy"])
 			action = "Copy"
 		else:
@@ -553,8 +703,8 @@ def parse_subtl(streams, ctx):
 
 	return cmd, skip_all, logs, sidecar_cmd, side_lang, side_disp
 
-def parse_finfo(input_file: str, metadata: Any, de_bug=False):
-	"""Analyzes file metadata and plans the transcoding process."""
+def _meta_fields(metadata: Any) -> Tuple[List[Dict], Dict, int, float, int]:
+	"""(streams, format tags, bitrate, duration, size) from VideoMeta, its cached dict, or raw ffprobe JSON."""
 	fmt, streams, fmt_tags = {}, [], {}
 	tot_br, dur, sz = 0, 0.0, 0
 
@@ -575,6 +725,12 @@ def parse_finfo(input_file: str, metadata: Any, de_bug=False):
 			sz			= int(metadata.get("size", 0) or 0)
 			fmt_tags	= metadata.get("format_tags", {})
 
+	return streams, fmt_tags, tot_br, dur, sz
+
+def parse_finfo(input_file: str, metadata: Any, de_bug=False):
+	"""Analyzes file metadata and plans the transcoding process."""
+	streams, fmt_tags, tot_br, dur, sz = _meta_fields(metadata)
+
 	if not streams and sz == 0:
 		return [], True, ["\033[93m !Error: Unreadable Metadata\033[0m"]
 
@@ -641,15 +797,98 @@ def parse_finfo(input_file: str, metadata: Any, de_bug=False):
 	if TAG_HEVC_AS_HVC1 and not v_skip: cmd.extend(["-tag:v", "hvc1"])
 	cmd.extend(["-metadata", f"comment={SKIP_KEY}"])
 
-	srik_update(input_file, source={"dur": dur}, plan={"cmd": cmd})
+	# Only the skip key is missing: Trans_code can tag the file in place instead of running cmd
+	tag_only = v_skip and a_skip and s_skip and not needs_cont and needs_key and not side_in
+	srik_update(input_file, source={"dur": dur}, plan={"cmd": cmd, "video": v_cmd, "tag_only": tag_only,
+											  "moov_reserve": moov_reserve(streams, dur)})
 
 	return cmd, final_skip, all_logs
 
+# Rough encode cost for job ordering: CPU-seconds per megapixel of video and pass (x265 medium),
+# plus a flat per-second share for audio / muxing. Only relative costs matter for the ranking.
+CPU_S_PER_MPIX	= 0.15
+CPU_S_AUDIO		= 0.01		# Per second of audio re-encoded
+REMUX_MB_S		= 150		# Stream copy throughput (disk bound)
+
+def estimate_job(input_file: str, metadata: Any) -> Scheduler.JobEstimate:
+	"""Expected bytes saved and CPU-seconds spent by the plan parse_finfo would make (no logging, no SRIK)."""
+	streams, fmt_tags, tot_br, dur, sz = _meta_fields(metadata)
+	aud_br = sum(int(s.get('bit_rate', 0) or 0) for s in streams if s.get('codec_type') == 'audio')
+	vid_br = max(tot_br - aud_br, 0)
+	saved_bits = cpu_s = 0.0
+	encode = audio = False
+	for s in streams:
+		kind = s.get("codec_type")
+		if kind == "video" and not s.get("disposition", {}).get("attached_pic"):
+			_, _, fps, tgt_w, tgt_h, ideal, _, copy_ok = _video_target(s, vid_br)
+			if copy_ok: continue
+			encode = True
+			saved_bits += (vid_br - ideal) * dur
+			px = tgt_w * tgt_h if tgt_w > 0 and tgt_h > 0 else 1920 * 1080
+			passes = 2 if USE_TWO_PASS and "libx265" in CURRENT_ENCODER else 1
+			cpu_s += px / 1e6 * fps * dur * CPU_S_PER_MPIX * passes
+		elif kind == "audio" and (tgt := _audio_target_bps(s)):
+			audio = True
+			saved_bits += (int(s.get('bit_rate', 0) or 0) - tgt) * dur if s.get('bit_rate') else 0
+			cpu_s += dur * CPU_S_AUDIO
+	cpu_s += sz / (REMUX_MB_S * 1024 * 1024)
+	if encode:
+		lane = Scheduler.LANE_ENCODE
+	elif audio:
+		lane = Scheduler.LANE_AUDIO
+	elif Path(input_file).suffix.lower() != ".mp4" or SKIP_KEY not in str(fmt_tags.get("comment", "")):
+		lane = Scheduler.LANE_REMUX
+	else:
+		lane = Scheduler.LANE_SKIP
+	return Scheduler.JobEstimate(lane, int(saved_bits / 8), cpu_s, sz)
+
 # =============================================================================
 # 7. EXECUTION & PROGRESS
 # =============================================================================
 
-def _read_pipe1_progress(pipe, task_id, duration):
+def size_limit(in_size: int, cmd: List[str], reserve: int = 0) -> Optional[int]:
+	"""Largest acceptable output for an input of in_size bytes (None: no guard).
+
+	AUTO_SIZE_GUARD: growth up to ALLOW_GROWTH_SAME_RES_PCT at the same resolution, INFLATE_MAX_BY
+	when scaling, and never more than MAX_ABS_GROW_MB. FORCE_BIGGER turns the guard off.
+	reserve: moov space the output keeps free (OUTPUT_LAYOUT "reserve"), allowed on top.
+	"""
+	if not AUTO_SIZE_GUARD or FORCE_BIGGER or in_size <= 0:
+		return None
+	scaled = any("scale=" in str(x) for x in cmd)
+	limit = in_size * (1 + (INFLATE_MAX_BY if scaled else ALLOW_GROWTH_SAME_RES_PCT) / 100)
+	if MAX_ABS_GROW_MB is not None:
+		limit = min(limit, in_size + MAX_ABS_GROW_MB * 1024 * 1024)
+	return int(limit) + reserve
+
+class SizeProjector:
+	"""Extrapolates the final output size from -progress samples (total_size at out_time).
+
+	Projections only count once SIZE_GUARD_MIN_PCT of the input is encoded; when the last
+	SIZE_GUARD_WINDOW of them are all above `limit` (total_size grows in steps, so single
+	samples jump around), the job is killed. Output already past the limit trips it at once.
+	"""
+	def __init__(self, limit: int, duration: float):
+		self.limit, self.duration = limit, duration
+		self.window: List[float] = []
+		self.proc: Optional[sp.Popen] = None
+		self.projected = 0.0
+		self.tripped = False
+
+	def add(self, out_s: float, size: int) -> None:
+		if self.tripped or self.duration <= 0 or out_s <= 0 or size <= 0:
+			return
+		self.projected = size * self.duration / out_s
+		if 100 * out_s / self.duration >= SIZE_GUARD_MIN_PCT:
+			self.window = (self.window + [self.projected])[-SIZE_GUARD_WINDOW:]
+		settled = len(self.window) >= SIZE_GUARD_WINDOW and min(self.window) > self.limit
+		if size > self.limit or settled:
+			self.tripped = True
+			if self.proc is not None:
+				try: self.proc.kill()
+				except Exception: pass
+
+def _read_pipe1_progress(pipe, task_id, duration, guard=None):
 	start_time = time.time()
 	d = {}
 
@@ -682,6 +921,9 @@ def _read_pipe1_progress(pipe, task_id, duration):
 
 				sz = int(d.get("total_size", 0))
 				sz_str = f"{sz/1024/1024:.1f} MB"
+				if guard is not None:
+					guard.add(sec, sz)
+					if guard.projected: sz_str += f"~{guard.projected/1024/1024:.0f}"		# Projected final size
 
 				br = d.get("bitrate", "0").replace("kbits/s", "k")
 				spd = d.get("speed", "0").replace("x", "")
@@ -706,11 +948,151 @@ def _read_pipe1_progress(pipe, task_id, duration):
 	PROC_MGR.unregister(pipe)
 	return 0
 
-def ffmpeg_run(input_file, cmd, duration, skip_it, de_bug, task_id):
-	"""Executes the FFmpeg command with progress tracking (supports 2-pass)."""
+def apply_thread_budget(cmd: List[str], threads: int) -> List[str]:
+	"""Limits a planned command to `threads` CPUs: -threads, plus pools / frame-threads for libx265."""
+	if threads <= 0:
+		return cmd
+	limits = ["-threads", str(threads)]
+	if "libx265" in cmd:
+		limits += ["-x265-params", Scheduler.x265_params(threads)]
+	return cmd + limits
+
+MOOV_OVERFLOW = "reserved_moov_size is too small"		# ffmpeg's error when the -moov_size guess was short
+
+def moov_reserve(streams: List[Dict], duration: float) -> int:
+	"""Bytes to reserve up front for the moov of an MP4 with these streams (-moov_size).
+
+	Sized for the worst case of every sample table (a chunk per sample, nothing run-length coded),
+	so it can't run short: about 12 MB for a 2 h film, against the full rewrite +faststart costs.
+	"""
+	size = 16 * 1024		# ftyp, mvhd, udta / tags
+	dur = max(duration, 1.0) * MOOV_RESERVE_MARGIN
+	for s in streams:
+		kind = s.get("codec_type")
+		if kind == "video":
+			rates = []
+			for key in ("avg_frame_rate", "r_frame_rate"):
+				try: rates.append(float(Fraction(s.get(key) or "0")))
+				except (ValueError, ZeroDivisionError): pass
+			rate = max(rates, default=0)
+			samples, per = dur * (rate if 0 < rate <= 300 else 120), 32		# stts 8, ctts 8, stsz 4, co64 8, stss 4
+		elif kind == "audio":
+			samples, per = dur * int(s.get("sample_rate") or 48000) / 960, 20	# 960: shortest usual frame (Opus); stts, stsz, co64
+		elif kind == "subtitle":
+			samples, per = dur * 2, 20
+		else:
+			continue
+		size += 4096 + int(samples * per)
+	return size
+
+def output_layout(input_file: str, layout: str = "") -> List[str]:
+	"""Muxer options that give the MP4 made from input_file the OUTPUT_LAYOUT (or `layout`).
+
+	"reserve" uses the moov size parse_finfo estimated (SRIK); without one it is "faststart".
+	"""
+	layout = layout or OUTPUT_LAYOUT
+	if layout == "reserve":
+		size = srik_get(input_file).get("plan", {}).get("moov_reserve")
+		if size:
+			return ["-moov_size", str(size)]
+		layout = "faststart"
+	if layout == "faststart":
+		return ["-movflags", "+faststart"]
+	if layout == "fragmented":
+		return ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+	return []		# "end": moov written last, after the media
+
+_TEMP_DIRS: Dict[int, Optional[Path]] = {}		# st_dev -> this run's temp dir on that filesystem (None: RUN_TMP)
+_TEMP_LOCK = threading.Lock()
+
+def _sweep_temp_dirs(parent: Path) -> None:
+	"""Removes temp dirs in parent left by runs whose process is gone."""
+	for d in parent.glob(".__N_tmp_*"):
+		if d.name == SRC_TMP_NAME: continue
+		try: pid = int((d / "owner.pid").read_text())
+		except (OSError, ValueError): pid = 0
+		if not (pid and psutil.pid_exists(pid)):
+			shutil.rmtree(d, ignore_errors=True)
+
+def _temp_dir_on(src: Path) -> Optional[Path]:
+	"""This run's hidden temp dir on src's filesystem, made next to the first source seen there (None: can't)."""
+	dev = src.stat().st_dev
+	with _TEMP_LOCK:
+		d = _TEMP_DIRS.get(dev, False)
+		if d is None or (d and d.is_dir()):
+			return d
+		if RUN_TMP.stat().st_dev == dev:
+			d = RUN_TMP
+		else:
+			d = src.parent / SRC_TMP_NAME
+			try:
+				_sweep_temp_dirs(src.parent)
+				d.mkdir(exist_ok=True)
+				(d / "owner.pid").write_text(str(os.getpid()))
+				if IS_WIN: ctypes.windll.kernel32.SetFileAttributesW(str(d), 0x02)		# FILE_ATTRIBUTE_HIDDEN
+			except OSError as e:
+				safe_print(f"\033[93m   [Warning] No temp dir next to {src.parent} ({e}): its outputs go to {RUN_TMP}\033[0m")
+				d = None
+		_TEMP_DIRS[dev] = d
+		return d
+
+def _remove_temp_dirs() -> None:
+	for d in _TEMP_DIRS.values():
+		if d is not None and d != RUN_TMP:
+			shutil.rmtree(d, ignore_errors=True)
+
+atexit.register(_remove_temp_dirs)
+
+def temp_output(input_file: str, need: int = 0) -> str:
+	"""Temp path for an MP4 made from input_file.
+
+	TEMP_NEAR_SOURCE: on the source's filesystem, so clean_up's swap is a rename, when it has
+	`need` bytes plus TEMP_FREE_RESERVE_MB free; otherwise in RUN_TMP (clean_up then copies).
+	"""
+	name = f"{Path(input_file).stem}_{random.randint(1000,9999)}.mp4"
+	if TEMP_NEAR_SOURCE:
+		try:
+			d = _temp_dir_on(Path(input_file))
+		except OSError:
+			d = None
+		if d is not None:
+			free = shutil.disk_usage(d).free
+			if free >= need + TEMP_FREE_RESERVE_MB * 1024 * 1024:
+				return str(d / name)
+			safe_print(f"\033[93m   [Warning] {hm_sz(free)} free next to {Path(input_file).name} (needs {hm_sz(need)}): "
+					   f"temp output in {RUN_TMP}\033[0m")
+	return str(RUN_TMP / name)
+
+def move_into_place(src: Path, dest: Path, task_id: str = "") -> int:
+	"""Puts src at dest: os.replace (atomic) on one filesystem -> 0; across filesystems a logged copy -> bytes copied."""
+	try:
+		os.replace(src, dest)
+		return 0
+	except OSError as e:
+		if e.errno != errno.EXDEV:
+			raise
+	part = dest.with_name(f".{dest.name}.part")		# dest only appears once complete
+	shutil.copyfile(src, part)
+	os.replace(part, dest)
+	src.unlink()
+	copied = dest.stat().st_size
+	safe_print(f"\033[93m   [{task_id}] Output was on another filesystem: copied {hm_sz(copied)} into place\033[0m")
+	return copied
+
+def ffmpeg_run(input_file, cmd, duration, skip_it, de_bug, task_id, threads=0):
+	"""Executes the FFmpeg command with progress tracking (supports 2-pass).
+
+	threads > 0: the encode is held to that many CPUs (see apply_thread_budget).
+	Size guard: an encode projected past size_limit() is killed and flagged in the SRIK
+	(output={"not_worth": reason}) so the caller can record it.
+	"""
 	if skip_it or not cmd: return None
-	# Use RUN_TMP for centralized temp file management
-	temp = str(RUN_TMP / f"{Path(input_file).stem}_{random.randint(1000,9999)}.mp4")
+	cmd = apply_thread_budget(cmd, threads)
+	try: in_size = os.path.getsize(input_file)
+	except OSError: in_size = 0
+	layout = output_layout(input_file)
+	limit = size_limit(in_size, cmd, int(layout[1]) if layout[:1] == ["-moov_size"] else 0)
+	temp = temp_output(input_file, limit or in_size)
 
 	# Fallback: If duration is missing, try to retrieve from SRIK (populated by parse_finfo)
 	if duration <= 0:
@@ -721,7 +1103,7 @@ def ffmpeg_run(input_file, cmd, duration, skip_it, de_bug, task_id):
 
 	# Determine if we should do 2-pass
 	# Currently enabling only for libx265 as it's the most standard use-case
-	do_2pass = (USE_TWO_PASS and "libx265" in CURRENT_ENCODER)
+	do_2pass = (USE_TWO_PASS and "libx265" in CURRENT_ENCODER and "libx265" in cmd)	# Not for copy / remux jobs
 
 	passes = []
 	if do_2pass:
@@ -739,13 +1121,13 @@ def ffmpeg_run(input_file, cmd, duration, skip_it, de_bug, task_id):
 		p2_cmd = [x for x in cmd if x not in ("-stats", "-nostats")]
 		p2_cmd.extend(["-pass", "2", "-passlogfile", log_prefix])
 		p2_cmd.extend(["-progress", "pipe:1", "-stats_period", "0.5"])
-		p2_cmd.extend(["-movflags", "+faststart", temp])
+		p2_cmd.extend(layout + [temp])
 		passes.append((2, p2_cmd, log_prefix))
 	else:
 		# Single Pass
 		p1_cmd = [x for x in cmd if x not in ("-stats", "-nostats")]
 		p1_cmd.extend(["-progress", "pipe:1", "-stats_period", "0.5"])
-		p1_cmd.extend(["-movflags", "+faststart", temp])
+		p1_cmd.extend(layout + [temp])
 		passes.append((0, p1_cmd, None))
 
 	final_success = False
@@ -768,8 +1150,10 @@ def ffmpeg_run(input_file, cmd, duration, skip_it, de_bug, task_id):
 					log_list.append(line)
 			except: pass
 
-		# 3. Start threads for both pipes
-		t_out = threading.Thread(target=_read_pipe1_progress, args=(p.stdout, task_id, duration))
+		# 3. Start threads for both pipes (the encode pass gets the live size projection)
+		guard = SizeProjector(limit, duration) if limit and p_num != 1 and duration > 0 else None
+		if guard: guard.proc = p
+		t_out = threading.Thread(target=_read_pipe1_progress, args=(p.stdout, task_id, duration, guard))
 		t_err = threading.Thread(target=_read_stderr, args=(p.stderr, stderr_log))
 
 		t_out.start()
@@ -781,6 +1165,25 @@ def ffmpeg_run(input_file, cmd, duration, skip_it, de_bug, task_id):
 
 		PROC_MGR.unregister(p)
 
+		if guard and guard.tripped:
+			reason = (f"Not worth encoding: projected {hm_sz(guard.projected)} > limit {hm_sz(limit)} "
+					  f"(source {hm_sz(in_size)})")
+			safe_print(f"\033[93m   [{task_id}] {reason}, stopped at {hm_sz(os.path.getsize(temp)) if os.path.exists(temp) else '0'}\033[0m")
+			srik_update(input_file, output={"not_worth": reason})
+			Path(temp).unlink(missing_ok=True)
+			if p_log:
+				for f in Path(tempfile.gettempdir()).glob(f"{Path(p_log).name}*"):
+					f.unlink(missing_ok=True)
+			return None
+
+		if p.returncode != 0 and layout[:1] == ["-moov_size"] and any(MOOV_OVERFLOW in l for l in stderr_log):
+			# The reserve ran short (shouldn't, it is a worst case): this pass again with the old layout
+			safe_print(f"\033[93m   [{task_id}] moov reserve too small, encoding again with +faststart\033[0m")
+			Path(temp).unlink(missing_ok=True)
+			layout = ["-movflags", "+faststart"]
+			passes.append((p_num, p_cmd[:-3] + layout + [temp], p_log))
+			continue
+
 		if p.returncode != 0:
 			safe_print(f"\033[91m   [Error] FFmpeg Failed in Pass {p_num} (Code: {p.returncode})\033[0m")
 			if stderr_log:
@@ -811,6 +1214,59 @@ def ffmpeg_run(input_file, cmd, duration, skip_it, de_bug, task_id):
 		return temp
 	return None
 
+def remux_only(cmd: List[str]) -> bool:
+	"""True if the plan copies every video and audio stream: a container remux (I/O bound, no encode)."""
+	codecs = [cmd[i + 1] for i, x in enumerate(cmd[:-1]) if x.startswith(("-c:v", "-c:a"))]
+	return bool(codecs) and all(c == "copy" for c in codecs)
+
+def remux_run(jobs: List[Tuple[str, List[str]]], task_id: str, layout: str = "") -> List[Optional[str]]:
+	"""Runs copy-only plans (parse_finfo commands) as one ffmpeg with an input and an output per job.
+
+	No passes, no progress pipe. Plans with a second input (sidecar subtitles) run on their own;
+	a failed batch is retried one job at a time so one bad file doesn't fail the rest.
+	Outputs get the OUTPUT_LAYOUT (or `layout`). Returns the temp output per job (None where it failed).
+	"""
+	alone = [k for k, (_, plan) in enumerate(jobs) if plan.count("-i") > 1]
+	if alone and len(jobs) > 1:
+		outs = {k: remux_run([jobs[k]], task_id, layout)[0] for k in alone}
+		rest = [k for k in range(len(jobs)) if k not in outs]
+		outs.update(zip(rest, remux_run([jobs[k] for k in rest], task_id, layout) if rest else []))
+		return [outs[k] for k in range(len(jobs))]
+
+	temps = [temp_output(src, os.path.getsize(src)) for src, _ in jobs]
+	if len(jobs) == 1:
+		cmd = [x for x in jobs[0][1] if x not in ("-stats", "-nostats")] + ["-nostats", "-loglevel", "error"]
+		cmd.extend(output_layout(jobs[0][0], layout) + [temps[0]])
+	else:
+		cmd = [FFMPEG, "-y", "-hide_banner", "-nostats", "-loglevel", "error"]
+		for src, _ in jobs:
+			cmd.extend(["-i", src])
+		for k, ((_, plan), temp) in enumerate(zip(jobs, temps)):
+			tail = plan[plan.index("-i") + 2:]
+			tail = [f"{k}:{x[2:]}" if prev == "-map" and x.startswith("0:") else x for prev, x in zip([""] + tail, tail)]
+			# Global metadata / chapters default to the first input for every output: point each at its own
+			cmd.extend(tail + ["-map_metadata", str(k), "-map_chapters", str(k)] + output_layout(src, layout) + [temp])
+
+	safe_print(f"   [{task_id}] Remux {len(jobs)} file(s) -> MP4")
+	p = _popen_managed(cmd, stdout=sp.DEVNULL, stderr=sp.PIPE)
+	_, err = p.communicate()
+	PROC_MGR.unregister(p)
+	if p.returncode == 0:
+		return [t if os.path.exists(t) else None for t in temps]
+
+	for t in temps:
+		Path(t).unlink(missing_ok=True)
+	if len(jobs) > 1:
+		safe_print(f"\033[93m   [{task_id}] Batch remux failed (Code: {p.returncode}), retrying one by one\033[0m")
+		return [remux_run([j], task_id, layout)[0] for j in jobs]
+	if MOOV_OVERFLOW in (err or "") and layout != "faststart":
+		safe_print(f"\033[93m   [{task_id}] moov reserve too small, remuxing again with +faststart\033[0m")
+		return remux_run(jobs, task_id, "faststart")
+	safe_print(f"\033[91m   [Error] FFmpeg remux failed (Code: {p.returncode}): {jobs[0][0]}\033[0m")
+	for line in (err or "").splitlines()[-10:]:
+		safe_print(f"   > {line}")
+	return [None]
+
 def clean_up(input_file, output_file, skip_it=False, de_bug=False, task_id=""):
 	"""Replaces original file with output and handles artifacts."""
 	if skip_it or not output_file: return -1
@@ -826,21 +1282,29 @@ def clean_up(input_file, output_file, skip_it=False, de_bug=False, task_id=""):
 		 out_p.unlink()
 		 return -1
 
+	plan = srik_get(input_file).get("plan", {})
+	limit = size_limit(in_size, plan.get("cmd", []), plan.get("moov_reserve", 0) if OUTPUT_LAYOUT == "reserve" else 0)
+	if limit and out_size > limit:
+		reason = f"Not worth encoding: output {hm_sz(out_size)} > limit {hm_sz(limit)} (source {hm_sz(in_size)})"
+		safe_print(f"\033[93m   [{task_id}] {reason}, source kept\033[0m")
+		srik_update(input_file, output={"not_worth": reason})
+		out_p.unlink()
+		return -1
+
 	if ADD_ADDITIONAL:
 		if ADD_ARTIFACT_MATRIX: matrix_it(out_p, in_p.with_name(f"{in_p.stem}_matrix.png"), task_id)
 		if ADD_ARTIFACT_SPEED: speed_up(out_p, in_p.with_name(f"{in_p.stem}_fast_{ADDITIONAL_SPEED_FACTOR}x.mp4"), task_id)
 
 	try:
 		bk = in_p.with_suffix(".orig")
-		in_p.rename(bk)
-
 		# Rename output to final destination (handling .temp.mp4 -> .mp4)
 		final_path = in_p.with_suffix(out_p.suffix)
-		if final_path.exists():
-			final_path.unlink()
-		
-		# Use shutil.move instead of rename to handle cross-drive moves (since RUN_TMP might be elsewhere)
-		shutil.move(str(out_p), str(final_path))
+		# Journal the swap first: a crash from here on is finished or rolled back by Job_store.repair_swaps
+		Job_store.mark(input_file, Job_store.SWAPPING, swap={"orig": str(bk), "final": str(final_path), "out_size": out_size})
+		in_p.rename(bk)
+
+		# A rename when the temp is on the source's filesystem (temp_output), a copy otherwise
+		move_into_place(out_p, final_path, task_id)
 
 		bk.unlink(missing_ok=True)
 
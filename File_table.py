@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  File_table.py
+	- Compact file list for Trans_code scale mode: array-backed columns (size, mtime, duration, flags)
+	  plus interned folders and one byte blob of file names; no per-file dict or metadata tree.
+	- Full stream metadata stays in the scan cache and is loaded when a file is about to be planned.
+"""
+import os
+
+from array 		import array
+from datetime 	import datetime
+from typing 	import Any, Collection, Dict, Iterator, List, Optional, Sequence, Tuple
+
+TOUCH_DATE = datetime(2000, 1, 1)	# Same stand-in Trans_code uses for pre-1970 timestamps
+
+# Record flags
+F_CACHED = 1		# Metadata came from the scan cache (not probed this run)
+F_LAZY   = 2		# Metadata not kept in memory: load it from the scan cache before planning
+F_FAST   = 4		# Job estimate: fast lane (remux / audio only, no video encode)
+
+_FAST_RANK = 1e12	# Same ranking as Scheduler.priority: fast lane first, cheapest first
+
+class FileRecord:
+	"""One file as handed to process_file; reads like the legacy file_info dict (rec["path"], rec.get(...))."""
+	__slots__ = ("path", "size", "mtime", "duration", "flags", "metadata")
+
+	def __init__(self, path: str, size: int, mtime: float, duration: float, flags: int, metadata: Any = None):
+		self.path, self.size, self.mtime, self.duration, self.flags, self.metadata = \
+			path, size, mtime, duration, flags, metadata
+
+	@property
+	def name(self) -> str:
+		return os.path.basename(self.path)
+
+	@property
+	def date(self) -> datetime:
+		return _date(self.mtime)
+
+	def __getitem__(self, key: str) -> Any:
+		try: return getattr(self, key)
+		except AttributeError: raise KeyError(key) from None
+
+	def get(self, key: str, default: Any = None) -> Any:
+		return getattr(self, key, default)
+
+def _date(mtime: float) -> datetime:
+	try:
+		d = datetime.fromtimestamp(mtime)
+		return TOUCH_DATE if d.year < 1970 else d
+	except (OverflowError, OSError, ValueError):
+		return TOUCH_DATE
+
+class FileTable:
+	"""Append-only, sortable table of files (~56 bytes + the file name per entry)."""
+	def __init__(self):
+		self._dir_ids: Dict[str, int] = {}
+		self._dirs: List[str] = []
+		self._dir = array("I")
+		self._name_end = array("Q")
+		self._names = bytearray()
+		self.size = array("q")
+		self.mtime = array("d")		# st_mtime as stat reports it (the scan cache key uses this exact float)
+		self.duration = array("d")
+		self.flags = array("B")
+		self.saved = array("q")		# Job estimate (JOB_ORDER = "gain"): bytes saved, CPU-seconds
+		self.cpu_s = array("d")
+		self._order: Optional[array] = None
+
+	def append(self, path: str, size: int, mtime: float, duration: float, flags: int = 0, saved: int = 0, cpu_s: float = 0.0) -> None:
+		d, name = os.path.split(path)
+		dir_id = self._dir_ids.get(d)
+		if dir_id is None:
+			dir_id = self._dir_ids[d] = len(self._dirs)
+			self._dirs.append(d)
+		self._dir.append(dir_id)
+		self._names += name.encode("utf-8", "surrogateescape")
+		self._name_end.append(len(self._names))
+		self.size.append(size)
+		self.mtime.append(mtime)
+		self.duration.append(duration)
+		self.flags.append(flags)
+		self.saved.append(saved)
+		self.cpu_s.append(cpu_s)
+		self._order = None
+
+	def extend(self, other: "FileTable") -> None:
+		"""Appends other's rows in other's current (sorted) order."""
+		for i in other.rows():
+			self.append(other.path(i), other.size[i], other.mtime[i], other.duration[i], other.flags[i], other.saved[i], other.cpu_s[i])
+
+	def __len__(self) -> int:
+		return len(self.size)
+
+	def name(self, i: int) -> str:
+		start = self._name_end[i - 1] if i else 0
+		return self._names[start:self._name_end[i]].decode("utf-8", "surrogateescape")
+
+	def path(self, i: int) -> str:
+		return os.path.join(self._dirs[self._dir[i]], self.name(i))
+
+	def record(self, i: int) -> FileRecord:
+		return FileRecord(self.path(i), self.size[i], self.mtime[i], self.duration[i], self.flags[i])
+
+	def gain(self, i: int) -> float:
+		"""Row i's job priority (higher first), as Scheduler.priority ranks a JobEstimate."""
+		if self.flags[i] & F_FAST:
+			return _FAST_RANK - self.cpu_s[i]
+		return self.saved[i] / max(1e-3, self.cpu_s[i])
+
+	def sort(self, sort_keys_cfg: Collection[Tuple[str, bool]]) -> None:
+		"""Stable multi-key sort like Trans_code's list sort: [("size", True), ("date", False)]."""
+		touch = TOUCH_DATE.timestamp()
+		keys = {
+			"size": self.size.__getitem__,
+			"date": lambda i: self.mtime[i] if self.mtime[i] >= 0 else touch,		# Plain floats, no datetime per row
+			"name": self.name,
+			"gain": self.gain,
+		}
+		order = list(self.rows())
+		for key, descending in reversed(list(sort_keys_cfg)):
+			if key in keys:
+				order.sort(key=keys[key], reverse=descending)
+		self._order = array("I" if len(order) < 2 ** 32 else "Q", order)
+
+	def rows(self) -> Sequence[int]:
+		"""Row indices in the current (sorted) order."""
+		return self._order if self._order is not None else range(len(self))
+
+
+	def __iter__(self) -> Iterator[FileRecord]:
+		for i in self.rows():
+			yield self.record(i)
+
+	def nbytes(self) -> int:
+		"""Approximate payload size of the table (columns + names + folders)."""
+		cols = (self._dir, self._name_end, self.size, self.mtime, self.duration, self.flags, self.saved, self.cpu_s)
+		return (sum(c.itemsize * len(c) for c in cols) + len(self._names)
+				+ sum(len(d) + 50 for d in self._dirs) + (self._order.itemsize * len(self._order) if self._order else 0))
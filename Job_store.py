@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Job_store.py
+	- Durable job queue and run state for Trans_code (SQLite, WAL): one row per file with its state
+	  queued -> planned -> encoding -> verifying -> swapping -> done | failed, committed at every step.
+	- Backs FFMpeg's SRIK records (out of process memory; dropped when a job ends or a run starts,
+	  since every job is planned again).
+	- clean_up journals each source/output swap first; after a crash repair_swaps() finishes or
+	  rolls back the half-swapped files (.orig left behind).
+	- A restarted run resumes the unfinished queue straight from the store, without a rescan.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from pathlib 	import Path
+from typing 	import Any, Dict, Iterable, List, Optional, Tuple
+
+# Job states
+QUEUED, PLANNED, ENCODING, VERIFYING, SWAPPING, DONE, FAILED = \
+	"queued", "planned", "encoding", "verifying", "swapping", "done", "failed"
+OPEN_STATES = (QUEUED, PLANNED, ENCODING, VERIFYING)		# Picked up again by a resumed run
+
+class JobStore:
+	"""One SQLite file; every state change is its own (synchronous) transaction."""
+	_SCHEMA = (
+		"""CREATE TABLE IF NOT EXISTS runs (
+			id				TEXT PRIMARY KEY,
+			started			REAL,
+			finished		REAL,
+			dirs			TEXT,
+			totals			TEXT
+		)""",
+		"""CREATE TABLE IF NOT EXISTS jobs (
+			path			TEXT PRIMARY KEY,
+			run				TEXT,
+			seq				INTEGER,
+			state			TEXT,
+			size			INTEGER,
+			mtime			REAL,
+			duration		REAL,
+			outcome			TEXT,
+			saved			INTEGER,
+			error			TEXT,
+			swap			TEXT,
+			attempts		INTEGER DEFAULT 0,
+			updated			REAL
+		)""",
+		"CREATE INDEX IF NOT EXISTS idx_jobs_run ON jobs(run, state, seq)",
+		"CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state)",
+		"""CREATE TABLE IF NOT EXISTS srik (
+			path			TEXT PRIMARY KEY,
+			data			TEXT
+		)""",
+	)
+
+	def __init__(self, path: Path):
+		self.path = Path(path)
+		self._lock = threading.RLock()
+		self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+		self._db.execute("PRAGMA journal_mode=WAL")
+		self._db.execute("PRAGMA synchronous=FULL")		# A finished step must survive a power cut too
+		for stmt in self._SCHEMA: self._db.execute(stmt)
+
+	def close(self) -> None:
+		with self._lock:
+			self._db.close()
+
+	# -------------------------------------------------------------------------
+	# Runs
+	# -------------------------------------------------------------------------
+
+	def start_run(self, dirs: List[str]) -> str:
+		run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+		with self._lock:
+			self._db.execute("INSERT INTO runs (id, started, dirs) VALUES (?, ?, ?)", (run_id, time.time(), json.dumps(dirs)))
+		return run_id
+
+	def finish_run(self, run_id: str, totals: Dict[str, int]) -> None:
+		with self._lock:
+			self._db.execute("UPDATE runs SET finished = ?, totals = ? WHERE id = ?", (time.time(), json.dumps(totals), run_id))
+
+	def unfinished_run(self) -> Optional[str]:
+		"""The latest run that never finished and still has open jobs (None if there is none)."""
+		with self._lock:
+			row = self._db.execute("SELECT id FROM runs WHERE finished IS NULL ORDER BY started DESC LIMIT 1").fetchone()
+			if not row:
+				return None
+			left = self._db.execute(
+				f"SELECT 1 FROM jobs WHERE run = ? AND state IN ({','.join('?' * len(OPEN_STATES))}) LIMIT 1",
+				(row[0], *OPEN_STATES)).fetchone()
+		return row[0] if left else None
+
+	def counts(self, run_id: str) -> Dict[str, int]:
+		with self._lock:
+			rows = self._db.execute("SELECT state, COUNT(*) FROM jobs WHERE run = ? GROUP BY state", (run_id,)).fetchall()
+		return dict(rows)
+
+	# -------------------------------------------------------------------------
+	# Jobs
+	# -------------------------------------------------------------------------
+
+	def enqueue(self, run_id: str, files: Iterable[Tuple[str, int, float, float]], seq0: int = 0) -> int:
+		"""Queues (path, size, mtime, duration) rows in order, in one transaction. Returns the count."""
+		now = time.time()
+		rows = ((run_id, seq, QUEUED, path, size, mtime, duration, now) for seq, (path, size, mtime, duration) in enumerate(files, seq0))
+		with self._lock:
+			self._db.execute("BEGIN")
+			try:
+				cur = self._db.executemany(
+					"INSERT INTO jobs (run, seq, state, path, size, mtime, duration, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+					"ON CONFLICT(path) DO UPDATE SET run = excluded.run, seq = excluded.seq, state = excluded.state, "
+					"size = excluded.size, mtime = excluded.mtime, duration = excluded.duration, outcome = NULL, "
+					"error = NULL, swap = NULL, updated = excluded.updated", rows)
+				self._db.execute("COMMIT")
+			except BaseException:
+				self._db.execute("ROLLBACK")
+				raise
+		return cur.rowcount
+
+	def mark(self, path: str, state: str, *, outcome: Optional[str] = None, saved: Optional[int] = None,
+			 error: Optional[str] = None, swap: Optional[Dict[str, Any]] = None) -> None:
+		"""Moves a job to `state` (a file that was never queued gets a row of its own)."""
+		with self._lock:
+			cur = self._db.execute(
+				"UPDATE jobs SET state = ?, outcome = COALESCE(?, outcome), saved = COALESCE(?, saved), error = ?, "
+				"swap = ?, attempts = attempts + ?, updated = ? WHERE path = ?",
+				(state, outcome, saved, error, json.dumps(swap) if swap else None, int(state == ENCODING), time.time(), path))
+			if cur.rowcount == 0:
+				self._db.execute(
+					"INSERT INTO jobs (path, state, outcome, saved, error, swap, attempts, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+					(path, state, outcome, saved, error, json.dumps(swap) if swap else None, int(state == ENCODING), time.time()))
+
+	def get(self, path: str) -> Optional[Dict[str, Any]]:
+		with self._lock:
+			cur = self._db.execute("SELECT * FROM jobs WHERE path = ?", (path,))
+			row = cur.fetchone()
+			cols = [d[0] for d in cur.description]
+		return dict(zip(cols, row)) if row else None
+
+	def open_jobs(self, run_id: str) -> List[Tuple[str, int, float, float, str]]:
+		"""(path, size, mtime, duration, state) of the run's unfinished jobs, in queue order."""
+		with self._lock:
+			return self._db.execute(
+				f"SELECT path, size, mtime, duration, state FROM jobs WHERE run = ? AND state IN ({','.join('?' * len(OPEN_STATES))}) "
+				"ORDER BY seq", (run_id, *OPEN_STATES)).fetchall()
+
+	def swapping(self) -> List[Tuple[str, Dict[str, Any]]]:
+		with self._lock:
+			rows = self._db.execute("SELECT path, swap FROM jobs WHERE state = ?", (SWAPPING,)).fetchall()
+		return [(path, json.loads(swap) if swap else {}) for path, swap in rows]
+
+	# -------------------------------------------------------------------------
+	# SRIK records
+	# -------------------------------------------------------------------------
+
+	def srik_get(self, key: str) -> Dict[str, Any]:
+		with self._lock:
+			row = self._db.execute("SELECT data FROM srik WHERE path = ?", (key,)).fetchone()
+		return json.loads(row[0]) if row else {}
+
+	def srik_put(self, key: str, entry: Dict[str, Any]) -> None:
+		with self._lock:
+			self._db.execute("INSERT OR REPLACE INTO srik (path, data) VALUES (?, ?)", (key, json.dumps(entry, default=str)))
+
+	def srik_clear(self, key: str) -> None:
+		with self._lock:
+			self._db.execute("DELETE FROM srik WHERE path = ?", (key,))
+
+	def srik_reset(self) -> int:
+		"""Drops every SRIK record (left over by a crashed run). Returns the count."""
+		with self._lock:
+			return self._db.execute("DELETE FROM srik").rowcount
+
+# =============================================================================
+# SWAP REPAIR
+# =============================================================================
+
+def repair_swap(src: str, swap: Dict[str, Any]) -> Tuple[str, str]:
+	"""Finishes or rolls back one interrupted clean_up swap -> (new state, what was done).
+
+	swap = {"orig": backup of the source, "final": where the output goes, "out_size": its expected size}.
+	"""
+	orig, final = Path(swap.get("orig", "")), Path(swap.get("final", ""))
+	out_size = swap.get("out_size")
+	final.with_name(f".{final.name}.part").unlink(missing_ok=True)		# Cross-filesystem copy cut short
+	final_ok = final.is_file() and final.stat().st_size == out_size
+	if orig.is_file():
+		if final_ok:
+			orig.unlink()
+			return DONE, f"output was in place, removed {orig.name}"
+		if final.is_file():
+			final.unlink()		# Partial copy of the output
+		orig.rename(src)
+		return QUEUED, f"rolled back to {Path(src).name}"
+	if final_ok:
+		return DONE, "swap had completed"
+	if Path(src).is_file():
+		return QUEUED, "swap had not started"
+	return FAILED, "source and output both missing"
+
+STORE: Optional[JobStore] = None		# Set by Trans_code.main (JOB_STORE); None = in-memory SRIK, no journal
+
+def mark(path: str, state: str, **fields: Any) -> None:
+	"""STORE.mark when the store is open (no-op otherwise)."""
+	if STORE is not None:
+		STORE.mark(path, state, **fields)
+
+def repair_swaps(store: JobStore) -> List[Tuple[str, str, str]]:
+	"""Repairs every job left in "swapping" -> [(path, new state, what was done)]."""
+	out = []
+	for path, swap in store.swapping():
+		try:
+			state, note = repair_swap(path, swap)
+		except OSError as e:
+			state, note = FAILED, f"repair failed: {e}"
+		store.mark(path, state, error=None if state != FAILED else note, outcome="repaired")
+		out.append((path, state, note))
+	return out
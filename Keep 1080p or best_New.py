@@ -26,8 +26,12 @@ from collections import defaultdict
 from dataclasses import dataclass
 import tkinter as tk
 
+import Media_walk
+import Probe_native
+
 # --- CONFIGURATION ---
 STRICT_TIMEOUT = 15.0  # Seconds to wait for file analysis (Anti-Freeze)
+WALK_WORKERS = 8       # Concurrent directory listings while finding files (network shares)
 
 # Try importing dependencies
 try:
@@ -366,12 +370,24 @@ def parse_filename_basics(path: Path) -> Tuple[str, str, str]:
 			break
 	return (title.strip().title(), ctype, extra_id)
 
+# Fields get_metadata_strict reads (shallow ffprobe pass)
+STRICT_ENTRIES = "stream=codec_type,width,height,bit_rate:stream_disposition=attached_pic:format=duration,bit_rate"
+
 async def get_metadata_strict(path: Path) -> Optional[Dict]:
-	cmd = [FFPROBE_BIN, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", str(path)]
-	rc, out, _ = await run_command_async(cmd, STRICT_TIMEOUT)
-	if rc != 0 or not out: return None
+	data, reasons = None, []
+	for tier in Probe_native.probe_tiers(str(path)):		# Deep pass only if frame size / duration are missing
+		t0 = time.perf_counter()
+		cmd = Probe_native.ffprobe_cmd(FFPROBE_BIN, str(path), tier, STRICT_ENTRIES)
+		rc, out, err = await run_command_async(cmd, STRICT_TIMEOUT)
+		Probe_native.STATS.record(tier, time.perf_counter() - t0, reasons)
+		if err == "Timeout": break		# A deeper pass would only time out again
+		if rc == 0 and out:
+			try: data = json.loads(out)
+			except ValueError: pass
+		reasons = Probe_native.missing_fields(data, ("video_size", "duration"))
+		if not reasons: break
+	if not data: return None
 	try:
-		data = json.loads(out)
 		fmt = data.get("format", {})
 		vid = next((s for s in data.get("streams", []) if s["codec_type"] == "video"), {})
 
@@ -395,19 +411,18 @@ async def scan_library(sem: asyncio.Semaphore) -> Dict[Tuple, List[MediaFile]]:
 	safe_print("--- Phase 1: Finding Files ---")
 	for src in CONFIG.source_dirs:
 		if not src.exists(): continue
-		for root, _, files in os.walk(src):
-			for f in files:
-				if f.split('.')[-1].lower() in CONFIG.video_extensions:
-					if not any(r.search(f) for r in NON_MOVIE_REGEXES):
-						files_to_scan.append(Path(root) / f)
-						if len(files_to_scan) % 10 == 0:
-							safe_print(f"\r  Found {len(files_to_scan)} files...", end="")
+		for entry in Media_walk.walk_media(str(src), CONFIG.video_extensions, workers=WALK_WORKERS):
+			if not any(r.search(entry.name) for r in NON_MOVIE_REGEXES):
+				files_to_scan.append(entry)
+				if len(files_to_scan) % 10 == 0:
+					safe_print(f"\r  Found {len(files_to_scan)} files...", end="")
 	print ("")
 
 	safe_print(f"--- Phase 2: Analyzing {len(files_to_scan)} Files (Strict Mode) ---")
 
-	async def _analyze(path: Path):
+	async def _analyze(entry: Media_walk.MediaEntry):
 		async with sem:
+			path = Path(entry.path)
 			if not path.exists(): return
 			meta = await get_metadata_strict(path)
 			if not meta: return
@@ -417,10 +432,10 @@ async def scan_library(sem: asyncio.Semaphore) -> Dict[Tuple, List[MediaFile]]:
 			w, h = meta['width'], meta['height']
 			pixels = w * h
 			norm_br = (meta['bitrate'] / 1000.0) / max(1.0, meta['duration'] ** 0.5)
-			score = (pixels, norm_br, path.stat().st_size)
+			score = (pixels, norm_br, entry.size)
 
 			mf = MediaFile(
-				path=path, name=path.name, size=path.stat().st_size,
+				path=path, name=path.name, size=entry.size,
 				content_type=ctype, title=title,
 				width=w, height=h, duration=meta['duration'], bitrate=meta['bitrate'],
 				sort_score=score
@@ -430,6 +445,8 @@ async def scan_library(sem: asyncio.Semaphore) -> Dict[Tuple, List[MediaFile]]:
 
 	tasks = [_analyze(p) for p in files_to_scan]
 	await tqdm_asyncio.gather(*tasks)
+	if Probe_native.STATS.calls:
+		safe_print(Probe_native.STATS.summary())
 	return groups
 
 # -----------------------------------------------------------------------------
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Media_walk.py
+	- Shared os.scandir media walker for Trans_code, Keep 1080p, subtitle_fetcher and the VLC tool.
+	- Yields compact MediaEntry records (path, size, mtime_ns, ino, dev) straight from the DirEntry
+	  stat data: no os.walk, no Path() per name, no separate stat pool.
+	- Optional directory manifests (Scan_cache) skip unchanged folders entirely.
+	- Optional concurrent directory listing for NAS/SMB shares, with deterministic output order.
+"""
+import os
+import threading
+
+from hashlib 				import sha1
+from functools 				import partial
+from typing 				import Callable, Collection, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+from concurrent.futures 	import Future, ThreadPoolExecutor
+
+MANIFEST_VERSION = "v2"		# Bump when the per-file manifest layout changes
+SKIP_DIR_PREFIX = ".__N_tmp_"	# Per-run temp dirs FFMpeg.temp_output makes next to the media (outputs being written)
+
+# =============================================================================
+# 1. RECORDS
+# =============================================================================
+
+class MediaEntry(NamedTuple):
+	"""One media file as seen by the walker (tuple-sized, no per-file dict)."""
+	path: str
+	size: int
+	mtime_ns: int
+	ino: int = 0		# 0 where the platform's DirEntry doesn't report it (Windows)
+	dev: int = 0
+
+	@property
+	def mtime(self) -> float:
+		"""st_mtime exactly as os.stat reports it (keeps Scan_cache.cache_key stable)."""
+		sec, ns = divmod(self.mtime_ns, 1_000_000_000)
+		return sec + ns * 1e-9
+
+	@property
+	def name(self) -> str:
+		return os.path.basename(self.path)
+
+def ext_set(exts: Collection[str]) -> Set[str]:
+	"""Normalises {"mkv", ".MP4"} -> {".mkv", ".mp4"}."""
+	return {("." + e.lstrip(".")).lower() for e in exts}
+
+def _names_digest(names: List[str]) -> str:
+	return sha1("\0".join(sorted(names)).encode("utf-8", "surrogateescape")).hexdigest()
+
+# =============================================================================
+# 2. WALKER
+# =============================================================================
+
+def walk_media(
+	root: str,
+	exts: Collection[str],
+	manifest=None,
+	mode: Optional[str] = "mtime",
+	cancel_cb: Optional[Callable[[], bool]] = None,
+	workers: int = 1,
+	sort: bool = False
+) -> Iterator[MediaEntry]:
+	"""Yields a MediaEntry per media file under root (top-down, os.walk order, no symlinked dirs).
+
+	manifest: a Scan_cache engine with dir_get/dir_put (None = always list). With a manifest:
+		mode "stat":    a directory whose mtime is unchanged is not listed; its media files are re-stat'ed
+						from the manifest (a file rewritten in place doesn't change its directory's mtime).
+		mode "mtime":   not listed and no file stat'ed (one stat per dir): a file rewritten in place
+						keeps its old size / mtime until its directory changes.
+		mode "listing": it is listed and its entry count + names digest must match too
+						(for shares that don't update directory mtimes); files are still not stat'ed.
+	Changed directories are listed, their media files stat'ed from the DirEntry, and the manifest rewritten.
+
+	workers > 1 lists directories concurrently (high-latency shares). The output order is the same
+	as with workers=1: sort=True orders each directory by name, otherwise the listing order is kept.
+	cancel_cb is polled between directories; pending listings are dropped on cancel.
+	"""
+	wanted = ext_set(exts)
+	scan = partial(_scan_dir, wanted=wanted, ext_sig=MANIFEST_VERSION + ":" + ",".join(sorted(wanted)),
+				   manifest=manifest if mode else None, mode=mode, sort=sort)
+
+	if workers <= 1:
+		stack = [os.fspath(root)]
+		while stack:
+			if cancel_cb and cancel_cb(): return
+			files, subdirs = scan(stack.pop())
+			yield from files
+			stack.extend(reversed(subdirs))
+		return
+
+	# Concurrent listing: each worker queues the subdirectories it discovers (bounded by `limit`
+	# outstanding listings) and the consumer also keeps the top of its DFS stack in flight.
+	# Results are consumed in stack order, so the output is identical to workers=1.
+	pf = _Prefetcher(scan, workers, limit=max(8, workers * 64))
+	stack = [os.fspath(root)]
+	try:
+		while stack:
+			if cancel_cb and cancel_cb(): return
+			for d in stack[-workers:]:
+				pf.submit(d)
+			files, subdirs = pf.take(stack.pop())
+			yield from files
+			stack.extend(reversed(subdirs))
+	finally:
+		pf.close()
+
+class _Prefetcher:
+	"""Bounded pool of directory listings keyed by path (a listing is consumed exactly once)."""
+	def __init__(self, scan: Callable, workers: int, limit: int):
+		self._scan = scan
+		self._limit = limit
+		self._futs: Dict[str, Future] = {}
+		self._lock = threading.Lock()
+		self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="walk")
+
+	def _run(self, d: str):
+		res = self._scan(d)
+		for sub in res[1]:
+			self.submit(sub, eager=True)
+		return res
+
+	def submit(self, d: str, eager: bool = False) -> Optional[Future]:
+		with self._lock:
+			fut = self._futs.get(d)
+			if fut is None and not (eager and len(self._futs) >= self._limit):
+				try: fut = self._futs[d] = self._pool.submit(self._run, d)
+				except RuntimeError: return None		# Pool already shut down (cancelled walk)
+			return fut
+
+	def take(self, d: str):
+		fut = self.submit(d)
+		res = fut.result()
+		with self._lock: self._futs.pop(d, None)
+		return res
+
+	def close(self) -> None:
+		self._pool.shutdown(wait=False, cancel_futures=True)
+
+def _scan_dir(d: str, wanted: Set[str], ext_sig: str, manifest, mode: Optional[str], sort: bool) -> Tuple[List[MediaEntry], List[str]]:
+	"""Lists one directory -> (media entries, full subdirectory paths). Errors yield an empty listing."""
+	old = None
+	if manifest is not None:
+		try: d_mtime = os.stat(d).st_mtime_ns
+		except OSError: return [], []
+		old = manifest.dir_get(d)
+		if old and (old["mtime_ns"] != d_mtime or old["exts"] != ext_sig): old = None
+		if old and mode == "stat":
+			old = _restat(d, old, manifest)
+		if old and mode in ("mtime", "stat"):
+			return _from_manifest(d, old, sort)
+
+	try:
+		with os.scandir(d) as it:
+			entries = list(it)
+	except OSError:
+		return [], []
+	if sort: entries.sort(key=lambda e: e.name)
+
+	if manifest is not None:
+		names = [e.name for e in entries]
+		digest = _names_digest(names)
+		if old and old["count"] == len(names) and old["digest"] == digest:
+			return _from_manifest(d, old, sort)
+
+	files: List[MediaEntry] = []
+	subdirs: List[str] = []
+	for e in entries:
+		try:
+			if e.is_dir(follow_symlinks=False):
+				if not e.name.startswith(SKIP_DIR_PREFIX): subdirs.append(e.name)
+			elif os.path.splitext(e.name)[1].lower() in wanted and e.is_file():
+				st = e.stat()
+				files.append(MediaEntry(e.path, st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev))
+		except OSError:
+			continue
+
+	if manifest is not None:
+		manifest.dir_put(d, {"mtime_ns": d_mtime, "count": len(names), "digest": digest, "exts": ext_sig,
+							 "files": [(os.path.basename(f.path), f.size, f.mtime_ns, f.ino, f.dev) for f in files],
+							 "subdirs": subdirs})
+	return files, [os.path.join(d, n) for n in subdirs]
+
+def refresh_manifest_file(manifest, path: str) -> bool:
+	"""Re-stats one file in its directory's manifest (a file rewritten in place leaves the directory's mtime alone).
+
+	Returns False when the directory has no manifest or the manifest doesn't list the file.
+	"""
+	d, name = os.path.split(path)
+	m = manifest.dir_get(d)
+	if not m or not any(f[0] == name for f in m["files"]):
+		return False
+	st = os.stat(path)
+	m["files"] = [(name, st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev) if f[0] == name else f for f in m["files"]]
+	manifest.dir_put(d, m)
+	return True
+
+def _restat(d: str, m, manifest):
+	"""mode "stat": the manifest with its files re-stat'ed (rewritten in place by a tagger / remuxer), saved if any changed."""
+	files = []
+	for f in m["files"]:
+		try: st = os.stat(os.path.join(d, f[0]))
+		except OSError: continue
+		files.append((f[0], st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev))
+	if files != [tuple(f) for f in m["files"]]:
+		m = dict(m, files=files)
+		manifest.dir_put(d, m)
+	return m
+
+def _from_manifest(d: str, m, sort: bool) -> Tuple[List[MediaEntry], List[str]]:
+	files = [MediaEntry(os.path.join(d, name), size, mtime_ns, ino, dev) for name, size, mtime_ns, ino, dev in m["files"]]
+	subdirs = list(m["subdirs"])
+	if sort:
+		files.sort(key=lambda f: os.path.basename(f.path))
+		subdirs.sort()
+	return files, [os.path.join(d, n) for n in subdirs]
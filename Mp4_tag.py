@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Mp4_tag.py
+	- Metadata-only edit of an MP4's comment (moov/udta/meta/ilst/©cmt) without rewriting the media:
+	  Trans_code marks already compliant files with SKIP_KEY this way, with kilobytes of I/O.
+	- Where the new moov goes (every write leaves a valid file with the old or the new comment):
+		moov at the end of the file		new moov appended, then the old one turned into a free box
+		moov followed by a free box		new moov appended first, the old one retired, the new one
+										written into the free space as a free box and switched to
+										moov, then the appended copy cut off again (the reserve
+										-moov_size / moov_reserve outputs leave this room)
+		moov before mdat, no room		TagError (moving it would take the file's faststart layout
+										away; with keep_faststart=False it is appended like above)
+	- Fragmented files (moof) and moov boxes over MAX_MOOV_MB are left alone (TagError).
+"""
+import os
+import struct
+
+from typing 	import List, Optional, Tuple
+
+MAX_MOOV_MB	= 64		# Larger moov boxes are not loaded for an edit
+HEADER		= 8
+
+class TagError(Exception):
+	"""The file can't take the new tag in place (caller falls back to a cache record or a rewrite)."""
+
+# =============================================================================
+# 1. BOXES
+# =============================================================================
+
+Box = Tuple[bytes, int, int, int]		# (type, offset, size, header length)
+
+def _read_boxes(f, start: int, end: int) -> List[Box]:
+	"""Top-level boxes between start and end of an open file."""
+	out, off = [], start
+	while off + HEADER <= end:
+		f.seek(off)
+		size, kind = struct.unpack(">I4s", f.read(HEADER))
+		hdr = HEADER
+		if size == 1:
+			size, hdr = struct.unpack(">Q", f.read(8))[0], 16
+		elif size == 0:
+			size = end - off
+		if size < hdr or off + size > end:
+			raise TagError(f"damaged box {kind!r} at {off}")
+		out.append((kind, off, size, hdr))
+		off += size
+	return out
+
+def _children(buf: bytes, start: int) -> List[Tuple[bytes, bytes]]:
+	"""(type, whole box bytes) of the boxes in buf[start:]."""
+	out, off = [], start
+	while off + HEADER <= len(buf):
+		size, kind = struct.unpack_from(">I4s", buf, off)
+		if size == 1:
+			size = struct.unpack_from(">Q", buf, off + 8)[0]
+		elif size == 0:
+			size = len(buf) - off
+		if size < HEADER or off + size > len(buf):
+			raise TagError(f"damaged box {kind!r} in moov")
+		out.append((kind, buf[off:off + size]))
+		off += size
+	return out
+
+def _hdr(buf: bytes) -> int:
+	"""Header length of the box at the start of buf (16 with a 64-bit size)."""
+	return 16 if struct.unpack_from(">I", buf)[0] == 1 else HEADER
+
+def _box(kind: bytes, payload: bytes) -> bytes:
+	return struct.pack(">I4s", HEADER + len(payload), kind) + payload
+
+# =============================================================================
+# 2. COMMENT
+# =============================================================================
+
+CMT = b"\xa9cmt"
+
+def _replace(kids: List[Tuple[bytes, bytes]], kind: bytes, new: bytes) -> List[Tuple[bytes, bytes]]:
+	"""kids with the first `kind` box replaced by new (appended if there is none)."""
+	for i, (k, _) in enumerate(kids):
+		if k == kind:
+			return kids[:i] + [(kind, new)] + kids[i + 1:]
+	return kids + [(kind, new)]
+
+def _meta_split(meta: bytes) -> Tuple[bytes, int]:
+	"""(version/flags prefix, offset of the first child) of a meta box (ISO full box or QuickTime plain box)."""
+	if meta[HEADER + 4:HEADER + 8] == b"hdlr":
+		return b"", HEADER		# QuickTime style: no version field
+	return meta[HEADER:HEADER + 4], HEADER + 4
+
+def with_comment(moov: bytes, text: str) -> bytes:
+	"""The moov box with its iTunes-style comment set to text (udta / meta / ilst added where missing)."""
+	kids = _children(moov, _hdr(moov))
+	udta = next((b for k, b in kids if k == b"udta"), None)
+	u_kids = _children(udta, HEADER) if udta else []
+	u_kids = [(k, b) for k, b in u_kids if k != CMT]		# A QuickTime-style comment would shadow the new one
+	meta = next((b for k, b in u_kids if k == b"meta"), None)
+	if meta:
+		prefix, start = _meta_split(meta)
+		m_kids = _children(meta, start)
+	else:
+		prefix = bytes(4)
+		m_kids = [(b"hdlr", _box(b"hdlr", bytes(8) + b"mdirappl" + bytes(9)))]
+	ilst = next((b for k, b in m_kids if k == b"ilst"), None)
+	i_kids = _children(ilst, HEADER) if ilst else []
+	item = _box(CMT, _box(b"data", struct.pack(">II", 1, 0) + text.encode("utf-8")))		# 1 = UTF-8 text
+	i_kids = _replace(i_kids, CMT, item)
+	m_kids = _replace(m_kids, b"ilst", _box(b"ilst", b"".join(b for _, b in i_kids)))
+	u_kids = _replace(u_kids, b"meta", _box(b"meta", prefix + b"".join(b for _, b in m_kids)))
+	kids = _replace(kids, b"udta", _box(b"udta", b"".join(b for _, b in u_kids)))
+	return _box(b"moov", b"".join(b for _, b in kids))
+
+def read_comment(path: str) -> Optional[str]:
+	"""The iTunes-style comment of an MP4 (None if it has none)."""
+	with open(path, "rb") as f:
+		moov = _load_moov(f, os.fstat(f.fileno()).st_size)[1]
+	for kind, udta in _children(moov, _hdr(moov)):
+		if kind != b"udta": continue
+		for kind, meta in _children(udta, HEADER):
+			if kind != b"meta": continue
+			for kind, ilst in _children(meta, _meta_split(meta)[1]):
+				if kind != b"ilst": continue
+				for kind, item in _children(ilst, HEADER):
+					if kind == CMT:
+						data = _children(item, HEADER)[0][1]
+						return data[HEADER + 8:].decode("utf-8", "replace")
+	return None
+
+# =============================================================================
+# 3. IN-PLACE EDIT
+# =============================================================================
+
+def _load_moov(f, size: int) -> Tuple[List[Box], bytes, int]:
+	"""(top-level boxes, moov bytes, index of moov among them)."""
+	top = _read_boxes(f, 0, size)
+	kinds = [k for k, _, _, _ in top]
+	if b"moof" in kinds:
+		raise TagError("fragmented MP4")
+	if b"moov" not in kinds:
+		raise TagError("no moov box")
+	i = kinds.index(b"moov")
+	_, off, msize, _ = top[i]
+	if msize > MAX_MOOV_MB * 1024 * 1024:
+		raise TagError(f"moov is {msize // (1024 * 1024)} MB")
+	f.seek(off)
+	return top, f.read(msize), i
+
+def _sync(f) -> None:
+	f.flush()
+	os.fsync(f.fileno())
+
+def _put(f, off: int, data: bytes) -> int:
+	f.seek(off)
+	f.write(data)
+	return len(data)
+
+def set_comment(path: str, text: str, keep_faststart: bool = True) -> Tuple[str, int]:
+	"""Sets the MP4 comment in place -> (how: "tail" / "free", bytes written). Raises TagError if it can't.
+
+	Each step is synced before the next, so a crash leaves a playable file with the old or the new comment.
+	"""
+	with open(path, "r+b") as f:
+		size = os.fstat(f.fileno()).st_size
+		top, moov, i = _load_moov(f, size)
+		_, off, old_len, _ = top[i]
+		new = with_comment(moov, text)
+		nxt = top[i + 1] if i + 1 < len(top) else None
+		room = old_len + (nxt[2] if nxt and nxt[0] in (b"free", b"skip") else 0)
+		fits = len(new) == room or len(new) + HEADER <= room
+		if not fits and keep_faststart and any(k == b"mdat" for k, _, _, _ in top[i + 1:]):
+			raise TagError("moov sits before mdat without free space (faststart layout kept)")
+
+		# 1. Append the new moov: parsers still read the first one, so the old moov stays in charge
+		written = _put(f, size, new)
+		_sync(f)
+		# 2. Retire the old one (a 4-byte type write): the appended moov is the only one now
+		written += _put(f, off + 4, b"free")
+		_sync(f)
+		if not fits:
+			return "tail", written
+
+		# 3. Copy the new moov into the room at the front, typed free. The whole room becomes one
+		#    free box first, so the writes inside it never break the chain of top-level boxes
+		written += _put(f, off, struct.pack(">I4s", room, b"free"))
+		_sync(f)
+		if room > len(new):
+			written += _put(f, off + len(new), struct.pack(">I4s", room - len(new), b"free"))
+		written += _put(f, off + HEADER, new[HEADER:])
+		_sync(f)
+		written += _put(f, off, struct.pack(">I4s", len(new), b"free"))
+		_sync(f)
+		# 4. Switch it on (two identical moovs, the front one is read), then cut the appended copy off
+		written += _put(f, off + 4, b"moov")
+		_sync(f)
+		f.truncate(size)
+		_sync(f)
+	return "free", written
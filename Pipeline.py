@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Pipeline.py
+	- Stage-pipelined executor: each stage has its own worker threads and a bounded input queue,
+	  so a slow stage back-pressures the ones before it instead of buffering the whole job list.
+	- Per-stage counters (busy time, queue depth, time blocked on the next queue) show the bottleneck.
+"""
+import time
+import queue
+import threading
+
+from dataclasses 	import dataclass
+from typing 		import Any, Callable, List, Optional, Sequence, Tuple
+
+_STOP = object()	# Worker shutdown sentinel
+
+@dataclass
+class StageStats:
+	name: str
+	workers: int
+	done: int = 0
+	errors: int = 0
+	busy_s: float = 0.0			# Time spent inside the stage function
+	blocked_s: float = 0.0		# Time spent waiting for room in the next stage's queue
+	max_depth: int = 0
+
+class Pipeline:
+	"""Runs items through stages [(name, fn, workers), ...] connected by queues of `depth` items.
+
+	fn(item) returns the item for the next stage, or None when the item is finished (skipped,
+	failed, or it was the last stage). An exception is counted, passed to on_error(name, item, exc)
+	and drops the item. feed() blocks while the first queue is full; close() drains every stage.
+	"""
+	def __init__(
+		self,
+		stages: Sequence[Tuple[str, Callable[[Any], Any], int]],
+		depth: int,
+		on_error: Optional[Callable[[str, Any, BaseException], None]] = None
+	):
+		if not stages:
+			raise ValueError("Pipeline needs at least one stage")
+		self._fns = [fn for _, fn, _ in stages]
+		self._queues: List[queue.Queue] = [queue.Queue(maxsize=max(1, depth)) for _ in stages]
+		self.stats: List[StageStats] = [StageStats(name, max(1, n)) for name, _, n in stages]
+		self._on_error = on_error
+		self._lock = threading.Lock()
+		self._cancelled = threading.Event()
+		self._closed = False
+		self.fed = 0
+		self.feed_blocked_s = 0.0
+		self.t0 = time.perf_counter()
+		self._threads: List[List[threading.Thread]] = []
+		for idx, st in enumerate(self.stats):
+			ts = [threading.Thread(target=self._worker, args=(idx,), name=f"{st.name}-{k+1}", daemon=True)
+				  for k in range(st.workers)]
+			for t in ts: t.start()
+			self._threads.append(ts)
+
+	def feed(self, item: Any) -> None:
+		"""Hands one item to the first stage (blocks while that stage is saturated)."""
+		if self._closed:
+			raise RuntimeError("Pipeline is closed")
+		self.feed_blocked_s += self._put(0, item)
+		self.fed += 1
+
+	def _put(self, idx: int, item: Any) -> float:
+		"""Puts item on queue idx; returns the time spent waiting for room."""
+		q = self._queues[idx]
+		t0 = time.perf_counter()
+		q.put(item)
+		waited = time.perf_counter() - t0
+		depth = q.qsize()
+		with self._lock:
+			st = self.stats[idx]
+			if depth > st.max_depth: st.max_depth = depth
+		return waited
+
+	def _worker(self, idx: int) -> None:
+		q, fn, st = self._queues[idx], self._fns[idx], self.stats[idx]
+		last = idx == len(self._fns) - 1
+		while True:
+			item = q.get()
+			if item is _STOP:
+				return
+			if self._cancelled.is_set():
+				continue
+			t0 = time.perf_counter()
+			try:
+				out = fn(item)
+				failed = None
+			except BaseException as e:
+				out, failed = None, e
+			busy = time.perf_counter() - t0
+			blocked = 0.0
+			if out is not None and not last and not self._cancelled.is_set():
+				blocked = self._put(idx + 1, out)
+			with self._lock:
+				st.busy_s += busy
+				st.blocked_s += blocked
+				st.done += 1
+				if failed is not None: st.errors += 1
+			if failed is not None and self._on_error:
+				try: self._on_error(st.name, item, failed)
+				except Exception: pass
+
+	def close(self, wait: bool = True) -> None:
+		"""No more input: stops each stage once everything before it has finished."""
+		if self._closed: return
+		self._closed = True
+		if not wait:
+			self.cancel()
+		for idx, ts in enumerate(self._threads):
+			for _ in ts:
+				self._queues[idx].put(_STOP)
+			for t in ts:
+				t.join()
+
+	def cancel(self) -> None:
+		"""Drops queued items: workers finish their current one and skip the rest."""
+		self._cancelled.set()
+
+	def depths(self) -> List[int]:
+		return [q.qsize() for q in self._queues]
+
+	def report(self) -> str:
+		"""One line per stage: done, queue depth (now / max), utilisation, avg time, time blocked downstream."""
+		elapsed = max(1e-9, time.perf_counter() - self.t0)
+		depths = self.depths()
+		with self._lock:
+			rows = [f"   {'stage':<10}|{'wrk':>4} |{'done':>7} |{'err':>4} | queue (max) | util  | avg/item | blocked"]
+			for st, depth in zip(self.stats, depths):
+				util = 100 * st.busy_s / (st.workers * elapsed)
+				avg = st.busy_s / st.done if st.done else 0.0
+				rows.append(f"   {st.name:<10}|{st.workers:>4} |{st.done:>7} |{st.errors:>4} | {depth:>4} ({st.max_depth:>4})"
+							f" | {util:4.0f}% | {avg:7.2f}s | {st.blocked_s:6.1f}s")
+			rows.append(f"   fed {self.fed} item(s), source blocked {self.feed_blocked_s:.1f}s, elapsed {elapsed:.1f}s")
+		busiest = max(self.stats, key=lambda s: s.busy_s / s.workers)
+		if busiest.done:
+			rows.append(f"   bottleneck: {busiest.name}")
+		return "\n".join(rows)
+
+	def __enter__(self) -> "Pipeline":
+		return self
+
+	def __exit__(self, exc_type, exc, tb) -> None:
+		self.close(wait=exc_type is None)
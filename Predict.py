@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Predict.py
+	- Sample-encode predictor: a few short, spread-out slices are encoded in parallel with the
+	  planned command; their size and CPU time are scaled to the whole file.
+	- Files whose predicted saving per CPU-second is below PREDICT_MIN_KB_PER_CPU_S are skipped
+	  or deferred to the end of the run (PREDICT_ACTION).
+	- Every prediction is written to PREDICT_LOG (JSONL) with the real result next to it.
+"""
+import os
+import json
+import time
+import random
+import statistics
+import threading
+import subprocess as sp
+
+from pathlib 				import Path
+from contextlib 			import nullcontext
+from dataclasses 			import dataclass, asdict
+from typing 				import Any, Dict, List, Optional, Tuple
+from concurrent.futures 	import ThreadPoolExecutor
+
+from Utils 					import *
+
+import FFMpeg
+import Scheduler
+
+_LOG_LOCK = threading.Lock()
+
+@dataclass
+class Prediction:
+	in_size: int
+	duration: float
+	size: int					# Predicted output bytes
+	cpu_s: float				# Predicted CPU seconds (all passes)
+	wall_s: float				# Predicted wall time at the sample thread count
+	samples: int
+	two_pass: bool
+
+	@property
+	def saved(self) -> int:
+		return self.in_size - self.size
+
+	@property
+	def kb_per_cpu_s(self) -> float:
+		return self.saved / 1024 / max(1e-3, self.cpu_s)
+
+	def worth_it(self) -> bool:
+		return self.saved > 0 and self.kb_per_cpu_s >= PREDICT_MIN_KB_PER_CPU_S
+
+# =============================================================================
+# 1. SAMPLES
+# =============================================================================
+
+def wants_prediction(cmd: List[str], duration: float) -> bool:
+	"""Only real video encodes that are long enough for samples to pay off."""
+	return PREDICT_ENCODES and duration >= PREDICT_MIN_DURATION_S and FFMpeg.CURRENT_ENCODER in cmd
+
+def sample_starts(duration: float, count: int, length: float) -> List[float]:
+	"""Slice start times spread over the file (centred in count equal parts)."""
+	return [max(0.0, duration * (i + 0.5) / count - length / 2) for i in range(count)]
+
+def _sample_cmd(cmd: List[str], start: float, length: float, out: str, threads: int) -> List[str]:
+	"""The planned command cut down to one slice: input seek before the first -i, -t on the output."""
+	first_in = cmd.index("-i")
+	c = cmd[:first_in] + ["-ss", f"{start:.3f}"] + cmd[first_in:]
+	c = FFMpeg.apply_thread_budget(c, threads)
+	return c + ["-t", f"{length:.3f}", out]
+
+def _run_timed(cmd: List[str]) -> Tuple[int, float, Optional[float]]:
+	"""Runs one sample -> (returncode, wall seconds, CPU seconds or None where wait4 is missing)."""
+	t0 = time.perf_counter()
+	p = FFMpeg._popen_managed(cmd, stdout=sp.DEVNULL, stderr=sp.DEVNULL)
+	try:
+		if hasattr(os, "wait4"):
+			_, status, ru = os.wait4(p.pid, 0)
+			p.returncode = os.waitstatus_to_exitcode(status)
+			cpu = ru.ru_utime + ru.ru_stime
+		else:
+			p.wait()
+			cpu = None
+	finally:
+		FFMpeg.PROC_MGR.unregister(p)
+	return p.returncode, time.perf_counter() - t0, cpu
+
+def predict(input_file: str, cmd: List[str], duration: float, task_id: str, threads: int = 0,
+			budget: Optional[Scheduler.CpuBudget] = None) -> Optional[Prediction]:
+	"""Encodes PREDICT_SAMPLES slices of PREDICT_SAMPLE_S seconds in parallel and scales them up (None on failure).
+
+	threads / budget: the samples share the job's `threads`, held from the budget like its encode
+	(threads 0: all the cores, nothing held).
+	"""
+	length = min(PREDICT_SAMPLE_S, duration / max(1, PREDICT_SAMPLES))
+	starts = sample_starts(duration, PREDICT_SAMPLES, length)
+	tag = f"{Path(input_file).stem}_{random.randint(1000, 9999)}"
+
+	with (budget.hold(threads) if budget is not None else nullcontext(threads)) as granted:
+		total = granted or os.cpu_count() or 4
+		each = max(1, total // len(starts))
+
+		def one(i: int) -> Optional[Tuple[int, float, float]]:
+			out = str(RUN_TMP / f"{tag}.s{i}.mp4")
+			try:
+				rc, wall, cpu = _run_timed(_sample_cmd(cmd, starts[i], length, out, each))
+				if rc != 0 or not os.path.exists(out):
+					return None
+				return os.path.getsize(out), wall, (cpu if cpu is not None else wall * each)
+			finally:
+				Path(out).unlink(missing_ok=True)
+
+		with ThreadPoolExecutor(max_workers=min(len(starts), total // each), thread_name_prefix="sample") as ex:
+			res = list(ex.map(one, range(len(starts))))
+	if not all(res):
+		safe_print(f"   [{task_id}] Prediction: {res.count(None)} of {len(res)} sample(s) failed")
+		return None
+	scale = duration / (length * len(res))
+	# The samples ran at `each` threads (at most `total` at once), the encode gets all `total`
+	speedup = total / each
+	# Pass 1 of a 2-pass x265 encode costs about as much again (upper bound for the decision)
+	two_pass = FFMpeg.USE_TWO_PASS and "libx265" in FFMpeg.CURRENT_ENCODER and "libx265" in cmd
+	passes = 2 if two_pass else 1
+	try: in_size = os.path.getsize(input_file)
+	except OSError: in_size = 0
+	return Prediction(
+		in_size=in_size, duration=duration,
+		size=int(sum(r[0] for r in res) * scale),
+		cpu_s=sum(r[2] for r in res) * scale * passes,
+		wall_s=sum(r[1] for r in res) * scale * passes / speedup,
+		samples=len(res), two_pass=two_pass,
+	)
+
+# =============================================================================
+# 2. LOG
+# =============================================================================
+
+def log_result(path: str, pred: Prediction, decision: str, out_size: Optional[int] = None, wall_s: Optional[float] = None) -> None:
+	"""Appends one JSONL record: the prediction, the decision, and the real result if there is one."""
+	rec: Dict[str, Any] = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "path": path, "decision": decision,
+						   **{f"pred_{k}": v for k, v in asdict(pred).items()},
+						   "pred_kb_per_cpu_s": round(pred.kb_per_cpu_s, 2)}
+	if out_size is not None:
+		rec["real_size"] = out_size
+		rec["real_wall_s"] = round(wall_s or 0.0, 2)
+	try:
+		with _LOG_LOCK, open(PREDICT_LOG, "a", encoding="utf-8") as f:
+			f.write(json.dumps(rec) + "\n")
+	except OSError as e:
+		safe_print(f"   [Warning] Prediction log: {e}")
+
+def accuracy(path: Path = PREDICT_LOG) -> Optional[str]:
+	"""Median / worst relative error of predicted vs real size and wall time over the log."""
+	size_err, time_err = [], []
+	try:
+		with open(path, encoding="utf-8") as f:
+			for line in f:
+				try: r = json.loads(line)
+				except ValueError: continue
+				if r.get("real_size"):
+					size_err.append(abs(r["pred_size"] - r["real_size"]) / r["real_size"])
+				if r.get("real_wall_s"):
+					time_err.append(abs(r["pred_wall_s"] - r["real_wall_s"]) / r["real_wall_s"])
+	except OSError:
+		return None
+	if not size_err:
+		return None
+	msg = f"Predictor accuracy over {len(size_err)} encode(s): size error median {100 * statistics.median(size_err):.1f}% (max {100 * max(size_err):.0f}%)"
+	if time_err:
+		msg += f", time error median {100 * statistics.median(time_err):.1f}%"
+	return msg
@@ -0,0 +1,905 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Probe_native.py
+	- In-process probe backend: reads only the MP4 'moov' box or the Matroska Info / Tracks / Tags /
+	  Attachments elements (bounded reads, no subprocess, no JSON).
+	- probe() returns the same {"format": {...}, "streams": [...]} shape ffprobe -of json prints, with the
+	  fields parse_finfo uses (codec, size, frame rate, pix_fmt, languages, bitrates, dispositions, comment).
+	- Anything it can't reproduce faithfully (fragmented / encrypted files, unknown codecs, cover art, chapter
+	  tracks, bitstream-only values...) returns None so the caller falls back to ffprobe.
+	- Values are the ones ffprobe prints, which the header alone doesn't always give: Macintosh mdhd language
+	  codes, the HE-AAC output rate (PS: stereo), the container's field order. Where only decoded frames settle
+	  it (implicit SBR, unflagged interlaced H.264 / MPEG-2) the file goes to ffprobe. tests/test_probe_native.py
+	  checks this on ffmpeg-made files.
+	- Shared ffprobe tiers for all tools: a shallow pass (small probesize, -show_entries trimmed to the
+	  fields a caller reads) for MP4 / Matroska only, whose headers list every stream, a deep pass when
+	  required fields are missing or inconsistent or for any other container, and per-tier timing
+	  counters (STATS).
+"""
+import os
+import re
+import sys
+import struct
+import threading
+
+from array 		import array
+from fractions 	import Fraction
+from typing 	import Any, Collection, Dict, List, Optional, Tuple
+from collections import Counter
+
+MAX_HEADER_BYTES = 32 * 1024 * 1024		# Largest moov / Matroska header element read into memory
+MAX_TOP_BOXES    = 64					# Top-level MP4 boxes / Matroska elements walked before giving up
+
+_EBML    = b"\x1a\x45\xdf\xa3"								# Matroska / WebM magic
+_MP4_TOP = (b"ftyp", b"moov", b"free", b"wide", b"mdat", b"skip")	# First box of an MP4 / QuickTime file
+
+class Unsupported(Exception):
+	"""Raised inside the parsers for anything ffprobe has to handle."""
+
+def probe(path: str) -> Optional[Dict[str, Any]]:
+	"""ffprobe-shaped dict for an MP4 / Matroska file, or None (unsupported -> use ffprobe)."""
+	try:
+		size = os.path.getsize(path)
+		with open(path, "rb") as f:
+			head = f.read(12)
+			f.seek(0)
+			if head[:4] == _EBML:
+				return _Mkv(f, size).probe()
+			if head[4:8] in _MP4_TOP:
+				return _probe_mp4(f, size)
+	except (Unsupported, OSError, struct.error, ValueError, IndexError, KeyError, ZeroDivisionError):
+		pass
+	return None
+
+# =============================================================================
+# 1. SHARED HELPERS
+# =============================================================================
+
+_TRANSFER = {1: "bt709", 4: "gamma22", 5: "gamma28", 6: "smpte170m", 7: "smpte240m", 8: "linear",
+			 13: "iec61966-2-1", 14: "bt2020-10", 15: "bt2020-12", 16: "smpte2084", 18: "arib-std-b67"}
+
+def _pix_fmt(chroma: int, depth: int) -> str:
+	base = {0: "gray", 1: "yuv420p", 2: "yuv422p", 3: "yuv444p"}[chroma]
+	return base if depth == 8 else f"{base}{depth}le"
+
+class _Bits:
+	"""MSB-first bit reader (SPS / AudioSpecificConfig)."""
+	def __init__(self, data: bytes):
+		self.data, self.pos = data, 0
+
+	def u(self, n: int) -> int:
+		v = 0
+		for _ in range(n):
+			byte = self.data[self.pos >> 3]
+			v = (v << 1) | ((byte >> (7 - (self.pos & 7))) & 1)
+			self.pos += 1
+		return v
+
+	def ue(self) -> int:
+		zeros = 0
+		while self.u(1) == 0:
+			zeros += 1
+			if zeros > 31: raise Unsupported("bad exp-golomb")
+		return (1 << zeros) - 1 + self.u(zeros)
+
+_AVC_HIGH = (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135)
+
+def _avcc_sps(avcc: bytes) -> Tuple[Optional[bytes], int]:
+	"""(first SPS, offset past the PPS list) of an AVCDecoderConfigurationRecord."""
+	pos, n_sps, sps = 6, avcc[5] & 0x1F, None
+	for _ in range(n_sps):
+		ln = struct.unpack_from(">H", avcc, pos)[0]
+		sps = sps or avcc[pos + 2:pos + 2 + ln]
+		pos += 2 + ln
+	n_pps = avcc[pos]; pos += 1
+	for _ in range(n_pps):
+		pos += 2 + struct.unpack_from(">H", avcc, pos)[0]
+	return sps, pos
+
+def _avcc_pix_fmt(avcc: bytes) -> str:
+	"""pix_fmt from an AVCDecoderConfigurationRecord (falls back to the first SPS for high profiles)."""
+	profile = avcc[1]
+	if profile not in _AVC_HIGH:
+		return "yuv420p"
+	sps, pos = _avcc_sps(avcc)
+	if len(avcc) >= pos + 4:
+		return _pix_fmt(avcc[pos] & 3, (avcc[pos + 1] & 7) + 8)
+	if not sps: raise Unsupported("no SPS")
+	rbsp = sps[1:].replace(b"\x00\x00\x03", b"\x00\x00")
+	b = _Bits(rbsp)
+	b.u(24); b.ue()							# profile, constraints, level, sps id
+	chroma = b.ue()
+	if chroma == 3: b.u(1)
+	return _pix_fmt(chroma, b.ue() + 8)
+
+def _avcc_field_order(avcc: bytes) -> str:
+	""""progressive" for an SPS with frame_mbs_only_flag; otherwise only the frames tell ffprobe the order."""
+	sps = _avcc_sps(avcc)[0]
+	if not sps: raise Unsupported("no SPS")
+	b = _Bits(sps[1:].replace(b"\x00\x00\x03", b"\x00\x00"))
+	se = lambda: (lambda k: (k + 1) // 2 if k & 1 else -(k // 2))(b.ue())
+	profile = b.u(8); b.u(16); b.ue()		# profile, constraints, level, sps id
+	if profile in _AVC_HIGH:
+		chroma = b.ue()
+		if chroma == 3: b.u(1)
+		b.ue(); b.ue(); b.u(1)				# bit depths, qpprime_y_zero_transform_bypass
+		if b.u(1):							# Scaling matrices
+			for i in range(8 if chroma != 3 else 12):
+				if not b.u(1): continue
+				last = nxt = 8
+				for _ in range(16 if i < 6 else 64):
+					if nxt: nxt = (last + se()) % 256
+					last = nxt or last
+	b.ue()									# log2_max_frame_num
+	poc = b.ue()
+	if poc == 0: b.ue()
+	elif poc == 1:
+		b.u(1); se(); se()
+		for _ in range(b.ue()): se()
+	b.ue(); b.u(1); b.ue(); b.ue()			# ref frames, gaps, size in macroblocks
+	if not b.u(1): raise Unsupported("interlaced H.264: field order needs frames")
+	return "progressive"
+
+def _hvcc_pix_fmt(hvcc: bytes) -> str:
+	return _pix_fmt(hvcc[16] & 3, (hvcc[17] & 7) + 8)
+
+def _av1c_pix_fmt(av1c: bytes) -> str:
+	b = av1c[2]
+	depth = 12 if b & 0x20 else 10 if b & 0x40 else 8
+	if b & 0x10: return _pix_fmt(0, depth)
+	sx, sy = (b >> 3) & 1, (b >> 2) & 1
+	return _pix_fmt(1 if sx and sy else 2 if sx else 3, depth)
+
+def _vpcc_pix_fmt(vpcc: bytes) -> str:
+	b = vpcc[6]								# FullBox header (4) + profile + level
+	depth, sub = b >> 4, (b >> 1) & 7
+	return _pix_fmt({0: 1, 1: 1, 2: 2, 3: 3}[sub], depth)
+
+_AAC_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+
+def _aac_channels(asc: bytes) -> Tuple[int, int]:
+	"""(channels, sample rate) the AAC decoder outputs for an AudioSpecificConfig (what ffprobe reports).
+
+	SBR signalled explicitly (HE-AAC object types) or by a sync extension gives the extension rate, and a
+	mono core turns stereo unless PS is signalled off. A low rate with no SBR signalling at all is left to
+	ffprobe: only decoding tells whether implicit SBR doubles it.
+	"""
+	b = _Bits(asc)
+	def aot() -> int:
+		a = b.u(5)
+		return 32 + b.u(6) if a == 31 else a
+	def rate() -> int:
+		idx = b.u(4)
+		return b.u(24) if idx == 15 else _AAC_RATES[idx]
+	kind, core, conf = aot(), rate(), b.u(4)
+	if not 1 <= conf <= 7: raise Unsupported("AAC channel layout in PCE")
+	channels = 8 if conf == 7 else conf
+	sbr, ps, ext = -1, -1, core
+	if kind in (5, 29):
+		sbr, ps, ext = 1, (1 if kind == 29 else -1), rate()
+	else:
+		while len(asc) * 8 - b.pos > 15:		# Backward-compatible sync extension (0x2B7), as libavcodec scans for it
+			at = b.pos
+			if b.u(11) != 0x2B7:
+				b.pos = at + 1
+				continue
+			if aot() == 5:
+				sbr = b.u(1)
+				if sbr: ext = rate()
+				if sbr and ext == core: sbr = -1
+			if len(asc) * 8 - b.pos > 11 and b.u(11) == 0x548: ps = b.u(1)
+			break
+	if sbr == -1 and core <= 24000: raise Unsupported("low-rate AAC without SBR signalling")
+	if sbr != 1: return channels, core
+	return (2 if channels == 1 and ps != 0 else channels), ext
+
+def _fps(num: int, den: int) -> str:
+	if num <= 0 or den <= 0: return "0/0"
+	fr = Fraction(num, den)
+	return f"{fr.numerator}/{fr.denominator}"
+
+def _stream(index: int, ctype: str, codec: str, **fields) -> Dict[str, Any]:
+	s = {"index": index, "codec_name": codec, "codec_type": ctype}
+	s.update({k: v for k, v in fields.items() if v is not None})
+	s.setdefault("r_frame_rate", "0/0")
+	s.setdefault("avg_frame_rate", "0/0")
+	return s
+
+def _disposition(default: bool = False, forced: bool = False, attached_pic: bool = False) -> Dict[str, int]:
+	return {"default": int(default), "forced": int(forced), "attached_pic": int(attached_pic)}
+
+def _format(name: str, size: int, duration: float, nb_streams: int, tags: Dict[str, str]) -> Dict[str, Any]:
+	return {
+		"format_name": name, "nb_streams": nb_streams, "size": str(size),
+		"duration": f"{duration:.6f}", "bit_rate": str(int(size * 8 / duration)) if duration > 0 else "0",
+		"tags": tags
+	}
+
+# =============================================================================
+# 2. MP4 / QUICKTIME
+# =============================================================================
+
+_MP4_VIDEO = {b"avc1": "h264", b"avc3": "h264", b"hvc1": "hevc", b"hev1": "hevc",
+			  b"av01": "av1", b"vp09": "vp9", b"mp4v": "mpeg4"}
+_MP4_AUDIO = {b"mp4a": None, b"ac-3": "ac3", b"Opus": "opus", b"fLaC": "flac", b".mp3": "mp3"}
+_MP4_SUBS  = {b"tx3g": "mov_text", b"wvtt": "webvtt"}
+_ESDS_OTI  = {0x40: "aac", 0x66: "aac", 0x67: "aac", 0x68: "aac", 0x69: "mp3", 0x6B: "mp3", 0x20: "mpeg4"}
+_ILST_KEYS = {b"\xa9cmt": "comment", b"\xa9nam": "title", b"\xa9too": "encoder", b"\xa9ART": "artist",
+			  b"\xa9alb": "album", b"\xa9day": "date", b"\xa9gen": "genre", b"desc": "description",
+			  b"ldes": "synopsis", b"\xa9des": "description"}
+_AC3_CH    = (2, 1, 2, 3, 3, 4, 4, 5)
+_MP4_FIELD_ORDER = {b"\x01\x00": "progressive", b"\x02\x01": "tt", b"\x02\x06": "bb", b"\x02\x09": "tb", b"\x02\x0e": "bt"}
+# Macintosh language codes (mdhd < 0x400) as libavformat maps them: 0-94, then 128-138 ("" = unmapped)
+_MAC_LANG  = {i: l for i, l in list(enumerate((
+	"eng", "fra", "ger", "ita", "dut", "sve", "spa", "dan", "por", "nor", "heb", "jpn", "ara", "fin", "gre", "ice",
+	"mlt", "tur", "hr ", "chi", "urd", "hin", "tha", "kor", "lit", "pol", "hun", "est", "lav", "smi", "fo ", "per",
+	"rus", "chi", "", "iri", "alb", "ron", "ces", "slk", "slv", "yid", "sr ", "mac", "bul", "ukr", "bel", "uzb",
+	"kaz", "aze", "aze", "arm", "geo", "mol", "kir", "tgk", "tuk", "mon", "", "pus", "kur", "kas", "snd", "tib",
+	"nep", "san", "mar", "ben", "asm", "guj", "pa ", "ori", "mal", "kan", "tam", "tel", "sin", "bur", "khm", "lao",
+	"vie", "ind", "tgl", "may", "may", "amh", "tir", "orm", "som", "swa", "kin", "run", "nya", "mlg", "epo"))) +
+	list(enumerate(("wel", "baq", "cat", "lat", "que", "grn", "aym", "tat", "uig", "dzo", "jav"), 128)) if l}
+
+def _boxes(buf: bytes, start: int, end: int):
+	"""Yields (type, payload start, box end) for the boxes in buf[start:end]."""
+	pos = start
+	while pos + 8 <= end:
+		size, typ = struct.unpack_from(">I4s", buf, pos)
+		hdr = 8
+		if size == 1:
+			size, hdr = struct.unpack_from(">Q", buf, pos + 8)[0], 16
+		elif size == 0:
+			size = end - pos
+		if size < hdr or pos + size > end: raise Unsupported("truncated box")
+		yield typ, pos + hdr, pos + size
+		pos += size
+
+def _child(buf: bytes, start: int, end: int, typ: bytes) -> Optional[Tuple[int, int]]:
+	for t, s, e in _boxes(buf, start, end):
+		if t == typ: return s, e
+	return None
+
+def _read_moov(f, file_size: int) -> bytes:
+	pos = 0
+	for _ in range(MAX_TOP_BOXES):
+		if pos + 8 > file_size: break
+		f.seek(pos)
+		hdr = f.read(16)
+		size, typ = struct.unpack_from(">I4s", hdr)
+		hl = 8
+		if size == 1:
+			size, hl = struct.unpack_from(">Q", hdr, 8)[0], 16
+		elif size == 0:
+			size = file_size - pos
+		if size < hl: break
+		if typ == b"moov":
+			if size > MAX_HEADER_BYTES: raise Unsupported("moov too large")
+			data = f.read(size - hl) if hl == 16 else hdr[8:] + f.read(size - 16)
+			if len(data) != size - hl: raise Unsupported("truncated moov")
+			return data
+		pos += size
+	raise Unsupported("no moov")
+
+def _probe_mp4(f, file_size: int) -> Dict[str, Any]:
+	f.seek(0)
+	ftyp = f.read(64)
+	moov = _read_moov(f, file_size)
+	end = len(moov)
+	tags: Dict[str, str] = {}
+	if ftyp[4:8] == b"ftyp":
+		n = min(struct.unpack_from(">I", ftyp)[0], len(ftyp))
+		tags["major_brand"] = ftyp[8:12].decode("latin-1")
+		tags["minor_version"] = str(struct.unpack_from(">I", ftyp, 12)[0])
+		tags["compatible_brands"] = ftyp[16:n].decode("latin-1")
+
+	timescale, duration, streams = 0, 0, []
+	for typ, s, e in _boxes(moov, 0, end):
+		if typ == b"mvhd":
+			if moov[s] == 1: timescale, duration = struct.unpack_from(">IQ", moov, s + 20)
+			else: timescale, duration = struct.unpack_from(">II", moov, s + 12)
+		elif typ == b"trak":
+			streams.append(_mp4_trak(moov, s, e, len(streams)))
+		elif typ == b"udta":
+			_mp4_udta(moov, s, e, tags)
+		elif typ in (b"mvex", b"cmov"):
+			raise Unsupported(f"{typ!r} (fragmented / compressed movie)")
+	if not timescale or not duration or not streams: raise Unsupported("no duration / tracks")
+	dur = duration / timescale
+	return {"streams": streams, "format": _format("mov,mp4,m4a,3gp,3g2,mj2", file_size, dur, len(streams), tags)}
+
+def _mp4_trak(buf: bytes, start: int, end: int, index: int) -> Dict[str, Any]:
+	tk = _child(buf, start, end, b"tkhd")
+	mdia = _child(buf, start, end, b"mdia")
+	if not tk or not mdia: raise Unsupported("trak without tkhd / mdia")
+	tref = _child(buf, start, end, b"tref")
+	if tref and _child(buf, *tref, b"chap"): raise Unsupported("chapter track reference")
+	enabled = bool(buf[tk[0] + 3] & 1)
+
+	mdhd = _child(buf, *mdia, b"mdhd")
+	hdlr = _child(buf, *mdia, b"hdlr")
+	minf = _child(buf, *mdia, b"minf")
+	if not mdhd or not hdlr or not minf: raise Unsupported("incomplete mdia")
+	s = mdhd[0]
+	if buf[s] == 1: ts, dur = struct.unpack_from(">IQ", buf, s + 20); lang_at = s + 32
+	else: ts, dur = struct.unpack_from(">II", buf, s + 12); lang_at = s + 20
+	lang_code = struct.unpack_from(">H", buf, lang_at)[0]
+	lang = _mp4_lang(lang_code)
+	handler = buf[hdlr[0] + 8:hdlr[0] + 12]
+	handler_name = buf[hdlr[0] + 24:hdlr[1]].split(b"\0", 1)[0].decode("utf-8", "replace")
+
+	stbl = _child(buf, *minf, b"stbl")
+	if not stbl: raise Unsupported("no stbl")
+	stsd = _child(buf, *stbl, b"stsd")
+	if not stsd or struct.unpack_from(">I", buf, stsd[0] + 4)[0] != 1: raise Unsupported("stsd entry count")
+	entry = next(_boxes(buf, stsd[0] + 8, stsd[1]))
+
+	# Sample count / data size / frame timing
+	n_samples, data_size = _mp4_sizes(buf, stbl)
+	stts = _child(buf, *stbl, b"stts")
+	deltas: List[Tuple[int, int]] = []
+	if stts:
+		n = struct.unpack_from(">I", buf, stts[0] + 4)[0]
+		deltas = [struct.unpack_from(">II", buf, stts[0] + 8 + 8 * i) for i in range(n)]
+	bit_rate = str(data_size * 8 * ts // dur) if dur and ts else None
+	common = dict(
+		codec_tag_string=entry[0].decode("latin-1"), time_base=f"1/{ts}", duration=f"{dur / ts:.6f}" if ts else None,
+		bit_rate=bit_rate, nb_frames=str(n_samples), disposition=_disposition(enabled),
+		tags={"language": lang, "handler_name": handler_name} if lang else {"handler_name": handler_name}
+	)
+
+	if handler == b"vide":
+		codec, extra = _mp4_video_entry(buf, entry)
+		total = sum(c * d for c, d in deltas)
+		avg = _fps(n_samples * ts, total) if total else "0/0"
+		common_delta = max(deltas, key=lambda cd: cd[0])[1] if deltas else 0
+		r = _fps(ts, common_delta) if common_delta else avg
+		return _stream(index, "video", codec, avg_frame_rate=avg, r_frame_rate=r, **extra, **common)
+	if handler == b"soun":
+		codec, extra = _mp4_audio_entry(buf, entry)
+		return _stream(index, "audio", codec, **extra, **common)
+	if handler in (b"sbtl", b"text", b"subt") and entry[0] in _MP4_SUBS:
+		return _stream(index, "subtitle", _MP4_SUBS[entry[0]], **common)
+	raise Unsupported(f"handler {handler!r} / {entry[0]!r}")
+
+def _mp4_lang(code: int) -> Optional[str]:
+	"""mdhd language as ffmpeg reads it: packed ISO 639-2 or an old Macintosh code (None: no language tag)."""
+	if code >= 0x400 and code != 0x7FFF:
+		return "".join(chr(((code >> sh) & 0x1F) + 0x60) for sh in (10, 5, 0))
+	return _MAC_LANG.get(code)
+
+def _mp4_sizes(buf: bytes, stbl: Tuple[int, int]) -> Tuple[int, int]:
+	stsz = _child(buf, *stbl, b"stsz")
+	if not stsz: raise Unsupported("no stsz")
+	s = stsz[0]
+	sample_size, count = struct.unpack_from(">II", buf, s + 4)
+	if sample_size: return count, sample_size * count
+	sizes = array("I")
+	sizes.frombytes(buf[s + 12:s + 12 + 4 * count])
+	if sizes.itemsize != 4 or len(sizes) != count: raise Unsupported("stsz table")
+	if sys.byteorder == "little": sizes.byteswap()
+	return count, sum(sizes)
+
+def _mp4_video_entry(buf: bytes, entry) -> Tuple[str, Dict[str, Any]]:
+	typ, s, e = entry
+	codec = _MP4_VIDEO.get(typ)
+	if codec is None: raise Unsupported(f"video entry {typ!r}")
+	width, height = struct.unpack_from(">HH", buf, s + 24)
+	kids = {t: (cs, ce) for t, cs, ce in _boxes(buf, s + 78, e)}
+	if b"sinf" in kids: raise Unsupported("encrypted")
+	if codec == "h264":
+		pix = _avcc_pix_fmt(buf[slice(*kids[b"avcC"])])
+	elif codec == "hevc":
+		pix = _hvcc_pix_fmt(buf[slice(*kids[b"hvcC"])])
+	elif codec == "av1":
+		pix = _av1c_pix_fmt(buf[slice(*kids[b"av1C"])])
+	elif codec == "vp9":
+		pix = _vpcc_pix_fmt(buf[slice(*kids[b"vpcC"])])
+	else:
+		esds = kids.get(b"esds")
+		if not esds or _esds(buf[slice(*esds)])[0] != 0x20: raise Unsupported("mp4v object type")
+		pix = "yuv420p"
+	extra: Dict[str, Any] = {"width": width, "height": height, "pix_fmt": pix}
+	fiel = kids.get(b"fiel")
+	if fiel:		# The container's field order beats the bitstream's
+		order = _MP4_FIELD_ORDER.get(buf[fiel[0]:fiel[0] + 2])
+		if order: extra["field_order"] = order
+		elif codec == "h264": raise Unsupported("unknown fiel: field order needs frames")
+	elif codec == "h264":
+		extra["field_order"] = _avcc_field_order(buf[slice(*kids[b"avcC"])])
+	colr = kids.get(b"colr")
+	if colr and buf[colr[0]:colr[0] + 4] in (b"nclx", b"nclc"):
+		extra["color_transfer"] = _TRANSFER.get(struct.unpack_from(">H", buf, colr[0] + 6)[0])
+	return codec, extra
+
+def _mp4_audio_entry(buf: bytes, entry) -> Tuple[str, Dict[str, Any]]:
+	typ, s, e = entry
+	if typ not in _MP4_AUDIO: raise Unsupported(f"audio entry {typ!r}")
+	version = struct.unpack_from(">H", buf, s + 8)[0]
+	if version > 1: raise Unsupported("QuickTime v2 sound entry")
+	channels = struct.unpack_from(">H", buf, s + 16)[0]
+	rate = struct.unpack_from(">I", buf, s + 24)[0] >> 16
+	kids = {t: (cs, ce) for t, cs, ce in _boxes(buf, s + (44 if version == 1 else 28), e)}
+	codec = _MP4_AUDIO[typ]
+	if typ == b"mp4a":
+		oti, asc = _esds(buf[slice(*kids[b"esds"])])
+		codec = _ESDS_OTI.get(oti)
+		if codec not in ("aac", "mp3"): raise Unsupported(f"mp4a object type {oti:#x}")
+		if codec == "aac":
+			channels, rate = _aac_channels(asc)
+	elif typ == b"ac-3":
+		b = buf[kids[b"dac3"][0]:kids[b"dac3"][1]]
+		acmod, lfe = (b[1] >> 3) & 7, (b[1] >> 2) & 1
+		channels = _AC3_CH[acmod] + lfe
+	elif typ == b"Opus":
+		channels = buf[kids[b"dOps"][0] + 1]
+		rate = 48000
+	return codec, {"sample_rate": str(rate), "channels": channels}
+
+def _esds(esds: bytes) -> Tuple[int, bytes]:
+	"""(objectTypeIndication, DecoderSpecificInfo) from an esds payload (FullBox)."""
+	pos, oti, dsi = 4, 0, b""
+
+	def desc(p: int) -> Tuple[int, int, int]:
+		tag, ln = esds[p], 0
+		p += 1
+		for _ in range(4):
+			b = esds[p]; p += 1
+			ln = (ln << 7) | (b & 0x7F)
+			if not b & 0x80: break
+		return tag, p, ln
+
+	tag, pos, ln = desc(pos)
+	if tag != 3: raise Unsupported("esds without ES_Descriptor")
+	flags = esds[pos + 2]
+	pos += 3
+	if flags & 0x80: pos += 2
+	if flags & 0x40: pos += 1 + esds[pos]
+	if flags & 0x20: pos += 2
+	tag, pos, ln = desc(pos)
+	if tag != 4: raise Unsupported("esds without DecoderConfigDescriptor")
+	oti = esds[pos]
+	end = pos + ln
+	pos += 13
+	if pos < end:
+		tag, pos, ln = desc(pos)
+		if tag == 5: dsi = esds[pos:pos + ln]
+	return oti, dsi
+
+def _mp4_udta(buf: bytes, start: int, end: int, tags: Dict[str, str]) -> None:
+	for typ, s, e in _boxes(buf, start, end):
+		if typ == b"meta":
+			if buf[s + 4:s + 8] != b"hdlr": s += 4		# ISO FullBox header (QuickTime 'meta' has none)
+			ilst = _child(buf, s, e, b"ilst")
+			if not ilst: continue
+			for key, ks, ke in _boxes(buf, *ilst):
+				if key == b"covr": raise Unsupported("cover art (attached picture stream)")
+				name = _ILST_KEYS.get(key)
+				data = _child(buf, ks, ke, b"data")
+				if name and data and struct.unpack_from(">I", buf, data[0])[0] & 0xFFFFFF == 1:
+					tags[name] = buf[data[0] + 8:data[1]].decode("utf-8", "replace")
+		elif typ[:1] == b"\xa9" and typ in _ILST_KEYS and e - s >= 4:
+			ln = struct.unpack_from(">H", buf, s)[0]
+			tags.setdefault(_ILST_KEYS[typ], buf[s + 4:s + 4 + ln].decode("utf-8", "replace"))
+
+# =============================================================================
+# 3. MATROSKA / WEBM
+# =============================================================================
+
+_MKV_CODECS = {
+	"V_MPEG4/ISO/AVC": "h264", "V_MPEGH/ISO/HEVC": "hevc", "V_AV1": "av1", "V_VP9": "vp9", "V_VP8": "vp8",
+	"V_MPEG4/ISO/ASP": "mpeg4", "V_MPEG4/ISO/SP": "mpeg4", "V_MPEG4/ISO/AP": "mpeg4", "V_MPEG2": "mpeg2video",
+	"A_AAC": "aac", "A_AC3": "ac3", "A_EAC3": "eac3", "A_MPEG/L3": "mp3", "A_MPEG/L2": "mp2",
+	"A_OPUS": "opus", "A_VORBIS": "vorbis", "A_FLAC": "flac",
+	"S_TEXT/UTF8": "subrip", "S_TEXT/ASCII": "subrip", "S_TEXT/ASS": "ass", "S_TEXT/SSA": "ass",
+	"S_ASS": "ass", "S_SSA": "ass", "S_TEXT/WEBVTT": "webvtt", "S_VOBSUB": "dvd_subtitle",
+	"S_HDMV/PGS": "hdmv_pgs_subtitle", "S_DVBSUB": "dvb_subtitle",
+}
+_MKV_TYPES = {1: "video", 2: "audio", 17: "subtitle"}
+_MKV_FIELD_ORDER = {0: "progressive", 1: "tt", 6: "bb", 9: "tb", 14: "bt"}	# FlagInterlaced = 1: FieldOrder
+_MKV_FRAME_BITRATE = {"ac3", "eac3", "mp3", "mp2"}		# ffprobe reads these from the first audio frame
+_MKV_IMAGE_MIME = {"image/jpeg": "mjpeg", "image/png": "png", "image/gif": "gif", "image/bmp": "bmp",
+				   "image/tiff": "tiff", "image/webp": "webp"}
+
+# Element IDs
+_SEGMENT, _SEEKHEAD, _INFO, _TRACKS, _TAGS, _ATTACH, _CLUSTER = \
+	0x18538067, 0x114D9B74, 0x1549A966, 0x1654AE6B, 0x1254C367, 0x1941A469, 0x1F43B675
+_VOID, _CRC32 = 0xEC, 0xBF
+
+def _vint(data: bytes, pos: int, keep_marker: bool) -> Tuple[int, int]:
+	first = data[pos]
+	if not first: raise Unsupported("bad EBML vint")
+	ln = 9 - first.bit_length()
+	if len(data) < pos + ln: raise Unsupported("truncated vint")
+	v = first if keep_marker else first & (0xFF >> ln)
+	for b in data[pos + 1:pos + ln]:
+		v = (v << 8) | b
+	return v, pos + ln
+
+def _elements(data: bytes, start: int = 0, end: Optional[int] = None):
+	"""Yields (id, payload start, payload end) for the EBML elements in data[start:end]."""
+	end = len(data) if end is None else end
+	pos = start
+	while pos < end:
+		eid, pos = _vint(data, pos, True)
+		size, pos = _vint(data, pos, False)
+		yield eid, pos, min(pos + size, end)
+		pos += size
+
+def _uint(data: bytes, s: int, e: int) -> int:
+	return int.from_bytes(data[s:e], "big")
+
+def _float(data: bytes, s: int, e: int) -> float:
+	return struct.unpack(">f" if e - s == 4 else ">d", data[s:e])[0]
+
+def _text(data: bytes, s: int, e: int) -> str:
+	return data[s:e].split(b"\0", 1)[0].decode("utf-8", "replace")
+
+class _Mkv:
+	"""Matroska reader: walks the Segment top level by seeking, reads only the wanted elements."""
+	def __init__(self, f, size: int):
+		self.f, self.size = f, size
+
+	def _header(self, pos: int) -> Tuple[int, int, int]:
+		"""(id, payload position, payload size) of the element at pos."""
+		self.f.seek(pos)
+		raw = self.f.read(16)
+		eid, p = _vint(raw, 0, True)
+		size, p2 = _vint(raw, p, False)
+		if size == (1 << (7 * (p2 - p))) - 1: size = self.size - (pos + p2)		# Unknown size
+		return eid, pos + p2, size
+
+	def _read(self, pos: int, size: int) -> bytes:
+		if size > MAX_HEADER_BYTES: raise Unsupported("Matroska element too large")
+		self.f.seek(pos)
+		return self.f.read(size)
+
+	def probe(self) -> Dict[str, Any]:
+		eid, p, sz = self._header(0)
+		doc = self._read(p, sz)
+		doctype = next((_text(doc, s, e) for i, s, e in _elements(doc) if i == 0x4282), "matroska")
+		if doctype not in ("matroska", "webm"): raise Unsupported(doctype)
+		seg_id, seg_start, seg_size = self._header(p + sz)
+		if seg_id != _SEGMENT: raise Unsupported("no Segment")
+		seg_end = min(self.size, seg_start + seg_size)
+
+		# Top level: stop at the first Cluster, follow the SeekHead for elements stored later
+		found: Dict[int, Tuple[int, int]] = {}
+		seeks: List[int] = []
+		first_cluster = None
+		pos = seg_start
+		for _ in range(MAX_TOP_BOXES):
+			if pos >= seg_end: break
+			eid, p, sz = self._header(pos)
+			if eid == _CLUSTER:
+				first_cluster = (p, sz)
+				break
+			if eid in (_INFO, _TRACKS, _TAGS, _ATTACH): found.setdefault(eid, (p, sz))
+			elif eid == _SEEKHEAD: seeks += self._seekhead(self._read(p, sz), seg_start)
+			pos = p + sz
+		for sp in seeks:
+			if sp < seg_end:
+				eid, p, sz = self._header(sp)
+				if eid in (_INFO, _TRACKS, _TAGS, _ATTACH): found.setdefault(eid, (p, sz))
+		if _INFO not in found or _TRACKS not in found: raise Unsupported("no Info / Tracks")
+
+		info = self._read(*found[_INFO])
+		scale, duration, tags, app = 1_000_000, 0.0, {}, ""
+		for i, s, e in _elements(info):
+			if i == 0x2AD7B1: scale = _uint(info, s, e)
+			elif i == 0x4489: duration = _float(info, s, e)
+			elif i == 0x7BA9: tags["title"] = _text(info, s, e)
+			elif i == 0x4D80: app = _text(info, s, e)
+		dur = duration * scale / 1e9
+		if dur <= 0: raise Unsupported("no Segment duration")
+
+		streams, uids = self._tracks(self._read(*found[_TRACKS]))
+		if re.match(r"Lavf57\.(3[6-9]|4\d|5[01])\.1\d\d", app):		# That muxer swapped tb / bt
+			for s in streams:
+				s["field_order"] = {"tb": "bt", "bt": "tb"}.get(s.get("field_order"), s.get("field_order"))
+		if _TAGS in found:
+			self._tags(self._read(*found[_TAGS]), tags, uids)
+		if _ATTACH in found:
+			self._attachments(*found[_ATTACH], streams)
+		need_frames = [s for s in streams if s["codec_name"] in _MKV_FRAME_BITRATE]
+		if need_frames:
+			if not first_cluster: raise Unsupported("no Cluster for frame bitrates")
+			self._frame_bitrates(*first_cluster, need_frames)
+		for s in streams:
+			s.pop("_track", None)
+		return {"streams": streams, "format": _format("matroska,webm", self.size, dur, len(streams), tags)}
+
+	@staticmethod
+	def _seekhead(data: bytes, seg_start: int) -> List[int]:
+		out = []
+		for i, s, e in _elements(data):
+			if i != 0x4DBB: continue
+			sid, spos = 0, None
+			for j, cs, ce in _elements(data, s, e):
+				if j == 0x53AB: sid = _uint(data, cs, ce)
+				elif j == 0x53AC: spos = _uint(data, cs, ce)
+			if sid in (_INFO, _TRACKS, _TAGS, _ATTACH) and spos is not None:
+				out.append(seg_start + spos)
+		return out
+
+	def _tracks(self, data: bytes) -> Tuple[List[Dict[str, Any]], Dict[int, Dict[str, Any]]]:
+		streams, uids = [], {}
+		for i, s, e in _elements(data):
+			if i != 0xAE: continue
+			t: Dict[int, Tuple[int, int]] = {j: (cs, ce) for j, cs, ce in _elements(data, s, e)}
+			ttype = _uint(data, *t[0x83]) if 0x83 in t else 0
+			codec_id = _text(data, *t[0x86]) if 0x86 in t else ""
+			ctype = _MKV_TYPES.get(ttype)
+			codec = _MKV_CODECS.get(codec_id)
+			if not ctype or not codec: raise Unsupported(f"track {ttype} / {codec_id}")
+			if 0x6D80 in t: raise Unsupported("content encoding")
+			lang = _text(data, *t[0x22B59C]) if 0x22B59C in t else "eng"
+			tags: Dict[str, str] = {}
+			if lang != "und": tags["language"] = lang
+			if 0x536E in t: tags["title"] = _text(data, *t[0x536E])
+			default = _uint(data, *t[0x88]) if 0x88 in t else 1
+			forced = _uint(data, *t[0x55AA]) if 0x55AA in t else 0
+			private = data[slice(*t[0x63A2])] if 0x63A2 in t else b""
+			extra: Dict[str, Any] = {}
+
+			if ctype == "video":
+				extra = self._video(data, t, codec, private)
+			elif ctype == "audio":
+				a = {j: (cs, ce) for j, cs, ce in _elements(data, *t[0xE1])} if 0xE1 in t else {}
+				rate = _float(data, *a[0x78B5]) if 0x78B5 in a else _float(data, *a[0xB5]) if 0xB5 in a else 8000.0
+				channels = _uint(data, *a[0x9F]) if 0x9F in a else 1
+				if codec == "aac":
+					if not private: raise Unsupported("A_AAC without CodecPrivate")
+					channels, rate = _aac_channels(private)
+				extra = {"sample_rate": str(int(rate)), "channels": channels}
+
+			st = _stream(len(streams), ctype, codec, disposition=_disposition(bool(default), bool(forced)),
+						 tags=tags, **extra)
+			st["_track"] = _uint(data, *t[0xD7]) if 0xD7 in t else 0
+			streams.append(st)
+			if 0x73C5 in t: uids[_uint(data, *t[0x73C5])] = st
+		if not streams: raise Unsupported("no tracks")
+		return streams, uids
+
+	@staticmethod
+	def _video(data: bytes, t, codec: str, private: bytes) -> Dict[str, Any]:
+		if 0x23E383 not in t: raise Unsupported("no DefaultDuration (frame rate needs packets)")
+		v = {j: (cs, ce) for j, cs, ce in _elements(data, *t[0xE0])} if 0xE0 in t else {}
+		if 0xB0 not in v or 0xBA not in v: raise Unsupported("no pixel size")
+		colour = {j: (cs, ce) for j, cs, ce in _elements(data, *v[0x55B0])} if 0x55B0 in v else {}
+		if codec == "h264": pix = _avcc_pix_fmt(private)
+		elif codec == "hevc": pix = _hvcc_pix_fmt(private)
+		elif codec == "av1": pix = _av1c_pix_fmt(private)
+		elif codec in ("vp9", "vp8") and (codec == "vp8" or 0x55B2 in colour):
+			depth = _uint(data, *colour[0x55B2]) if 0x55B2 in colour else 8
+			pix = _pix_fmt(1, depth)
+		elif codec in ("mpeg4", "mpeg2video"): pix = "yuv420p"
+		else: raise Unsupported(f"{codec} pixel format")
+
+		fr = Fraction(1_000_000_000, _uint(data, *t[0x23E383])).limit_denominator(30000)
+		out = {"width": _uint(data, *v[0xB0]), "height": _uint(data, *v[0xBA]), "pix_fmt": pix,
+			   "avg_frame_rate": f"{fr.numerator}/{fr.denominator}", "r_frame_rate": f"{fr.numerator}/{fr.denominator}"}
+		flag = _uint(data, *v[0x9A]) if 0x9A in v else 0
+		order = _MKV_FIELD_ORDER.get(_uint(data, *v[0x9D])) if flag == 1 and 0x9D in v else None
+		if flag == 2: out["field_order"] = "progressive"
+		elif order: out["field_order"] = order
+		elif codec == "h264": out["field_order"] = _avcc_field_order(private)
+		elif codec == "mpeg2video": raise Unsupported("field order left to the bitstream")
+		if 0x55BA in colour:
+			out["color_transfer"] = _TRANSFER.get(_uint(data, *colour[0x55BA]))
+		return out
+
+	@staticmethod
+	def _tags(data: bytes, fmt_tags: Dict[str, str], uids: Dict[int, Dict[str, Any]]) -> None:
+		for i, s, e in _elements(data):
+			if i != 0x7373: continue
+			target, simple = None, []
+			for j, cs, ce in _elements(data, s, e):
+				if j == 0x63C0:
+					for k, ks, ke in _elements(data, cs, ce):
+						if k == 0x63C5: target = _uint(data, ks, ke)
+						elif k in (0x63C9, 0x63C4, 0x63C6): target = -1		# Edition / chapter / attachment
+				elif j == 0x67C8:
+					name = value = None
+					for k, ks, ke in _elements(data, cs, ce):
+						if k == 0x45A3: name = _text(data, ks, ke)
+						elif k == 0x4487: value = _text(data, ks, ke)
+					if name and value is not None: simple.append((name, value))
+			if target == -1: continue
+			dest = fmt_tags if not target else uids.get(target, {}).get("tags")
+			if dest is not None:
+				for name, value in simple: dest[name] = value
+
+	def _attachments(self, pos: int, size: int, streams: List[Dict[str, Any]]) -> None:
+		end = pos + size
+		while pos < end:
+			eid, p, sz = self._header(pos)
+			if eid == 0x61A7:
+				name = mime = None
+				has_data = False
+				cp = p
+				while cp < p + sz:
+					cid, cpp, csz = self._header(cp)
+					if cid == 0x466E: name = _text(self._read(cpp, csz), 0, csz)
+					elif cid == 0x4660: mime = _text(self._read(cpp, csz), 0, csz)
+					elif cid == 0x465C: has_data = csz > 0
+					cp = cpp + csz
+				if name and mime and has_data:
+					img = _MKV_IMAGE_MIME.get(mime)
+					if img:
+						streams.append(_stream(len(streams), "video", img, disposition=_disposition(attached_pic=True),
+											   tags={"filename": name, "mimetype": mime}))
+					else:
+						streams.append(_stream(len(streams), "attachment", "none", disposition=_disposition(),
+											   tags={"filename": name, "mimetype": mime}))
+			pos = p + sz
+
+	def _frame_bitrates(self, pos: int, size: int, wanted: List[Dict[str, Any]]) -> None:
+		"""Fills bit_rate for ac3 / eac3 / mp3 / mp2 tracks from their first frame header in the first Cluster."""
+		data = self._read(pos, min(size, 4 * 1024 * 1024))
+		todo = {s["_track"]: s for s in wanted}
+		for i, s, e in _elements(data):
+			if i == 0xA0:			# BlockGroup -> Block
+				blk = next(((cs, ce) for j, cs, ce in _elements(data, s, e) if j == 0xA1), None)
+				if not blk: continue
+				s, e = blk
+			elif i != 0xA3:
+				continue
+			track, p = _vint(data, s, False)
+			st = todo.get(track)
+			if st is None: continue
+			frame = data[_first_frame(data, p + 3, e, data[p + 2]):e]
+			st["bit_rate"] = str(_frame_bitrate(st["codec_name"], frame))
+			del todo[track]
+			if not todo: return
+		raise Unsupported("audio frame not in the first Cluster")
+
+def _first_frame(data: bytes, pos: int, end: int, flags: int) -> int:
+	"""Offset of the first frame of a (possibly laced) block payload."""
+	lacing = (flags >> 1) & 3
+	if lacing == 0: return pos
+	count = data[pos] + 1
+	pos += 1
+	if lacing == 2: return pos			# Fixed-size lacing
+	if lacing == 1:						# Xiph
+		for _ in range(count - 1):
+			while data[pos] == 255: pos += 1
+			pos += 1
+		return pos
+	_, pos = _vint(data, pos, False)	# EBML lacing: first size, then signed differences
+	for _ in range(count - 2):
+		_, pos = _vint(data, pos, False)
+	return pos
+
+_AC3_KBPS = (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384, 448, 512, 576, 640)
+_MPA_KBPS = {	# (MPEG-1?, layer) -> table
+	(True, 3):  (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+	(True, 2):  (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+	(False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+	(False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+def _frame_bitrate(codec: str, frame: bytes) -> int:
+	if codec in ("ac3", "eac3"):
+		if frame[:2] != b"\x0b\x77": raise Unsupported("no AC-3 sync")
+		bsid = frame[5] >> 3
+		if bsid <= 10:
+			code = frame[4] & 0x3F
+			return _AC3_KBPS[code >> 1] * 1000
+		# E-AC-3: frame size and block count -> bitrate at the frame's sample rate
+		words = (((frame[2] & 7) << 8) | frame[3]) + 1
+		fscod = frame[4] >> 6
+		if fscod == 3:
+			rate, blocks = (24000, 22050, 16000)[(frame[4] >> 4) & 3], 6
+		else:
+			rate, blocks = (48000, 44100, 32000)[fscod], (1, 2, 3, 6)[(frame[4] >> 4) & 3]
+		return words * 2 * 8 * rate // (blocks * 256)
+	if frame[0] != 0xFF or frame[1] & 0xE0 != 0xE0: raise Unsupported("no MPEG audio sync")
+	mpeg1 = bool(frame[1] & 0x08)
+	layer = 4 - ((frame[1] >> 1) & 3)
+	table = _MPA_KBPS.get((mpeg1, layer))
+	if not table: raise Unsupported("MPEG audio layer")
+	kbps = table[frame[2] >> 4]
+	if not kbps: raise Unsupported("free-format MPEG audio")
+	return kbps * 1000
+
+# =============================================================================
+# 4. FFPROBE TIERS
+# =============================================================================
+
+SHALLOW_PROBESIZE  = "1M"			# Bytes read to find streams in the shallow pass
+SHALLOW_ANALYZE_US = "500000"		# Microseconds of packets analysed in the shallow pass
+DEEP_PROBESIZE     = "50M"
+DEEP_ANALYZE_US    = "20000000"
+
+# Exactly the fields FFMpeg.parse_finfo / parse_video / parse_audio / parse_subtl read
+PLANNER_ENTRIES = (
+	"stream=index,codec_name,codec_type,width,height,pix_fmt,avg_frame_rate,r_frame_rate,"
+	"field_order,color_transfer,channels,sample_rate,bit_rate"
+	":stream_tags=language:stream_disposition=default,forced,attached_pic"
+	":format=duration,bit_rate,size:format_tags=comment"
+)
+PLANNER_NEEDS = ("video_size", "frame_rate", "pix_fmt", "audio", "duration", "bit_rate")
+
+def ffprobe_cmd(exe: str, path: str, tier: str, entries: str = PLANNER_ENTRIES) -> List[str]:
+	"""ffprobe command line for one tier: "shallow" (trimmed entries) or "deep" (full dump, large probe)."""
+	if tier == "shallow":
+		return [exe, "-v", "error", "-probesize", SHALLOW_PROBESIZE, "-analyzeduration", SHALLOW_ANALYZE_US,
+				"-show_entries", entries, "-of", "json", path]
+	return [exe, "-v", "error", "-probesize", DEEP_PROBESIZE, "-analyzeduration", DEEP_ANALYZE_US,
+			"-show_streams", "-show_format", "-of", "json", path]
+
+def probe_tiers(path: str) -> Tuple[str, ...]:
+	"""ffprobe tiers for a file: the shallow pass only where the header lists every stream (MP4 / Matroska).
+
+	MPEG-PS / TS, AVI and the rest can announce a stream past the shallow probesize, and missing_fields can't
+	flag a track that was never found, so they get the deep pass straight away.
+	"""
+	try:
+		with open(path, "rb") as f:
+			head = f.read(12)
+	except OSError:
+		return ("deep",)
+	return ("shallow", "deep") if head[:4] == _EBML or head[4:8] in _MP4_TOP else ("deep",)
+
+def missing_fields(data: Optional[Dict[str, Any]], needs: Collection[str] = PLANNER_NEEDS) -> List[str]:
+	"""Required fields that are absent or inconsistent in ffprobe-shaped data ([] = good enough).
+
+	needs: any of video_size, frame_rate, pix_fmt, audio, duration, bit_rate.
+	"""
+	if not data or not data.get("streams"):
+		return ["streams"]
+	fmt = data.get("format", {}) or {}
+	out = []
+	videos = [s for s in data["streams"] if s.get("codec_type") == "video"
+			  and not (s.get("disposition") or {}).get("attached_pic")]
+	for v in videos:
+		if "video_size" in needs and not (int(v.get("width") or 0) and int(v.get("height") or 0)):
+			out.append("video_size")
+		if "frame_rate" in needs and str(v.get("avg_frame_rate", "0/0")).split("/")[0] in ("0", ""):
+			out.append("frame_rate")
+		if "pix_fmt" in needs and not v.get("pix_fmt"):
+			out.append("pix_fmt")
+	if "audio" in needs:
+		for a in (s for s in data["streams"] if s.get("codec_type") == "audio"):
+			if not (int(a.get("channels") or 0) and int(a.get("sample_rate") or 0)):
+				out.append("audio")
+	try: dur = float(fmt.get("duration") or 0)
+	except ValueError: dur = 0.0
+	br, size = int(fmt.get("bit_rate") or 0), int(fmt.get("size") or 0)
+	if "duration" in needs and dur <= 0:
+		out.append("duration")
+	if "bit_rate" in needs:
+		if br <= 0: out.append("bit_rate")
+		elif dur > 0 and size > 0 and not 0.5 < (br * dur / 8) / size < 2.0:
+			out.append("bit_rate~size")		# Container bitrate doesn't match size / duration
+	return sorted(set(out))
+
+class TierStats:
+	"""Thread-safe per-tier probe counters: calls, total seconds and why the deep pass fired."""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.calls: Counter = Counter()
+		self.seconds: Counter = Counter()
+		self.deep_reasons: Counter = Counter()
+
+	def record(self, tier: str, seconds: float, reasons: Collection[str] = ()) -> None:
+		with self._lock:
+			self.calls[tier] += 1
+			self.seconds[tier] += seconds
+			self.deep_reasons.update(reasons)
+
+	def summary(self) -> str:
+		with self._lock:
+			if not self.calls: return ""
+			parts = [f"{t}: {n} ({self.seconds[t] / n * 1000:.1f} ms avg)" for t, n in self.calls.items()]
+			line = "Probe tiers | " + " | ".join(parts)
+			if self.deep_reasons:
+				line += " | deep for: " + ", ".join(f"{k} x{v}" for k, v in self.deep_reasons.most_common())
+			return line
+
+	def reset(self) -> None:
+		with self._lock:
+			self.calls.clear(); self.seconds.clear(); self.deep_reasons.clear()
+
+STATS = TierStats()
@@ -60,9 +60,16 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from PySide6 import QtCore, QtGui, QtWidgets
 
+import Scan_cache
+import Media_walk
+import Probe_native
+
 # ---------------- Configuration & globals ----------------
 
 CONFIG_FILE = "scan_select_play_config.json"
+MANIFEST_DB = "scan_select_play_manifest.db"   # Directory manifests for fast rescans
+USE_SCAN_MANIFEST: bool = True
+WALK_WORKERS: int = 8    # Concurrent directory listings (network shares)
 
 # Default values (editable via Settings dialog)
 SOURCE_DIRS: List[str] = [
@@ -206,6 +213,7 @@ class MediaInfo:
 
 MEDIA_INFO_CACHE: Dict[str, MediaInfo] = {}
 media_cache_lock = threading.Lock()
+MEDIA_INFO_ENTRIES = "stream=codec_type,width,height:stream_disposition=attached_pic"	# All get_media_info reads
 
 
 def human_size(num_bytes: Optional[int]) -> str:
@@ -237,18 +245,19 @@ def get_media_info(path: Path) -> MediaInfo:
 	except Exception:
 		pass
 
-	# ffprobe
+	# ffprobe: shallow pass for the few fields shown (MP4 / Matroska), deep pass if the frame size is missing
 	try:
-		cmd = [
-			"ffprobe",
-			"-v", "error",
-			"-show_streams",
-			"-of", "json",
-			str(path),
-		]
-		res = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-		if res.returncode == 0 and res.stdout.strip():
-			data = json.loads(res.stdout)
+		data, reasons = None, []
+		for tier in Probe_native.probe_tiers(str(path)):
+			t0 = time.perf_counter()
+			cmd = Probe_native.ffprobe_cmd("ffprobe", str(path), tier, MEDIA_INFO_ENTRIES)
+			res = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+			Probe_native.STATS.record(tier, time.perf_counter() - t0, reasons)
+			if res.returncode == 0 and res.stdout.strip():
+				data = json.loads(res.stdout)
+			reasons = Probe_native.missing_fields(data, ("video_size",))
+			if not reasons: break
+		if data:
 			for st in data.get("streams", []):
 				ctype = st.get("codec_type")
 				if ctype == "video":
@@ -296,14 +305,14 @@ def parse_title_year(path: Path) -> Tuple[str, Optional[str]]:
 	return title, year
 
 
-def iter_video_files(root: Path) -> List[Path]:
-	exts = tuple("." + e.lower() for e in VIDEO_EXTENSIONS)
-	files: List[Path] = []
-	for dirpath, _dirnames, filenames in os.walk(root):
-		for fn in filenames:
-			if fn.lower().endswith(exts):
-				files.append(Path(dirpath) / fn)
-	return files
+def iter_video_files(
+	root: Path,
+	manifest: Optional[Scan_cache.ScanCache] = None,
+	cancel_cb: Optional[Callable[[], bool]] = None,
+) -> List[Path]:
+	# With a manifest, unchanged folders come straight from it (one stat per directory)
+	return [Path(e.path) for e in Media_walk.walk_media(str(root), VIDEO_EXTENSIONS, manifest, cancel_cb=cancel_cb,
+															 workers=WALK_WORKERS, sort=True)]
 
 
 def exclude_match(path: Path) -> bool:
@@ -324,11 +333,21 @@ def scan_sources_with_progress(
 	"""
 	roots = [Path(d) for d in dirs if d]
 	candidates: List[Path] = []
-	for r in roots:
-		if not r.exists():
-			safe_print(f"Warning: source dir does not exist: {r}")
-			continue
-		candidates.extend(iter_video_files(r))
+	manifest: Optional[Scan_cache.ScanCache] = None
+	if USE_SCAN_MANIFEST:
+		try:
+			manifest = Scan_cache.SqliteScanCache(Path(MANIFEST_DB))
+		except Exception as e:
+			safe_print(f"Warning: manifest cache unavailable ({e}), doing a full walk.")
+	try:
+		for r in roots:
+			if not r.exists():
+				safe_print(f"Warning: source dir does not exist: {r}")
+				continue
+			candidates.extend(iter_video_files(r, manifest, cancel_cb))
+	finally:
+		if manifest is not None:
+			manifest.close()
 	total = len(candidates)
 	safe_print(f"Found {total} media files in {len(roots)} folder(s).")
 	if total == 0:
@@ -732,6 +751,8 @@ class MetadataWorker(QtCore.QObject):
 						info = MediaInfo()
 					self.progress.emit(p, info.__dict__.copy())
 		finally:
+			if Probe_native.STATS.calls:
+				safe_print(Probe_native.STATS.summary())
 			self.finished.emit()
 
 
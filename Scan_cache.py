@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Scan_cache.py
+	- Pluggable probe-result cache for Trans_code.scan_folder.
+	- SQLite engine (default): indexed lookups, batched commits while the scan runs.
+	- JSON engine: the legacy WORK_DIR/scan_cache.json file, loaded and rewritten whole.
+	- Content fingerprints (size + head/middle/tail blocks) let moved or renamed files
+	  hit their old probe record instead of being re-probed.
+	- Probe failures are cached too (error class + time) and retried only after a TTL.
+	- Directory manifests (dir mtime, entry count, digest of sorted names, media files)
+	  let Media_walk.walk_media reuse unchanged folders without listing or stat'ing them.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from abc 		import ABC, abstractmethod
+from typing 	import Any, Dict, Iterator, Optional, Tuple
+from hashlib 	import sha1
+from pathlib 	import Path
+
+JSON_CACHE_NAME 	= "scan_cache.json"
+SQLITE_CACHE_NAME 	= "scan_cache.db"
+FP_BLOCK 			= 64 * 1024		# Bytes hashed at each of head / middle / tail
+
+# =============================================================================
+# 1. KEYS & RECORDS
+# =============================================================================
+
+def cache_key(path: str, size: int, mtime: float) -> str:
+	"""Primary key: sha1 of path|size|mtime (same formula as the legacy JSON cache)."""
+	return sha1(f"{path}|{size}|{mtime}".encode()).hexdigest()
+
+def content_fingerprint(path: str, size: Optional[int] = None, block: int = FP_BLOCK) -> Optional[str]:
+	"""Move-proof second-level key: sha1 of the size plus three sampled blocks.
+
+	Small files (<= 3 blocks) are hashed whole. Returns None if the file can't be read.
+	"""
+	try:
+		if size is None: size = os.path.getsize(path)
+		h = sha1(str(size).encode())
+		with open(path, "rb", buffering=0) as f:
+			if size <= 3 * block:
+				h.update(f.read())
+			else:
+				for off in (0, (size - block) // 2, size - block):
+					f.seek(off)
+					h.update(f.read(block))
+		return h.hexdigest()
+	except OSError:
+		return None
+
+def _plain(metadata: Any) -> Any:
+	"""VideoMeta (or any object) -> JSON serialisable dict."""
+	if hasattr(metadata, "__dict__"): return dict(metadata.__dict__)
+	return metadata
+
+def error_class(is_corrupted: bool, error_msg: Optional[str]) -> Optional[str]:
+	"""Coarse failure class: corrupt / timeout / unreadable / no_gain / probe (None if the probe succeeded)."""
+	if is_corrupted: return "corrupt"
+	if not error_msg: return None
+	msg = str(error_msg).lower()
+	if "timed out" in msg or "timeout" in msg: return "timeout"
+	if "invalid data" in msg or "moov atom not found" in msg or "json parse" in msg: return "unreadable"
+	if msg.startswith("not worth encoding"): return "no_gain"
+	return "probe"
+
+def make_record(metadata: Any, is_corrupted: bool = False, error_msg: Optional[str] = None) -> Dict[str, Any]:
+	rec = {"metadata": _plain(metadata), "is_corrupted": bool(is_corrupted), "error_msg": error_msg}
+	cls = error_class(is_corrupted, error_msg)
+	if cls:
+		rec["error_class"] = cls
+		rec["failed_at"] = time.time()
+	return rec
+
+def is_failure(record: Optional[Dict[str, Any]]) -> bool:
+	return bool(record) and bool(record.get("error_msg") or record.get("is_corrupted"))
+
+def failure_expired(record: Dict[str, Any], ttl_s: Optional[float], now: Optional[float] = None) -> bool:
+	"""True if a cached failure is old enough to be probed again (ttl_s None = never, 0 = always)."""
+	if ttl_s is None: return False
+	failed_at = float(record.get("failed_at") or 0)
+	return ((now or time.time()) - failed_at) >= ttl_s
+
+# =============================================================================
+# 2. ENGINES
+# =============================================================================
+
+class ScanCache(ABC):
+	"""Base engine. Maps cache_key -> {"metadata", "is_corrupted", "error_msg"}."""
+	name = "base"
+
+	@abstractmethod
+	def get(self, key: str) -> Optional[Dict[str, Any]]:
+		...
+
+	@abstractmethod
+	def put(self, key: str, record: Dict[str, Any], path: Optional[str] = None,
+			size: int = 0, mtime: float = 0.0, fp: Optional[str] = None) -> None:
+		...
+
+	def find_fingerprint(self, fp: str) -> Optional[Tuple[str, Optional[str], Dict[str, Any]]]:
+		"""Returns (key, path, record) of an entry with this content fingerprint, if the engine indexes them."""
+		return None
+
+	def relink(self, old_key: str, key: str, path: str, size: int, mtime: float, move: bool) -> None:
+		"""Re-files the record under a new key/path. move=True drops the old key (path rewrite)."""
+		pass
+
+	def dir_get(self, path: str) -> Optional[Dict[str, Any]]:
+		"""Directory manifest for path (None if unknown or the engine has no manifests)."""
+		return None
+
+	def dir_put(self, path: str, manifest: Dict[str, Any]) -> None:
+		pass
+
+	@abstractmethod
+	def clear(self) -> None:
+		...
+
+	def flush(self) -> None:
+		pass
+
+	def close(self) -> None:
+		self.flush()
+
+	def __len__(self) -> int:
+		return 0
+
+	def __enter__(self) -> "ScanCache":
+		return self
+
+	def __exit__(self, *_: Any) -> None:
+		self.close()
+
+
+class JsonScanCache(ScanCache):
+	"""Legacy engine: whole file in memory, rewritten atomically on flush."""
+	name = "json"
+
+	def __init__(self, path: Path):
+		self.path = Path(path)
+		self._data: Dict[str, Dict[str, Any]] = {}
+		self._dirty = False
+		self._lock = threading.Lock()
+		if self.path.exists():
+			try:
+				with self.path.open("r", encoding="utf-8") as f:
+					self._data = json.load(f)
+			except Exception as e:
+				print(f"⚠️  Warning: Failed to load cache: {e}")
+				self._data = {}
+
+	def get(self, key):
+		with self._lock: return self._data.get(key)
+
+	def put(self, key, record, path=None, size=0, mtime=0.0, fp=None):
+		with self._lock:
+			self._data[key] = {**record, "metadata": _plain(record.get("metadata"))}
+			self._dirty = True
+
+	def clear(self):
+		with self._lock:
+			self._data = {}
+			self._dirty = False
+		try: self.path.unlink(missing_ok=True)
+		except Exception: pass
+
+	def flush(self):
+		with self._lock:
+			if not self._dirty: return
+			try:
+				tmp = self.path.with_suffix(".tmp")
+				with tmp.open("w", encoding="utf-8") as f:
+					json.dump(self._data, f, indent=2, default=str)
+				tmp.replace(self.path)
+				self._dirty = False
+			except Exception as e:
+				print(f"⚠️  Warning: Failed to save cache: {e}")
+
+	def __len__(self):
+		return len(self._data)
+
+
+class SqliteScanCache(ScanCache):
+	"""Indexed engine: nothing is loaded up front, results are committed every `batch` puts."""
+	name = "sqlite"
+
+	_SCHEMA = (
+		"""CREATE TABLE IF NOT EXISTS probes (
+			key				TEXT PRIMARY KEY,
+			path			TEXT,
+			size			INTEGER,
+			mtime			REAL,
+			metadata		TEXT,
+			is_corrupted	INTEGER DEFAULT 0,
+			error_msg		TEXT,
+			updated			REAL,
+			fp				TEXT,
+			error_class		TEXT,
+			failed_at		REAL
+		)""",
+		"CREATE INDEX IF NOT EXISTS idx_probes_path ON probes(path)",
+	)
+	_POST_SCHEMA = (
+		"CREATE INDEX IF NOT EXISTS idx_probes_fp ON probes(fp)",
+		"""CREATE TABLE IF NOT EXISTS dirs (
+			path			TEXT PRIMARY KEY,
+			mtime_ns		INTEGER,
+			count			INTEGER,
+			digest			TEXT,
+			exts			TEXT,
+			files			TEXT,
+			subdirs			TEXT,
+			updated			REAL
+		)""",
+	)
+
+	def __init__(self, path: Path, batch: int = 200):
+		self.path = Path(path)
+		self.batch = max(1, int(batch))
+		self._pending = 0
+		self._lock = threading.RLock()
+		self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+		self._db.execute("PRAGMA journal_mode=WAL")
+		self._db.execute("PRAGMA synchronous=NORMAL")
+		for stmt in self._SCHEMA: self._db.execute(stmt)
+		self._upgrade()
+		for stmt in self._POST_SCHEMA: self._db.execute(stmt)
+
+	def _upgrade(self) -> None:
+		"""Adds columns introduced after a db file was created."""
+		have = {row[1] for row in self._db.execute("PRAGMA table_info(probes)")}
+		for col, typ in (("fp", "TEXT"), ("error_class", "TEXT"), ("failed_at", "REAL")):
+			if col not in have: self._db.execute(f"ALTER TABLE probes ADD COLUMN {col} {typ}")
+
+	def _begin(self) -> None:
+		if self._pending == 0: self._db.execute("BEGIN")
+
+	_COLS = "metadata, is_corrupted, error_msg, error_class, failed_at"
+
+	@staticmethod
+	def _record(meta, corrupt, emsg, ecls, failed_at) -> Dict[str, Any]:
+		rec = {"metadata": json.loads(meta) if meta else None, "is_corrupted": bool(corrupt), "error_msg": emsg}
+		if ecls:
+			rec["error_class"] = ecls
+			rec["failed_at"] = failed_at
+		return rec
+
+	def get(self, key):
+		with self._lock:
+			row = self._db.execute(f"SELECT {self._COLS} FROM probes WHERE key = ?", (key,)).fetchone()
+		return self._record(*row) if row else None
+
+	def put(self, key, record, path=None, size=0, mtime=0.0, fp=None):
+		meta = json.dumps(_plain(record.get("metadata")), default=str)
+		with self._lock:
+			self._begin()
+			self._db.execute(
+				"INSERT OR REPLACE INTO probes (key, path, size, mtime, metadata, is_corrupted, error_msg, updated, fp, error_class, failed_at) "
+				"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+				(key, path, size, mtime, meta, int(bool(record.get("is_corrupted"))), record.get("error_msg"), time.time(), fp,
+				 record.get("error_class"), record.get("failed_at")),
+			)
+			self._pending += 1
+			if self._pending >= self.batch: self._commit()
+
+	def find_fingerprint(self, fp):
+		if not fp: return None
+		with self._lock:
+			row = self._db.execute(
+				f"SELECT key, path, {self._COLS} FROM probes WHERE fp = ? ORDER BY updated DESC LIMIT 1", (fp,)
+			).fetchone()
+		if not row: return None
+		return row[0], row[1], self._record(*row[2:])
+
+	def relink(self, old_key, key, path, size, mtime, move):
+		with self._lock:
+			self._begin()
+			if move:
+				self._db.execute(
+					"UPDATE OR REPLACE probes SET key = ?, path = ?, size = ?, mtime = ?, updated = ? WHERE key = ?",
+					(key, path, size, mtime, time.time(), old_key),
+				)
+			else:
+				self._db.execute(
+					"INSERT OR REPLACE INTO probes (key, path, size, mtime, metadata, is_corrupted, error_msg, updated, fp, error_class, failed_at) "
+					"SELECT ?, ?, ?, ?, metadata, is_corrupted, error_msg, ?, fp, error_class, failed_at FROM probes WHERE key = ?",
+					(key, path, size, mtime, time.time(), old_key),
+				)
+			self._pending += 1
+			if self._pending >= self.batch: self._commit()
+
+	def dir_get(self, path):
+		with self._lock:
+			row = self._db.execute(
+				"SELECT mtime_ns, count, digest, exts, files, subdirs FROM dirs WHERE path = ?", (path,)
+			).fetchone()
+		if not row: return None
+		mtime_ns, count, digest, exts, files, subdirs = row
+		return {"mtime_ns": mtime_ns, "count": count, "digest": digest, "exts": exts,
+				"files": json.loads(files), "subdirs": json.loads(subdirs)}
+
+	def dir_put(self, path, manifest):
+		with self._lock:
+			self._begin()
+			self._db.execute(
+				"INSERT OR REPLACE INTO dirs (path, mtime_ns, count, digest, exts, files, subdirs, updated) "
+				"VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+				(path, manifest["mtime_ns"], manifest["count"], manifest["digest"], manifest["exts"],
+				 json.dumps(manifest["files"]), json.dumps(manifest["subdirs"]), time.time()),
+			)
+			self._pending += 1
+			if self._pending >= self.batch: self._commit()
+
+	def _commit(self) -> None:
+		if self._pending:
+			self._db.execute("COMMIT")
+			self._pending = 0
+
+	def clear(self):
+		with self._lock:
+			self._commit()
+			self._db.execute("DELETE FROM probes")
+			self._db.execute("DELETE FROM dirs")
+
+	def flush(self):
+		with self._lock: self._commit()
+
+	def close(self):
+		with self._lock:
+			try:
+				self._commit()
+				self._db.close()
+			except Exception: pass
+
+	def __len__(self):
+		with self._lock: return self._db.execute("SELECT COUNT(*) FROM probes").fetchone()[0]
+
+	def import_records(self, items: Iterator[Tuple[str, Dict[str, Any]]]) -> int:
+		"""Bulk-inserts (key, record) pairs that have no path/size/mtime (JSON migration)."""
+		now = time.time()
+		rows = (
+			(k, json.dumps(_plain((v or {}).get("metadata")), default=str),
+			 int(bool((v or {}).get("is_corrupted"))), (v or {}).get("error_msg"), now)
+			for k, v in items
+		)
+		with self._lock:
+			self._commit()
+			self._db.execute("BEGIN")
+			cur = self._db.executemany(
+				"INSERT OR IGNORE INTO probes (key, metadata, is_corrupted, error_msg, updated) VALUES (?, ?, ?, ?, ?)", rows
+			)
+			self._db.execute("COMMIT")
+		return cur.rowcount
+
+# =============================================================================
+# 3. FACTORY & MIGRATION
+# =============================================================================
+
+def migrate_json(json_path: Path, cache: SqliteScanCache) -> int:
+	"""One-shot import of the legacy JSON cache; the JSON file is renamed to *.migrated."""
+	json_path = Path(json_path)
+	if not json_path.exists(): return 0
+	try:
+		with json_path.open("r", encoding="utf-8") as f:
+			data = json.load(f)
+		count = cache.import_records(data.items()) if isinstance(data, dict) else 0
+		json_path.replace(json_path.with_name(json_path.name + ".migrated"))
+		print(f"   Scan cache: migrated {count} record(s) from {json_path.name} -> {cache.path.name}")
+		return count
+	except Exception as e:
+		print(f"⚠️  Warning: Scan cache migration failed: {e}")
+		return 0
+
+def open_scan_cache(work_dir: Path, engine: str = "sqlite", batch: int = 200) -> ScanCache:
+	"""Opens the configured engine in work_dir (migrating scan_cache.json into SQLite once)."""
+	work_dir = Path(work_dir)
+	if (engine or "").lower() == "json":
+		return JsonScanCache(work_dir / JSON_CACHE_NAME)
+	cache = SqliteScanCache(work_dir / SQLITE_CACHE_NAME, batch=batch)
+	migrate_json(work_dir / JSON_CACHE_NAME, cache)
+	return cache
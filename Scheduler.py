@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Scheduler.py
+	- Locality-aware probe scheduling: one queue per device (st_dev), each ordered by inode / directory.
+	- Spinning disks get a small number of lanes so header reads sweep the platter instead of seeking
+	  at random; SSDs and network mounts keep the full worker count.
+	- Encode CPU budget: concurrent encodes share a fixed number of threads, each job sized by resolution.
+	- Job priority: planned jobs ranked by expected bytes saved per CPU-second, remux / audio-only
+	  jobs in a fast lane ahead of the video encodes; projected savings-over-time report.
+	- Batch lane: a separate small pool for I/O-bound jobs that batches them while it is busy.
+"""
+import os
+import sys
+import threading
+
+from collections 			import deque
+from dataclasses 			import dataclass
+from contextlib 			import contextmanager
+from typing 				import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures 	import CancelledError, Future, ThreadPoolExecutor
+
+# Device kinds returned by device_kind()
+HDD, SSD, NET, UNKNOWN = "hdd", "ssd", "net", "unknown"
+
+# =============================================================================
+# 1. DEVICE DETECTION
+# =============================================================================
+
+_KIND_CACHE: Dict[int, str] = {}
+
+def device_kind(dev: int) -> str:
+	"""Classifies a st_dev as hdd / ssd / net / unknown (Linux sysfs; other platforms -> unknown)."""
+	kind = _KIND_CACHE.get(dev)
+	if kind is None:
+		kind = _KIND_CACHE[dev] = _detect_kind(dev)
+	return kind
+
+def _detect_kind(dev: int) -> str:
+	if not sys.platform.startswith("linux") or not dev:
+		return UNKNOWN
+	major, minor = os.major(dev), os.minor(dev)
+	if major == 0:
+		return NET		# Anonymous devices: NFS, CIFS, FUSE, tmpfs, overlay...
+	base = f"/sys/dev/block/{major}:{minor}"
+	# Partitions have no queue/ of their own: look at the parent disk
+	for q in (f"{base}/queue/rotational", f"{base}/../queue/rotational"):
+		try:
+			with open(q) as f:
+				return HDD if f.read().strip() == "1" else SSD
+		except OSError:
+			continue
+	return UNKNOWN
+
+def device_lanes(dev: int, wide: int, hdd_lanes: int = 2, rotational: Optional[bool] = None) -> int:
+	"""Concurrent probes allowed on one device. rotational=True/False overrides detection."""
+	if rotational is None:
+		rotational = device_kind(dev) == HDD
+	return max(1, min(wide, hdd_lanes)) if rotational else max(1, wide)
+
+def locality_key(entry) -> Tuple:
+	"""On-disk order for one MediaEntry: inode where the platform reports one, else directory / name."""
+	if entry.ino:
+		return (0, entry.ino, entry.path)
+	return (1, os.path.dirname(entry.path), entry.path)
+
+# =============================================================================
+# 2. PROBE SCHEDULER
+# =============================================================================
+
+class ProbeScheduler:
+	"""Thread pool that runs jobs per device in locality order with a per-device concurrency limit.
+
+	submit() returns a Future at once (usable with as_completed); nothing runs until start()
+	(or leaving the `with` block), so each device queue can be sorted first. Leaving the block
+	waits for every job, like ThreadPoolExecutor.
+	"""
+	def __init__(
+		self,
+		max_workers: int,
+		hdd_lanes: int = 2,
+		rotational: Optional[bool] = None,
+		ordered: bool = True
+	):
+		self._wide = max(1, max_workers)
+		self._hdd_lanes = hdd_lanes
+		self._rotational = rotational
+		self._ordered = ordered
+		self._pool = ThreadPoolExecutor(max_workers=self._wide, thread_name_prefix="probe")
+		self._lock = threading.Lock()
+		self._queues: Dict[int, Deque[Tuple[Any, Future, Callable, tuple, dict]]] = {}
+		self._lanes: Dict[int, int] = {}
+		self._busy: Dict[int, int] = {}
+		self._pending: List[Future] = []
+		self._started = False
+
+	def submit(self, entry, fn: Callable, *args, **kwargs) -> Future:
+		"""Queues fn(*args, **kwargs) on entry's device (entry: MediaEntry-like with path, ino, dev)."""
+		proxy: Future = Future()
+		with self._lock:
+			dev = entry.dev
+			if dev not in self._queues:
+				self._queues[dev] = deque()
+				self._lanes[dev] = device_lanes(dev, self._wide, self._hdd_lanes, self._rotational)
+				self._busy[dev] = 0
+			self._queues[dev].append((entry, proxy, fn, args, kwargs))
+			self._pending.append(proxy)
+			started = self._started
+		if started:
+			self._pump(dev)
+		return proxy
+
+	def start(self) -> None:
+		with self._lock:
+			if self._started: return
+			self._started = True
+			if self._ordered:
+				for dev, q in self._queues.items():
+					self._queues[dev] = deque(sorted(q, key=lambda job: locality_key(job[0])))
+			devs = list(self._queues)
+		for dev in devs:
+			self._pump(dev)
+
+	def lanes(self) -> Dict[int, Tuple[str, int, int]]:
+		"""{st_dev: (kind, lanes, queued jobs)} for logging."""
+		with self._lock:
+			return {d: (device_kind(d), self._lanes[d], len(q)) for d, q in self._queues.items()}
+
+	def _pump(self, dev: int) -> None:
+		while True:
+			with self._lock:
+				q = self._queues[dev]
+				if not q or self._busy[dev] >= self._lanes[dev]:
+					return
+				entry, proxy, fn, args, kwargs = q.popleft()
+				self._busy[dev] += 1
+			if not proxy.set_running_or_notify_cancel():
+				self._release(dev)
+				continue
+			try:
+				fut = self._pool.submit(fn, *args, **kwargs)
+			except RuntimeError as e:		# Pool shut down (aborted scan)
+				proxy.set_exception(e)
+				self._release(dev)
+				return
+			fut.add_done_callback(lambda f, p=proxy, d=dev: self._done(d, p, f))
+
+	def _done(self, dev: int, proxy: Future, fut: Future) -> None:
+		exc = CancelledError() if fut.cancelled() else fut.exception()
+		if exc is not None: proxy.set_exception(exc)
+		else: proxy.set_result(fut.result())
+		self._release(dev)
+		self._pump(dev)
+
+	def _release(self, dev: int) -> None:
+		with self._lock:
+			self._busy[dev] -= 1
+
+	def shutdown(self, wait: bool = True) -> None:
+		if wait:
+			self.start()
+			for p in list(self._pending):
+				try: p.exception()
+				except Exception: pass		# Cancelled
+		self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+	def __enter__(self) -> "ProbeScheduler":
+		return self
+
+	def __exit__(self, exc_type, exc, tb) -> None:
+		self.shutdown(wait=exc_type is None)
+
+# =============================================================================
+# 3. ENCODE CPU BUDGET
+# =============================================================================
+
+# Encoder threads per job by frame size: x265 runs CTU rows / frames in parallel, so small
+# frames stop scaling after a few threads while 2160p keeps ~16 busy.
+ENCODE_THREADS_BY_PIXELS = ((720 * 576, 2), (1280 * 720, 4), (1920 * 1088, 8))
+ENCODE_THREADS_MAX = 16
+
+def encode_threads(width: int, height: int, cpus: int) -> int:
+	"""Threads one encode of a width x height video should get (unknown size -> the 1080p share)."""
+	px = width * height if width > 0 and height > 0 else 1920 * 1080
+	n = next((t for limit, t in ENCODE_THREADS_BY_PIXELS if px <= limit), ENCODE_THREADS_MAX)
+	return max(1, min(n, cpus))
+
+def x265_params(threads: int) -> str:
+	"""libx265 thread pool / frame parallelism matching a budget of `threads`."""
+	frames = 1 if threads < 4 else 2 if threads < 8 else 3 if threads < 16 else 4
+	return f"pools={threads}:frame-threads={frames}"
+
+class CpuBudget:
+	"""Counting budget of CPU threads shared by concurrent encodes.
+
+	Grants are first come, first served: a large job waiting for room is not overtaken by a
+	stream of small ones, so the number of concurrent jobs follows the resolution mix.
+	"""
+	def __init__(self, cpus: int):
+		self.total = max(1, cpus)
+		self.in_use = 0
+		self._cond = threading.Condition()
+		self._queue: Deque[object] = deque()
+
+	def acquire(self, threads: int) -> int:
+		"""Blocks until `threads` (capped at the total) are free; returns the number granted."""
+		n = max(1, min(threads, self.total))
+		ticket = object()
+		with self._cond:
+			self._queue.append(ticket)
+			while self._queue[0] is not ticket or self.in_use + n > self.total:
+				self._cond.wait()
+			self._queue.popleft()
+			self.in_use += n
+			self._cond.notify_all()
+		return n
+
+	def release(self, threads: int) -> None:
+		with self._cond:
+			self.in_use -= threads
+			self._cond.notify_all()
+
+	@contextmanager
+	def hold(self, threads: int) -> Iterator[int]:
+		"""with budget.hold(n): ... (n <= 0: no limit, nothing reserved)."""
+		if threads <= 0:
+			yield 0
+			return
+		n = self.acquire(threads)
+		try:
+			yield n
+		finally:
+			self.release(n)
+
+# =============================================================================
+# 4. JOB PRIORITY
+# =============================================================================
+
+# Job lanes (FFMpeg.estimate_job): the fast lane is everything that needs no video encode
+LANE_SKIP, LANE_REMUX, LANE_AUDIO, LANE_ENCODE = "skip", "remux", "audio", "encode"
+FAST_LANES = (LANE_SKIP, LANE_REMUX, LANE_AUDIO)
+_FAST_RANK = 1e12		# Above any saved-bytes-per-CPU-second score a video encode can reach
+
+@dataclass
+class JobEstimate:
+	lane: str
+	saved: int				# Expected bytes saved (negative: the output would grow)
+	cpu_s: float			# Expected CPU-seconds for the whole job
+	size: int = 0			# Source bytes
+
+	@property
+	def score(self) -> float:
+		"""Expected bytes saved per CPU-second."""
+		return self.saved / max(1e-3, self.cpu_s)
+
+def priority(est: JobEstimate) -> float:
+	"""Sort key (higher first): fast-lane jobs first (cheapest first), then encodes by saved bytes per CPU-second."""
+	if est.lane in FAST_LANES:
+		return _FAST_RANK - est.cpu_s
+	return est.score
+
+def savings_curve(estimates: List[JobEstimate], cpus: int) -> List[Tuple[float, int]]:
+	"""(hours, cumulative bytes saved) after each job, run in the given order on `cpus` CPUs."""
+	t = saved = 0
+	curve = []
+	for est in estimates:
+		t += est.cpu_s / max(1, cpus)
+		saved += max(0, est.saved)
+		curve.append((t / 3600, saved))
+	return curve
+
+def _saved_by(curve: List[Tuple[float, int]], hours: float) -> int:
+	done = [saved for t, saved in curve if t <= hours]
+	return done[-1] if done else 0
+
+def order_report(by_size: List[JobEstimate], by_gain: List[JobEstimate], cpus: int) -> str:
+	"""Projected GB saved after 1, 2, 4, 8 hours (and at the end): size-first vs savings-per-CPU order."""
+	size_c, gain_c = savings_curve(by_size, cpus), savings_curve(by_gain, cpus)
+	total_h = size_c[-1][0] if size_c else 0.0
+	marks = [h for h in (1, 2, 4, 8, 16) if h < total_h] + [total_h]
+	fast = sum(1 for e in by_gain if e.lane in FAST_LANES)
+	unit, div = ("GB", 1024**3) if gain_c and gain_c[-1][1] >= 1024**3 else ("MB", 1024**2)
+	rows = [f"   Job order (projected on {cpus} CPU(s)): {len(by_gain) - fast} encode(s), {fast} in the fast lane (remux / audio only)",
+			f"   {'after':>9} | {'size-first':>11} | {'per CPU-s':>11}"]
+	for h in marks:
+		rows.append(f"   {h:8.2f}h | {_saved_by(size_c, h) / div:8.2f} {unit} | {_saved_by(gain_c, h) / div:8.2f} {unit}")
+	return "\n".join(rows)
+
+# =============================================================================
+# 5. BATCH LANE
+# =============================================================================
+
+class BatchLane:
+	"""Own worker pool for short I/O-bound jobs (e.g. remuxes), apart from the encode pool.
+
+	An item starts at once while a worker is free; while all are busy, waiting items are gathered
+	into batches of up to max_items / max_bytes, which run_batch handles in one go (one process
+	spawn for many small files). An item over max_bytes always runs alone.
+	"""
+	def __init__(self, run_batch: Callable[[List[Any]], None], workers: int, max_items: int, max_bytes: int, name: str = "lane"):
+		self.workers = max(1, workers)
+		self.max_items = max(1, max_items)
+		self.max_bytes = max_bytes
+		self.batches = self.items = 0
+		self._run_batch = run_batch
+		self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix=name)
+		self._pending: Deque[Tuple[Any, int]] = deque()
+		self._busy = 0
+		self._cond = threading.Condition()
+
+	def submit(self, item: Any, nbytes: int = 0) -> None:
+		"""Queues one item (blocks while a few batches' worth are already waiting)."""
+		with self._cond:
+			while len(self._pending) >= 2 * self.workers * self.max_items:
+				self._cond.wait()
+			self._pending.append((item, nbytes))
+			self._dispatch()
+
+	def _dispatch(self) -> None:
+		"""Hands batches to free workers (caller holds the lock)."""
+		while self._pending and self._busy < self.workers:
+			batch, size = [], 0
+			while self._pending and len(batch) < self.max_items:
+				item, nb = self._pending[0]
+				if batch and size + nb > self.max_bytes:
+					break
+				self._pending.popleft()
+				batch.append(item)
+				size += nb
+				if nb > self.max_bytes:
+					break
+			self._busy += 1
+			self.batches += 1
+			self.items += len(batch)
+			self._pool.submit(self._run, batch)
+			self._cond.notify_all()
+
+	def _run(self, batch: List[Any]) -> None:
+		try:
+			self._run_batch(batch)
+		finally:
+			with self._cond:
+				self._busy -= 1
+				self._dispatch()
+				self._cond.notify_all()
+
+	def close(self) -> None:
+		"""Waits until every queued item has run."""
+		with self._cond:
+			while self._pending or self._busy:
+				self._cond.wait()
+		self._pool.shutdown(wait=True)
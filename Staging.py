@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+Rev = """
+  Staging.py
+	- Local scratch tier for sources on slow storage (NAS): while the current jobs encode, the next
+	  STAGING_AHEAD queued sources are copied to STAGING_DIR by a background thread, and the encode
+	  (both passes of a 2-pass libx265) reads the local copy instead of the network.
+	- Copies are bounded by STAGING_BUDGET_GB. A copy whose job has ended stays until the space is
+	  needed (a deferred / retried job can reuse it), then goes least recently used first; copies
+	  waiting for or in use by a job are never evicted.
+	- Only the read side moves: the plan, the SRIK, temp placement and clean_up still work on the
+	  source path. A copy is used only if the source's size and mtime haven't changed since.
+"""
+import os
+import shutil
+import threading
+
+from collections 	import OrderedDict, deque
+from contextlib 	import contextmanager, nullcontext
+from dataclasses 	import dataclass
+from pathlib 		import Path
+from typing 		import ContextManager, Deque, Iterator, List, Optional
+
+from Utils 			import *
+
+import Scheduler
+
+COPY_BLOCK = 8 * 1024 * 1024
+
+# =============================================================================
+# 1. STAGER
+# =============================================================================
+
+@dataclass
+class Staged:
+	"""One source's local copy."""
+	local: Path
+	size: int
+	mtime_ns: int
+	state: str = "copying"		# copying -> ready | failed
+	pins: int = 0				# Jobs reading it now
+	done: bool = False			# Its job has ended: evictable
+
+class Stager:
+	"""Copies upcoming sources to a local dir in the background, within a byte budget."""
+	def __init__(self, root: Path, budget: int, ahead: int, kinds=("net",)):
+		self.root = Path(root)
+		self.budget = budget
+		self.ahead = max(1, ahead)
+		self.kinds = set(kinds)
+		self.root.mkdir(parents=True, exist_ok=True)
+		self._root_dev = self.root.stat().st_dev
+		self._entries: "OrderedDict[str, Staged]" = OrderedDict()		# LRU order: oldest first
+		self._pending: Deque[str] = deque()
+		self._cond = threading.Condition()
+		self._stop = False
+		self.copied = self.hits = self.misses = self.evicted = 0
+		self._seq = 0
+		self._thread = threading.Thread(target=self._loop, name="staging", daemon=True)
+		self._thread.start()
+
+	@property
+	def used(self) -> int:
+		return sum(e.size for e in self._entries.values())
+
+	def wants(self, path: str) -> bool:
+		"""True for a source on a device kind STAGING_FROM lists (and not on the scratch disk itself)."""
+		try:
+			dev = os.stat(path).st_dev
+		except OSError:
+			return False
+		return dev != self._root_dev and Scheduler.device_kind(dev) in self.kinds
+
+	def prefetch(self, path: str) -> None:
+		"""Queues path for staging (copied when fewer than `ahead` copies wait for their job)."""
+		if not self.wants(path):
+			return
+		with self._cond:
+			if path in self._entries or path in self._pending:
+				e = self._entries.get(path)
+				if e is not None:
+					e.done = False		# Queued again (deferred round): keep it
+					self._entries.move_to_end(path)
+				return
+			self._pending.append(path)
+			self._cond.notify_all()
+
+	def done(self, path: str) -> None:
+		"""The job for path has ended: its copy may be evicted (or it is dropped from the queue)."""
+		with self._cond:
+			try: self._pending.remove(path)
+			except ValueError: pass
+			e = self._entries.get(path)
+			if e is not None:
+				e.done = True
+			self._cond.notify_all()
+
+	@contextmanager
+	def local(self, path: str) -> Iterator[str]:
+		"""Yields the staged copy of path when there is a valid one (waits for a copy in progress), else path."""
+		with self._cond:
+			try: self._pending.remove(path)		# Not started: reading the source beats waiting for a copy
+			except ValueError: pass
+			while (e := self._entries.get(path)) is not None and e.state == "copying":
+				self._cond.wait()
+			if e is not None and e.state == "ready" and self._unchanged(path, e):
+				e.pins += 1
+				self._entries.move_to_end(path)
+				self.hits += 1
+				self._cond.notify_all()		# One fewer copy waiting: the next prefetch may start
+			else:
+				e = None
+				self.misses += self.wants(path)
+		if e is None:
+			yield path
+			return
+		try:
+			yield str(e.local)
+		finally:
+			with self._cond:
+				e.pins -= 1
+				self._cond.notify_all()
+
+	def _unchanged(self, path: str, e: Staged) -> bool:
+		try:
+			st = os.stat(path)
+		except OSError:
+			return False
+		return st.st_size == e.size and st.st_mtime_ns == e.mtime_ns
+
+	def _waiting(self) -> int:
+		return sum(1 for e in self._entries.values() if not e.done and not e.pins)
+
+	def _make_room(self, size: int) -> bool:
+		"""Evicts finished copies, least recently used first, until size fits the budget."""
+		while self.used + size > self.budget:
+			victim = next((p for p, e in self._entries.items() if e.done and not e.pins and e.state != "copying"), None)
+			if victim is None:
+				return False
+			self._drop(victim)
+			self.evicted += 1
+		return True
+
+	def _drop(self, path: str) -> None:
+		e = self._entries.pop(path)
+		e.local.unlink(missing_ok=True)
+
+	def _loop(self) -> None:
+		while True:
+			with self._cond:
+				while not self._stop and not (self._pending and self._waiting() < self.ahead):
+					self._cond.wait()
+				if self._stop:
+					return
+				path = self._pending[0]
+				try:
+					st = os.stat(path)
+				except OSError:
+					self._pending.popleft()
+					continue
+				if st.st_size > self.budget:
+					self._pending.popleft()		# Never fits: read from the source
+					continue
+				if not self._make_room(st.st_size):
+					self._cond.wait()		# Full of copies still needed: wait for a job to end
+					continue
+				if shutil.disk_usage(self.root).free < st.st_size + TEMP_FREE_RESERVE_MB * 1024 * 1024:
+					self._pending.popleft()		# Scratch disk short of space (budget set too high)
+					continue
+				self._pending.popleft()
+				self._seq += 1
+				e = Staged(self.root / f"{self._seq:05d}_{Path(path).name}", st.st_size, st.st_mtime_ns)
+				self._entries[path] = e
+			ok = self._copy(path, e.local)
+			with self._cond:
+				e.state = "ready" if ok else "failed"
+				if ok:
+					self.copied += e.size
+				else:
+					self._entries.pop(path, None)
+					e.local.unlink(missing_ok=True)
+				self._cond.notify_all()
+
+	def _copy(self, src: str, dest: Path) -> bool:
+		try:
+			with open(src, "rb") as fi, open(dest, "wb") as fo:
+				while not self._stop and (block := fi.read(COPY_BLOCK)):
+					fo.write(block)
+			return not self._stop
+		except OSError as e:
+			safe_print(f"   [Warning] Staging {Path(src).name}: {e}")
+			return False
+
+	def close(self) -> None:
+		with self._cond:
+			self._stop = True
+			self._cond.notify_all()
+		self._thread.join()
+		for p in list(self._entries):
+			self._drop(p)
+		try: self.root.rmdir()
+		except OSError: pass
+
+	def summary(self) -> str:
+		return (f"Staging: {hm_sz(self.copied)} copied to {self.root.parent}, {self.hits} encode(s) read a local copy, "
+				f"{self.misses} read the source, {self.evicted} copy(ies) evicted")
+
+STAGER: Optional[Stager] = None		# Set by Trans_code.main (STAGING)
+
+def open_staging() -> Stager:
+	global STAGER
+	STAGER = Stager(Path(STAGING_DIR) / RUN_TOKEN, int(STAGING_BUDGET_GB * 1024**3), STAGING_AHEAD, STAGING_FROM)
+	return STAGER
+
+def close_staging() -> Optional[str]:
+	"""Stops staging and removes the copies -> summary line (None if staging was off)."""
+	global STAGER
+	if STAGER is None:
+		return None
+	STAGER.close()
+	out, STAGER = STAGER.summary(), None
+	return out
+
+# =============================================================================
+# 2. HOOKS (no-ops while staging is off)
+# =============================================================================
+
+def prefetch(path: str) -> None:
+	if STAGER is not None:
+		STAGER.prefetch(path)
+
+def done(path: str) -> None:
+	if STAGER is not None:
+		STAGER.done(path)
+
+def local(path: str) -> ContextManager[str]:
+	return STAGER.local(path) if STAGER is not None else nullcontext(path)
+
+def with_input(cmd: List[str], src: str, local_path: str) -> List[str]:
+	"""cmd with its `-i src` reading local_path instead."""
+	if local_path == src:
+		return cmd
+	return [local_path if prev == "-i" and x == src else x for prev, x in zip([""] + cmd, cmd)]
@@ -10,15 +10,20 @@ Rev = """
 import os
 import sys
 import time
+import argparse
 import json
 import shutil
+import sqlite3
+import threading
 import traceback
+import copy
 
-from typing import Any, Dict, List, Tuple, Collection, Optional, Set
-from hashlib import sha1
+from typing import Any, Callable, ContextManager, Deque, Dict, Iterable, Iterator, List, Tuple, Collection, Optional, Union
 from pathlib import Path
+from contextlib import nullcontext
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 try:
 	from tkinter import Tk
@@ -28,6 +33,19 @@ except ImportError:
 	HAS_TKINTER = False
 
 import FFMpeg
+import Scan_cache
+import Media_walk
+import Scheduler
+import Probe_native
+import File_table
+import Pipeline
+import Chunk_encode
+import Predict
+import Deadline
+import Job_store
+import Control
+import Mp4_tag
+import Staging
 from Utils import *
 
 Log_File = str(WORK_DIR / f"__{Path(sys.argv[0]).stem}_{time.strftime('%Y_%j_%H-%M-%S')}.log")
@@ -102,8 +120,9 @@ def scan_folder(
 	xtnsio: Collection[str], 
 	sort_keys_cfg: Collection, 
 	use_threads: bool, 
-	max_workers: int
-) -> List[Dict[str, Any]]:
+	max_workers: int,
+	on_file: Optional[Callable[[Any], None]] = None
+) -> Union[List[Dict[str, Any]], File_table.FileTable]:
 	"""Scans the root directory for media files, caching probe results.
 	
 	Optimizations:
@@ -111,198 +130,490 @@ def scan_folder(
 	- Smart cache invalidation
 	- Reduced redundant calls
 	- Progress tracking improvements
+	- SCALE_MODE: returns a compact FileTable (no metadata in memory), probes in bounded batches
+	- on_file: each file is handed over as soon as it is known (pipeline mode) and not kept or sorted
 	"""
 	print(f"Scan: {root}\n Scanning folder Sort: {sort_keys_cfg} Start: {time.strftime('%H:%M:%S')}")
 	spinner = Spinner()
-	file_list = []
 	TOUCH_DATE = datetime(2000, 1, 1)
-	CACHE_FILE = WORK_DIR / "scan_cache.json"
 	IGNORE_SCAN_CACHE = os.getenv("IGNORE_SCAN_CACHE", "0") == "1"
 	CLEAR_SCAN_CACHE = os.getenv("CLEAR_SCAN_CACHE", "0") == "1"
-	
-	# Clear cache if requested
-	if CLEAR_SCAN_CACHE and CACHE_FILE.exists():
-		try: 
-			CACHE_FILE.unlink()
-		except: 
-			pass
-	
-	# Load existing cache
-	cache: Dict[str, Dict[str, Any]] = {}
-	if not IGNORE_SCAN_CACHE and CACHE_FILE.exists():
+	scale = SCALE_MODE
+	streaming = scale or on_file is not None
+
+	# Open the cache engine (SQLite by default: nothing is loaded up front).
+	# Scale mode shares one handle with process_file, which reloads metadata from it.
+	cache: Optional[Scan_cache.ScanCache] = None
+	if scale:
+		cache = _metadata_cache()
+	elif not IGNORE_SCAN_CACHE:
 		try:
-			with CACHE_FILE.open("r", encoding="utf-8") as f:
-				cache = json.load(f)
+			cache = Scan_cache.open_scan_cache(WORK_DIR, SCAN_CACHE_ENGINE, SCAN_CACHE_BATCH)
+			if CLEAR_SCAN_CACHE:
+				cache.clear()
 		except Exception as e:
-			print(f"⚠️  Warning: Failed to load cache: {e}")
-			cache = {}
+			print(f"⚠️  Warning: Failed to open scan cache: {e}")
+			cache = None
 
-	# OPTIMIZATION: Use set for faster extension lookup
-	xtnsio_set: Set[str] = set(xtnsio) if not isinstance(xtnsio, set) else xtnsio
-	
-	# OPTIMIZATION: Batch collect all candidates first
-	candidates: List[str] = []
-	for dirpath, _, files in os.walk(root):
-		# OPTIMIZATION: Filter in batch using list comprehension
-		candidates.extend(
-			os.path.join(dirpath, one_file)
-			for one_file in files
-			if Path(one_file).suffix.lower() in xtnsio_set
-		)
-
-	if not candidates:
-		spinner.stop()
-		print("   No media files found.")
-		return []
-
-	# OPTIMIZATION: Batch stat operations with better error handling
-	stat_results: Dict[str, os.stat_result] = {}
-	with ThreadPoolExecutor(max_workers=max_workers) as stat_pool:
-		stat_futures = {stat_pool.submit(os.stat, f): f for f in candidates}
-		for fut in as_completed(stat_futures):
-			try:
-				stat_results[stat_futures[fut]] = fut.result()
-			except Exception:
-				# Skip files we can't stat (permissions, deleted, etc.)
-				continue
-
-	# OPTIMIZATION: Pre-compute cache keys and separate cached/uncached files
-	cached_results: Dict[str, Tuple[Any, bool, Optional[str]]] = {}
-	futures: Dict[Any, str] = {}
-	
-	with ThreadPoolExecutor(max_workers=max_workers if use_threads else 1) as executor:
-		for f_path, stat in stat_results.items():
-			# Generate cache key
-			f_key = sha1(f"{f_path}|{stat.st_size}|{stat.st_mtime}".encode()).hexdigest()
-			
-			# Check cache
-			if not IGNORE_SCAN_CACHE and f_key in cache:
-				entry = cache[f_key]
-				cached_results[f_path] = (
-					entry.get("metadata"),
-					entry.get("is_corrupted", False),
-					entry.get("error_msg", None)
-				)
-			else:
-				# Submit probe task
-				fut = executor.submit(
-					FFMpeg.ffprobe_run, 
-					f_path, 
-					FFMpeg.FFPROBE, 
-					de_bug, 
-					CHECK_CORRUPTION
-				)
-				futures[fut] = f_path
+	# One os.scandir pass: DirEntry stat data is reused (no os.walk, no separate stat pool).
+	# Directory manifests let unchanged folders skip listing and per-file stat altogether.
+	# Scale / pipeline mode streams the walk instead of holding every entry, and probes in bounded batches
+	# (small ones in pipeline mode, so the first files reach the encoders quickly).
+	manifest = cache if SCAN_DIR_MANIFEST else None
+	walk = Media_walk.walk_media(root, xtnsio, manifest, SCAN_DIR_MANIFEST, workers=SCAN_WALK_WORKERS)
+	batch_max = max(1, max_workers) * 4 if on_file is not None else MAX_PROBE_INFLIGHT
+	if not streaming:
+		walk = list(walk)
+		if not walk:
+			spinner.stop()
+			if cache is not None: cache.close()
+			print("   No media files found.")
+			return []
+
+	file_list: Any = File_table.FileTable() if scale else []
+	broken: List[Tuple[str, str, str]] = []		# (path, error class, message) of known-bad files
+	fail_ttl_s = None if PROBE_FAIL_RETRY_H is None else PROBE_FAIL_RETRY_H * 3600
+	Probe_native.STATS.reset()
+	counts = {"seen": 0, "done": 0, "relinked": 0, "lanes_shown": False}
 
 	# Helper to add files to list
 	def add_to_list(
-		f_path: str, 
+		me: Media_walk.MediaEntry,
 		metadata: Any, 
 		is_corrupted: bool, 
 		error_msg: Optional[str], 
-		from_cache: bool = False
+		from_cache: bool = False,
+		fp: Optional[str] = None
 	) -> None:
-		file_stat = stat_results.get(f_path)
-		if not file_stat or file_stat.st_size < 10:
+		counts["done"] += 1
+		if me.size < 10:
 			return
 		
 		if error_msg or is_corrupted:
-			safe_print(f"\n\033[93m Warning/Error probing '{f_path}': {error_msg or 'Corrupt'}\033[0m")
+			# Negative cache: remember the failure so an unchanged file is skipped until the TTL elapses
+			err_cls = Scan_cache.error_class(is_corrupted, error_msg)
+			broken.append((me.path, err_cls, str(error_msg or "Corrupt")))
+			if not from_cache:
+				safe_print(f"\n\033[93m Warning/Error probing '{me.path}': {error_msg or 'Corrupt'}\033[0m")
+				if cache is not None:
+					f_key = Scan_cache.cache_key(me.path, me.size, me.mtime)
+					cache.put(f_key, Scan_cache.make_record(None, is_corrupted, error_msg),
+							  me.path, me.size, me.mtime, fp)
 			return
-		
-		# Parse file modification time
-		try:
-			file_mtime = datetime.fromtimestamp(file_stat.st_mtime)
-			if file_mtime.year < 1970:
-				file_mtime = TOUCH_DATE
-		except:
-			file_mtime = TOUCH_DATE
 
-		# Extract duration from metadata
+		# Extract duration from metadata (VideoMeta, its cached dict form, or a raw ffprobe dict)
 		if hasattr(metadata, 'duration'):
 			meta_dict = metadata.__dict__
 			duration = metadata.duration
 		else:
 			meta_dict = metadata or {}
-			duration = float((meta_dict.get("format", {}) or {}).get("duration", 0.0) or 0.0)
+			duration = float(meta_dict.get("duration") or (meta_dict.get("format", {}) or {}).get("duration", 0.0) or 0.0)
+
+		# Update cache for new entries (committed in batches while the scan runs)
+		if cache is not None and not from_cache:
+			f_key = Scan_cache.cache_key(me.path, me.size, me.mtime)
+			cache.put(f_key, Scan_cache.make_record(meta_dict, is_corrupted, error_msg),
+					  me.path, me.size, me.mtime, fp)
+
+		# Job ordering by expected saving per CPU-second needs the plan's estimate (sorted runs only)
+		est = FFMpeg.estimate_job(me.path, meta_dict) if JOB_ORDER == "gain" and on_file is None else None
+
+		if scale:
+			# Compact record only: the metadata is reloaded from the cache when the file is planned
+			flags = File_table.F_LAZY | (File_table.F_CACHED if from_cache else 0)
+			if on_file is not None:
+				on_file(File_table.FileRecord(me.path, me.size, me.mtime, duration, flags))
+			elif est is not None:
+				flags |= File_table.F_FAST if est.lane in Scheduler.FAST_LANES else 0
+				file_list.append(me.path, me.size, me.mtime, duration, flags, est.saved, est.cpu_s)
+			else:
+				file_list.append(me.path, me.size, me.mtime, duration, flags)
+			return
+
+		# Parse file modification time
+		try:
+			file_mtime = datetime.fromtimestamp(me.mtime)
+			if file_mtime.year < 1970:
+				file_mtime = TOUCH_DATE
+		except:
+			file_mtime = TOUCH_DATE
 
 		# Add to file list
-		file_list.append({
-			"path": f_path,
+		file_info = {
+			"path": me.path,
 			"metadata": meta_dict,
-			"size": file_stat.st_size,
-			"name": Path(f_path).name,
+			"size": me.size,
+			"mtime": me.mtime,
+			"name": Path(me.path).name,
 			"date": file_mtime,
 			"duration": duration
-		})
-
-		# Update cache for new entries
-		if not from_cache:
-			f_key = sha1(f"{f_path}|{file_stat.st_size}|{file_stat.st_mtime}".encode()).hexdigest()
-			# Ensure meta_dict is serializable
-			if hasattr(meta_dict, '__dict__'):
-				meta_dict = meta_dict.__dict__
-			cache[f_key] = {
-				"metadata": meta_dict,
-				"is_corrupted": is_corrupted,
-				"error_msg": error_msg
-			}
-
-	# Process cached results first (instant)
-	for f_path, (meta, corrupt, emsg) in cached_results.items():
-		add_to_list(f_path, meta, corrupt, emsg, from_cache=True)
-
-	# Process probe futures with progress tracking
-	total_probes = len(futures)
-	for i, fut in enumerate(as_completed(futures)):
-		try:
-			add_to_list(futures[fut], *fut.result(), from_cache=False)
-		except Exception:
-			pass
-		
-		# OPTIMIZATION: Update progress less frequently for better performance
-		if i % 5 == 0 or i == total_probes - 1:
-			progress_pct = 100 * (i + 1) / total_probes if total_probes else 100
-			spinner.print_spin(f"[scan] {progress_pct:>3.1f}% ({len(cached_results) + i + 1}/{len(candidates)})")
+		}
+		if est is not None:
+			file_info["est"] = est
+		if on_file is not None:
+			on_file(file_info)
+		else:
+			file_list.append(file_info)
+
+	def show_progress() -> None:
+		if on_file is not None:
+			return		# Encoders are printing: no scan spinner in pipeline mode
+		if streaming:
+			spinner.print_spin(f"[scan] {counts['done']}/{counts['seen']} files")
+		else:
+			pct = 100 * counts["done"] / len(walk)
+			spinner.print_spin(f"[scan] {pct:>3.1f}% ({counts['done']}/{len(walk)})")
+
+	def run_probes(batch: List[Media_walk.MediaEntry]) -> None:
+		"""Probes one batch of cache misses in on-disk order and adds the results."""
+		# Probes run per device in on-disk order: spinning disks get PROBE_HDD_LANES, SSD / network the full pool
+		futures: Dict[Any, Media_walk.MediaEntry] = {}
+		with Scheduler.ProbeScheduler(
+			max_workers if use_threads else 1, PROBE_HDD_LANES, PROBE_ROTATIONAL, ordered=PROBE_LOCALITY
+		) as sched:
+			for me in batch:
+				futures[sched.submit(me, _probe_or_match, me.path, me.size, cache, fail_ttl_s)] = me
+			lanes = sched.lanes()
+			if not counts["lanes_shown"] and (de_bug or any(kind == Scheduler.HDD for kind, _, _ in lanes.values())):
+				counts["lanes_shown"] = True
+				for dev, (kind, n_lanes, queued) in lanes.items():
+					print(f"   Probe queue dev {dev}: {kind}, {n_lanes} lane(s), {queued} file(s)")
+			sched.start()
+
+			for i, fut in enumerate(as_completed(futures)):
+				me = futures[fut]
+				try:
+					match, probe, fp = fut.result()
+				except (OSError, ValueError, sqlite3.Error) as e:
+					# The probe task itself failed: warned, listed as broken and negative-cached like a failed ffprobe
+					match, probe, fp = None, (None, False, f"probe failed: {e}"), None
+				try:
+					if match:
+						# Moved / renamed file: reuse its old probe record, only the path changes
+						old_key, old_path, entry = match
+						moved = (old_path == me.path) or not (old_path and os.path.exists(old_path))
+						cache.relink(old_key, Scan_cache.cache_key(me.path, me.size, me.mtime), me.path, me.size, me.mtime, moved)
+						counts["relinked"] += 1
+						add_to_list(me, entry.get("metadata"), entry.get("is_corrupted", False), entry.get("error_msg"), from_cache=True)
+					else:
+						add_to_list(me, *probe, from_cache=False, fp=fp)
+				except (OSError, ValueError, sqlite3.Error) as e:
+					safe_print(f"\n\033[93m Warning: scan cache, '{me.path}': {e}\033[0m")
+
+				# OPTIMIZATION: Update progress less frequently for better performance
+				if i % 5 == 0 or i == len(futures) - 1:
+					show_progress()
+
+	# Cache hits are added straight away; misses are probed in batches (bounded in scale mode)
+	pending: List[Media_walk.MediaEntry] = []
+	for me in walk:
+		counts["seen"] += 1
+		# Check cache (indexed lookup, no full load)
+		f_key = Scan_cache.cache_key(me.path, me.size, me.mtime)
+		entry = cache.get(f_key) if cache is not None else None
+		if entry is not None and Scan_cache.is_failure(entry) and Scan_cache.failure_expired(entry, fail_ttl_s):
+			entry = None	# Failure TTL elapsed: probe it again
+		if entry is not None:
+			add_to_list(me, entry.get("metadata"), entry.get("is_corrupted", False), entry.get("error_msg", None), from_cache=True)
+			if streaming and counts["seen"] % 500 == 0:
+				show_progress()
+		else:
+			pending.append(me)
+			if streaming and len(pending) >= batch_max:
+				run_probes(pending)
+				pending = []
+	if pending:
+		run_probes(pending)
 	
 	spinner.stop()
+	if streaming and not counts["seen"]:
+		print("   No media files found.")
+	if Probe_native.STATS.calls:
+		print(f"   {Probe_native.STATS.summary()}")
+	if counts["relinked"]:
+		print(f"   Reused {counts['relinked']} probe record(s) of moved/renamed/copied files (content fingerprint).")
+	if broken:
+		retry = "never" if fail_ttl_s is None else hm_tm(fail_ttl_s)
+		print(f"\033[93m   Known-bad files: {len(broken)} (skipped, retry after: {retry})\033[0m")
+		for b_path, b_cls, b_msg in sorted(broken):
+			print(f"\033[93m    |{b_cls:<10}| {b_path} | {b_msg.strip().splitlines()[-1][:120] if b_msg.strip() else ''}\033[0m")
 
-	# OPTIMIZATION: Save cache with better error handling
-	if not IGNORE_SCAN_CACHE:
-		try:
-			# Ensure all metadata is serializable
-			final_cache = {}
-			for k, v in cache.items():
-				m = v.get('metadata', {})
-				if hasattr(m, '__dict__'):
-					m = m.__dict__
-				final_cache[k] = {**v, 'metadata': m}
-			
-			# Write cache atomically
-			temp_cache = CACHE_FILE.with_suffix('.tmp')
-			with temp_cache.open("w", encoding="utf-8") as f:
-				json.dump(final_cache, f, indent=2, default=str)
-			temp_cache.replace(CACHE_FILE)
-		except Exception as e:
-			print(f"⚠️  Warning: Failed to save cache: {e}")
+	# Commit whatever is still pending (the scale-mode handle stays open for process_file)
+	if cache is not None:
+		if scale: cache.flush()
+		else: cache.close()
+
+	if on_file is not None:
+		return file_list		# Everything was handed to on_file (in scan order)
+	sort_files(file_list, job_order_cfg(sort_keys_cfg))
+	return file_list
+
+
+def job_order_cfg(sort_keys_cfg: Collection) -> List[Tuple[str, bool]]:
+	"""JOB_ORDER = "gain": expected saving per CPU-second first (fast lane on top), sort_keys_cfg breaks ties."""
+	return [("gain", True), *sort_keys_cfg] if JOB_ORDER == "gain" else list(sort_keys_cfg)
+
+def sort_files(file_list: Union[List[Dict[str, Any]], File_table.FileTable], sort_keys_cfg: Collection) -> None:
+	"""Sorts a scan result in place: [("size", True), ("date", False)] = biggest first, then oldest."""
+	if isinstance(file_list, File_table.FileTable):
+		file_list.sort(sort_keys_cfg)
+		return
 
 	# OPTIMIZATION: Use single-pass sorting with stable sort
 	Sort_key = {
 		"size": lambda x: x["size"],
 		"date": lambda x: x["date"],
-		"name": lambda x: x["name"]
+		"name": lambda x: x["name"],
+		"gain": lambda x: Scheduler.priority(x["est"]) if "est" in x else 0.0,
 	}
 	
-	for key, descending in reversed(sort_keys_cfg):
+	for key, descending in reversed(list(sort_keys_cfg)):
 		if key in Sort_key:
 			file_list.sort(key=Sort_key[key], reverse=descending)
-	
-	return file_list
 
+def job_order_report(files: Union[List[Dict[str, Any]], File_table.FileTable]) -> str:
+	"""Projected savings over time of the gain order vs. the plain sort_keys_cfg order (leaves files gain-sorted)."""
+	def estimates() -> List[Scheduler.JobEstimate]:
+		if isinstance(files, File_table.FileTable):
+			return [Scheduler.JobEstimate(Scheduler.LANE_REMUX if files.flags[i] & File_table.F_FAST else Scheduler.LANE_ENCODE,
+										  files.saved[i], files.cpu_s[i], files.size[i]) for i in files.rows()]
+		return [fi["est"] for fi in files if "est" in fi]
+	sort_files(files, sort_keys_cfg)
+	by_size = estimates()
+	sort_files(files, job_order_cfg(sort_keys_cfg))
+	return Scheduler.order_report(by_size, estimates(), ENCODE_CPUS)
+
+
+def _probe_or_match(
+	f_path: str,
+	size: int,
+	cache: Optional[Scan_cache.ScanCache],
+	fail_ttl_s: Optional[float] = None
+) -> Tuple[Any, Any, Optional[str]]:
+	"""Probe task: looks the file up by content fingerprint first, runs ffprobe only on a miss.
+
+	Returns (match, probe_result, fp) where match is (old_key, old_path, record) or None.
+	"""
+	fp = Scan_cache.content_fingerprint(f_path, size) if cache is not None else None
+	match = cache.find_fingerprint(fp) if fp else None
+	if match and Scan_cache.is_failure(match[2]) and Scan_cache.failure_expired(match[2], fail_ttl_s):
+		match = None
+	if match:
+		return match, None, fp
+	return None, FFMpeg.ffprobe_run(f_path, FFMpeg.FFPROBE, de_bug, CHECK_CORRUPTION), fp
+
+
+# Scale mode: one scan-cache handle shared by scan_folder and process_file (metadata is reloaded from it)
+_META_CACHE: Optional[Scan_cache.ScanCache] = None
+_META_LOCK = threading.Lock()
+
+def _metadata_cache() -> Scan_cache.ScanCache:
+	"""Opens the scale-mode metadata store once (a per-run store in RUN_TMP with IGNORE_SCAN_CACHE=1)."""
+	global _META_CACHE
+	with _META_LOCK:
+		if _META_CACHE is None:
+			if os.getenv("IGNORE_SCAN_CACHE", "0") == "1":
+				_META_CACHE = Scan_cache.SqliteScanCache(RUN_TMP / Scan_cache.SQLITE_CACHE_NAME, SCAN_CACHE_BATCH)
+			else:
+				_META_CACHE = Scan_cache.open_scan_cache(WORK_DIR, SCAN_CACHE_ENGINE, SCAN_CACHE_BATCH)
+				if os.getenv("CLEAR_SCAN_CACHE", "0") == "1":
+					_META_CACHE.clear()
+		return _META_CACHE
+
+def _load_metadata(file_info: Any) -> Any:
+	"""Scale mode: the file's stream metadata from the scan cache (probed again if the record is gone)."""
+	rec = _metadata_cache().get(Scan_cache.cache_key(file_info["path"], file_info["size"], file_info["mtime"]))
+	if rec and rec.get("metadata"):
+		return rec["metadata"]
+	meta, _, _ = FFMpeg.ffprobe_run(file_info["path"], FFMpeg.FFPROBE, de_bug, False)
+	return meta
+
+# Parallel encodes draw their threads from one shared budget (ENCODE_CPU_BUDGET)
+ENCODE_BUDGET = Scheduler.CpuBudget(ENCODE_CPUS)
+
+def _encode_threads(metadata: Any, ff_cmd: List[str]) -> int:
+	"""CPU threads for one parallel encode, by source resolution (0 = no limit: sequential or budget off)."""
+	if not (WORK_PARALLEL and ENCODE_CPU_BUDGET):
+		return 0
+	if "libx265" not in ff_cmd:
+		return 2		# Stream copy / audio only / hardware encoder: demux, mux and audio work
+	return Scheduler.encode_threads(*_video_size(metadata), ENCODE_BUDGET.total)
+
+def _video_size(metadata: Any) -> Tuple[int, int]:
+	"""(width, height) of the main video stream (0, 0 if unknown)."""
+	streams = metadata.streams if hasattr(metadata, "streams") else (metadata or {}).get("streams", [])
+	vid = next((s for s in streams if s.get("codec_type") == "video"
+				and not (s.get("disposition") or {}).get("attached_pic")), {})
+	return int(vid.get("width") or 0), int(vid.get("height") or 0)
+
+def _speed_key(metadata: Any, ff_cmd: List[str]) -> Tuple[str, str, str]:
+	"""(encoder, preset, resolution class) the encode speed history is kept under."""
+	preset = Deadline.cmd_preset(ff_cmd)
+	return ("copy" if preset == "copy" else FFMpeg.CURRENT_ENCODER), preset, Deadline.pixel_class(*_video_size(metadata))
+
+def _deadline_gate(file_info: Any, metadata: Any, ff_cmd: List[str], threads: int, task_id: str) -> Optional[List[str]]:
+	"""--until / --budget: the command to run (on a faster x265 preset when far behind), None if it doesn't fit."""
+	win = Deadline.WINDOW
+	if win is None:
+		return ff_cmd
+	media_s = float(file_info["duration"] or 0)
+	win.start(media_s)
+	encoder, preset, px = _speed_key(metadata, ff_cmd)
+	if (DEADLINE_FAST_PRESET and "libx265" in ff_cmd and preset in Deadline.PRESET_SPEED
+			and Deadline.PRESET_SPEED[preset] < Deadline.PRESET_SPEED.get(DEADLINE_FAST_PRESET, 0) and win.behind(encoder, preset, px)):
+		ff_cmd = ff_cmd.copy()
+		ff_cmd[ff_cmd.index("-preset") + 1] = DEADLINE_FAST_PRESET
+		safe_print(f"   [{task_id}] Queue far behind the window: preset {preset} -> {DEADLINE_FAST_PRESET}")
+		preset = DEADLINE_FAST_PRESET
+	# No history yet: the job-order cost model at this job's share of the CPUs
+	model_s = FFMpeg.estimate_job(file_info["path"], metadata).cpu_s / max(1, threads or ENCODE_CPUS)
+	model_s /= Deadline.PRESET_SPEED.get(preset, 1.0)
+	predicted = win.predict(encoder, preset, px, media_s, model_s)
+	if not win.admit(predicted):
+		safe_print(f"   [{task_id}] Not started: ~{hm_tm(predicted)} predicted, {hm_tm(max(0, win.remaining()))} left in the window")
+		return None
+	safe_print(f"   [{task_id}] Window: ~{hm_tm(predicted)} predicted, {hm_tm(win.remaining())} left")
+	return ff_cmd
+
+def _record_speed(metadata: Any, ff_cmd: List[str], media_s: float, wall_s: float) -> None:
+	"""Adds one finished encode to the speed history (used by --until / --budget predictions)."""
+	try:
+		Deadline.history().record(*_speed_key(metadata, ff_cmd), float(media_s or 0), wall_s)
+	except Exception as e:
+		safe_print(f"   [Warning] Speed history: {e}")
+
+def _encode(file_p: str, ff_cmd: List[str], duration: float, task_id: str, threads: int) -> Optional[str]:
+	"""Runs one planned encode: chunked for long files (CHUNK_ENCODE), else one ffmpeg under the CPU budget.
 
-def process_file(file_info: Dict[str, Any], idx: int, total: int, task_id: str) -> Tuple[int, int, int, int]:
+	With STAGING, ffmpeg reads the source's local copy when one is ready (or being made).
+	"""
+	with Staging.local(file_p) as src:
+		if src != file_p:
+			safe_print(f"   [{task_id}] Reading the staged copy of {Path(file_p).name}")
+		if Chunk_encode.wants_chunks(file_p, duration):
+			# The planned command, not the staged one: it keys the resume dir, which must survive the run
+			out = Chunk_encode.chunk_encode(file_p, ff_cmd, duration, de_bug, task_id, ENCODE_BUDGET, threads, src)
+			if out or FFMpeg.srik_get(file_p).get("output", {}).get("not_worth"):
+				return out		# Done, or the size guard already ruled the file out
+			safe_print(f"   [{task_id}] Chunked encode not usable, encoding in one piece")
+		with ENCODE_BUDGET.hold(threads):
+			if threads: safe_print(f"   [{task_id}] CPU budget: {threads} thread(s), {ENCODE_BUDGET.in_use}/{ENCODE_BUDGET.total} in use")
+			return FFMpeg.ffmpeg_run(file_p, Staging.with_input(ff_cmd, file_p, src), duration, False, de_bug, task_id, threads)
+
+def _record_not_worth(file_info: Any) -> bool:
+	"""If the size guard stopped this file (FFMpeg SRIK flag), caches it as "no_gain" and returns True.
+
+	Scans then skip the unchanged file like any cached failure until PROBE_FAIL_RETRY_H elapses.
+	"""
+	reason = FFMpeg.srik_get(file_info["path"]).get("output", {}).get("not_worth")
+	if not reason:
+		return False
+	try:
+		metadata = file_info.get("metadata") or _load_metadata(file_info)
+		path, size, mtime = file_info["path"], file_info["size"], file_info["mtime"]
+		_metadata_cache().put(Scan_cache.cache_key(path, size, mtime), Scan_cache.make_record(metadata, False, reason),
+							  path, size, mtime, Scan_cache.content_fingerprint(path, size))
+		_metadata_cache().flush()
+	except Exception as e:
+		safe_print(f"   [Warning] Could not cache the size guard result: {e}")
+	return True
+
+def _with_skip_key(metadata: Any, size: int) -> Dict[str, Any]:
+	"""Copy of the metadata (VideoMeta, its dict or raw ffprobe JSON) with the SKIP_KEY comment and the given size."""
+	meta = copy.deepcopy(metadata.__dict__ if hasattr(metadata, "__dict__") else metadata)
+	if "format" in meta:
+		meta["format"].setdefault("tags", {})["comment"] = SKIP_KEY
+		meta["format"]["size"] = str(size)
+	else:
+		meta.setdefault("format_tags", {})["comment"] = SKIP_KEY
+		meta["size"] = size
+	return meta
+
+def _tag_in_place(file_info: Any, metadata: Any, task_id: str) -> Optional[str]:
+	"""SKIP_TAG_IN_PLACE: marks a compliant MP4 that only lacks SKIP_KEY without a rewrite -> outcome (None: run the plan).
+
+	The comment goes into the file's moov (Mp4_tag); where that isn't possible, into its scan-cache record,
+	which the next scan reads instead of probing. Either way the cache holds the tagged metadata.
+	"""
+	path = file_info["path"]
+	if not (SKIP_TAG_IN_PLACE and FFMpeg.srik_get(path).get("plan", {}).get("tag_only")):
+		return None
+	try:
+		how, written = Mp4_tag.set_comment(path, SKIP_KEY, SKIP_TAG_KEEP_FASTSTART)
+		st = os.stat(path)
+		outcome, size, mtime = "tagged", st.st_size, st.st_mtime
+		safe_print(f"\033[92m   [{task_id}] SKIP_KEY written in place ({how}, {hm_sz(written)} written)\033[0m")
+	except (Mp4_tag.TagError, OSError) as e:
+		outcome, size, mtime = "tagged_cache", file_info["size"], file_info["mtime"]
+		safe_print(f"\033[92m   [{task_id}] SKIP_KEY kept in the scan cache ({e})\033[0m")
+	try:
+		_metadata_cache().put(Scan_cache.cache_key(path, size, mtime), Scan_cache.make_record(_with_skip_key(metadata, size)),
+							  path, size, mtime, Scan_cache.content_fingerprint(path, size))
+		if outcome == "tagged" and SCAN_DIR_MANIFEST:
+			# The edit kept the directory's mtime: without this the next walk returns the old size / mtime
+			Media_walk.refresh_manifest_file(_metadata_cache(), path)
+		_metadata_cache().flush()
+	except Exception as e:
+		safe_print(f"   [Warning] Could not cache the skip key: {e}")
+		if outcome == "tagged_cache":
+			return None		# Nowhere to keep it: rewrite the file as before
+	return outcome
+
+# Files the predictor deferred (PREDICT_ACTION = "defer"); main encodes them after everything else
+_DEFERRED: List[Any] = []
+_DEFERRED_LOCK = threading.Lock()
+
+def _take_deferred() -> List[Any]:
+	with _DEFERRED_LOCK:
+		out = _DEFERRED[:]
+		_DEFERRED.clear()
+	return out
+
+def _predict_gate(file_info: Any, ff_cmd: List[str], task_id: str, threads: int) -> Tuple[Optional[Predict.Prediction], str]:
+	"""Sample-encodes long files (PREDICT_ENCODES) -> (prediction, "encode" | "skip" | "defer")."""
+	file_p, duration = file_info["path"], float(file_info["duration"] or 0)
+	if not Predict.wants_prediction(ff_cmd, duration):
+		return None, "encode"
+	pred = Predict.predict(file_p, ff_cmd, duration, task_id, threads, ENCODE_BUDGET)
+	if pred is None:
+		return None, "encode"		# No estimate: behave as before
+	safe_print(f"   [{task_id}] Prediction: {hm_sz(pred.size)} ({hm_sz(pred.saved)} saved), ~{hm_tm(pred.wall_s)} wall,"
+			   f" {pred.cpu_s:.0f} CPU-s -> {pred.kb_per_cpu_s:.1f} KB/CPU-s")
+	if pred.worth_it():
+		return pred, "encode"
+	action = "skip" if PREDICT_ACTION == "skip" else "defer"
+	Predict.log_result(file_p, pred, action)
+	safe_print(f"   [{task_id}] Below {PREDICT_MIN_KB_PER_CPU_S} KB/CPU-s: {'skipped' if action == 'skip' else 'deferred to the end of the run'}")
+	if action == "defer":
+		with _DEFERRED_LOCK:
+			_DEFERRED.append(file_info)
+	return pred, action
+
+def _job_end(path: str, saved: int, procs: int, skipt: int, errod: int, outcome: Optional[str] = None, error: Optional[str] = None) -> None:
+	"""Records how a job ended in the job store (JOB_STORE) and drops its SRIK record."""
+	store = Job_store.STORE
+	if store is not None:
+		row = store.get(path) if errod else None
+		if row and row["state"] == Job_store.SWAPPING:
+			# clean_up could not roll its swap back: repair it now rather than lose the journal
+			state, note = Job_store.repair_swap(path, json.loads(row["swap"] or "{}"))
+			safe_print(f"\033[93m   Swap repair: {path}: {note}\033[0m")
+		if outcome is None:
+			not_worth = FFMpeg.srik_get(path).get("output", {}).get("not_worth")
+			outcome = "encoded" if procs else "not_worth" if not_worth else "skip" if skipt else "error"
+		if outcome in ("refused", "deferred", "drained"):
+			state = Job_store.QUEUED		# Not done: a later window / run or the deferred round takes it
+		else:
+			state = Job_store.FAILED if errod else Job_store.DONE
+		store.mark(path, state, outcome=outcome, saved=saved if procs else None, error=error)
+	if outcome != "deferred":
+		FFMpeg.srik_clear(path)
+	Staging.done(path)
+
+def process_file(file_info: Dict[str, Any], idx: int, total: int, task_id: str, predict: bool = True) -> Tuple[int, int, int, int]:
 	"""Orchestrates the transcoding process for a single file.
 	
+	predict=False bypasses the sample-encode predictor (deferred files on their second round).
 	Returns: (saved_bytes, processed_count, skipped_count, error_count)
 	"""
 	str_t = datetime.now()
@@ -315,35 +626,593 @@ def process_file(file_info: Dict[str, Any], idx: int, total: int, task_id: str)
 
 	safe_print(f"\n{file_p}\n +Start: [{str_t.strftime('%H:%M:%S')}]  File: {idx} of {total}, {hm_sz(file_info['size'])}")
 	
+	outcome = error = None
 	try:
-		ff_cmd, skip_it, logs = FFMpeg.parse_finfo(file_p, file_info["metadata"], de_bug)
+		metadata = file_info.get("metadata")
+		if metadata is None:
+			metadata = _load_metadata(file_info)	# Scale mode: only now, one file at a time
+		ff_cmd, skip_it, logs = FFMpeg.parse_finfo(file_p, metadata, de_bug)
 		for line in logs:
 			safe_print(line)
+		Job_store.mark(file_p, Job_store.PLANNED)
+		tagged = None if skip_it else _tag_in_place(file_info, metadata, task_id)
+		skip_it = skip_it or tagged is not None
 
-		if skip_it:
+		threads = _encode_threads(metadata, ff_cmd)
+		run_cmd = ff_cmd if skip_it else _deadline_gate(file_info, metadata, ff_cmd, threads, task_id)
+		pred, action = _predict_gate(file_info, ff_cmd, task_id, threads) if predict and run_cmd and not skip_it else (None, "encode")
+		if action == "defer":
+			_job_end(file_p, 0, 0, 0, 0, outcome="deferred")
+			return 0, 0, 0, 0		# Counted when main runs it at the end
+		if skip_it or action == "skip" or run_cmd is None:
 			skipt = 1
+			outcome = "refused" if run_cmd is None else "predicted_low_gain" if action == "skip" else tagged or "skip"
 		else:
-			out_temp = FFMpeg.ffmpeg_run(file_p, ff_cmd, file_info["duration"], skip_it, de_bug, task_id)
+			Job_store.mark(file_p, Job_store.ENCODING)
+			t_enc, p_enc = time.perf_counter(), FFMpeg.PROC_MGR.paused_s()
+			out_temp = _encode(file_p, run_cmd, file_info["duration"], task_id, threads)
+			enc_s = time.perf_counter() - t_enc - (FFMpeg.PROC_MGR.paused_s() - p_enc)		# Paused time isn't encode time
 			if out_temp:
+				_record_speed(metadata, run_cmd, file_info["duration"], enc_s)
+				Job_store.mark(file_p, Job_store.VERIFYING)
 				res = FFMpeg.clean_up(file_p, out_temp, False, de_bug, task_id)
+				if pred:
+					Predict.log_result(file_p, pred, "encode", pred.in_size - res if res != -1 else None, enc_s)
 				if res != -1:
 					saved = res
 					procs = 1
+				elif _record_not_worth(file_info):
+					skipt = 1
 				else:
 					errod = 1
+			elif _record_not_worth(file_info):
+				skipt = 1
 			else:
 				errod = 1
 	except Exception as e:
 		errod = 1
+		error = str(e)
 		safe_print(f"\n[CRITICAL] {e}\n{traceback.format_exc()}")
 	
+	_job_end(file_p, saved, procs, skipt, errod, outcome, error)
 	safe_print(f" -End: [{datetime.now().strftime('%H:%M:%S')}]\tTotal: {hm_tm((datetime.now()-str_t).total_seconds())}")
 	return saved, procs, skipt, errod
 
 
+# =============================================================================
+# PIPELINE MODE
+# =============================================================================
+
+def verify_output(file_info: Any, out_temp: str) -> Optional[str]:
+	"""Checks an encode before it replaces the source: None if it looks complete, else the reason."""
+	out_p = Path(out_temp)
+	if not out_p.exists() or out_p.stat().st_size < 1024:
+		return "output missing or too small"
+	src_dur = float(file_info["duration"] or 0)
+	if src_dur <= 0:
+		return None		# Nothing to compare against
+	meta, _, err = FFMpeg.ffprobe_run(out_temp, FFMpeg.FFPROBE, de_bug, False)
+	if meta is None:
+		return f"output unreadable: {err}"
+	if abs(meta.duration - src_dur) > max(DURATION_TOLERANCE_ABS, DURATION_TOLERANCE_PCT * src_dur):
+		return f"duration {hm_tm(meta.duration)} vs source {hm_tm(src_dur)}"
+	return None
+
+def run_pipeline(valid_dirs: List[str], run_id: Optional[str] = None) -> Tuple[int, int, int, int]:
+	"""Scans and transcodes at once: scan -> plan -> encode -> verify -> clean_up stages with bounded queues.
+
+	The first encode starts as soon as the first file is planned; files go in scan order
+	(and into the job store's queue for run_id as they are found).
+	Returns (saved_bytes, processed_count, skipped_count, error_count).
+	"""
+	totals = {"saved": 0, "procs": 0, "skipt": 0, "errod": 0, "fed": 0}
+	lock = threading.Lock()
+	encoders = (MAX_WORKERS_CAP if Control.CONTROL is not None else MAX_WORKERS) if WORK_PARALLEL else 1
+
+	def task_id() -> str:
+		return f"T{threading.current_thread().name.rsplit('-', 1)[-1]}"
+
+	def finish(job: Dict[str, Any], saved: int = 0, procs: int = 0, skipt: int = 0, errod: int = 0,
+			   outcome: Optional[str] = None, error: Optional[str] = None) -> None:
+		_job_end(job["fi"]["path"], saved, procs, skipt, errod, outcome, error)
+		count(job, (saved, procs, skipt, errod))
+
+	def count(job: Dict[str, Any], res: Tuple[int, int, int, int]) -> None:
+		saved, procs, skipt, errod = res
+		with lock:
+			totals["saved"] += saved
+			totals["procs"] += procs
+			totals["skipt"] += skipt
+			totals["errod"] += errod
+			t = dict(totals)
+		if "t0" in job:
+			safe_print(f" -End: [{datetime.now().strftime('%H:%M:%S')}]\tTotal: {hm_tm((datetime.now()-job['t0']).total_seconds())}")
+		lbl = "Lost" if t["saved"] < 0 else "Saved"
+		safe_print(f"  |Queued: {t['fed']-(t['procs']+t['skipt']+t['errod'])}|OK: {t['procs']}|Errors: {t['errod']}|Skipt: {t['skipt']}|{lbl}: {hm_sz(t['saved'])} |")
+
+	def plan(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+		fi = job["fi"]
+		file_p = fi["path"]
+		if Path(file_p).stem.endswith(".temp"):
+			finish(job, skipt=1)
+			return None
+		if _draining():
+			finish(job, outcome="drained")
+			return None
+		job["t0"] = datetime.now()
+		safe_print(f"\n{file_p}\n +Start: [{job['t0'].strftime('%H:%M:%S')}]  File: {job['idx']} of {totals['fed']}+, {hm_sz(fi['size'])}")
+		metadata = fi.get("metadata")
+		if metadata is None:
+			metadata = _load_metadata(fi)
+		ff_cmd, skip_it, logs = FFMpeg.parse_finfo(file_p, metadata, de_bug)
+		for line in logs:
+			safe_print(line)
+		Job_store.mark(file_p, Job_store.PLANNED)
+		if not skip_it and (tagged := _tag_in_place(fi, metadata, task_id())):
+			finish(job, skipt=1, outcome=tagged)
+			return None
+		if skip_it or not ff_cmd:
+			finish(job, skipt=1)
+			return None
+		job["threads"] = _encode_threads(metadata, ff_cmd)
+		job["meta"] = metadata if fi.get("metadata") is not None else None		# Scale mode: not kept queued
+		job["cmd"] = _deadline_gate(fi, metadata, ff_cmd, job["threads"], task_id())
+		if job["cmd"] is None:
+			finish(job, skipt=1, outcome="refused")
+			return None
+		if lane is not None and FFMpeg.remux_only(job["cmd"]):
+			job.pop("meta", None)
+			lane.submit(job, int(fi["size"]))		# Copy-only: the remux lane, not the encode stage
+			return None
+		job["pred"], action = _predict_gate(fi, ff_cmd, task_id(), job["threads"])
+		if action != "encode":
+			finish(job, skipt=int(action == "skip"), outcome="predicted_low_gain" if action == "skip" else "deferred")
+			return None
+		Staging.prefetch(file_p)		# Copied while the jobs ahead of it in the encode queue run
+		return job
+
+	def encode(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+		fi = job["fi"]
+		with _slot():
+			if _draining():
+				finish(job, outcome="drained")
+				return None
+			Job_store.mark(fi["path"], Job_store.ENCODING)
+			t_enc, p_enc = time.perf_counter(), FFMpeg.PROC_MGR.paused_s()
+			cmd = job.pop("cmd")
+			job["out"] = _encode(fi["path"], cmd, fi["duration"], task_id(), job["threads"])
+			job["enc_s"] = time.perf_counter() - t_enc - (FFMpeg.PROC_MGR.paused_s() - p_enc)
+		if job["out"]:
+			_record_speed(job.pop("meta") or _load_metadata(fi), cmd, fi["duration"], job["enc_s"])
+		if not job["out"]:
+			if _record_not_worth(fi): finish(job, skipt=1)
+			else: finish(job, errod=1)
+			return None
+		return job
+
+	def verify(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+		Job_store.mark(job["fi"]["path"], Job_store.VERIFYING)
+		reason = verify_output(job["fi"], job["out"])
+		if reason:
+			safe_print(f"\033[91m   [Error] Verify failed, source kept: {job['fi']['path']}: {reason}\033[0m")
+			Path(job["out"]).unlink(missing_ok=True)
+			finish(job, errod=1, error=f"verify: {reason}")
+			return None
+		return job
+
+	def replace(job: Dict[str, Any]) -> None:
+		res = FFMpeg.clean_up(job["fi"]["path"], job["out"], False, de_bug, task_id())
+		if pred := job.get("pred"):
+			Predict.log_result(job["fi"]["path"], pred, "encode", pred.in_size - res if res != -1 else None, job["enc_s"])
+		if res != -1: finish(job, saved=res, procs=1)
+		elif _record_not_worth(job["fi"]): finish(job, skipt=1)
+		else: finish(job, errod=1)
+		return None
+
+	def on_error(stage: str, job: Dict[str, Any], exc: BaseException) -> None:
+		safe_print(f"\n[CRITICAL] {stage}: {job['fi']['path']}: {exc}\n{''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))}")
+		if job.get("out"):
+			Path(job["out"]).unlink(missing_ok=True)
+		finish(job, errod=1, error=f"{stage}: {exc}")
+
+	lane = _remux_lane(count) if REMUX_LANE else None
+	stages = [("plan", plan, 2), ("encode", encode, encoders), ("verify", verify, 1), ("clean_up", replace, 1)]
+	stop = threading.Event()
+	with Pipeline.Pipeline(stages, PIPE_QUEUE_DEPTH, on_error) as pipe:
+		def report_loop() -> None:
+			while not stop.wait(PIPE_STATS_S):
+				safe_print(f"\n   Pipeline stages:\n{pipe.report()}")
+		if PIPE_STATS_S:
+			threading.Thread(target=report_loop, name="pipe-stats", daemon=True).start()
+
+		def feed(file_info: Any) -> None:
+			if _draining():
+				return
+			ctl = Control.CONTROL
+			if ctl is not None:
+				while path := ctl.take_bump():		# Bumped paths go in ahead of the next scanned file
+					if (fi := _bump_record(path)) is not None:
+						put(fi)
+				if ctl.was_bumped(file_info["path"]):
+					return
+			put(file_info)
+
+		def put(file_info: Any) -> None:
+			if Deadline.WINDOW is not None:
+				if Deadline.WINDOW.closed():
+					return		# Past the drain point: the rest waits for the next window
+				Deadline.WINDOW.queued_media_s += float(file_info["duration"] or 0)
+			if run_id is not None:
+				Job_store.STORE.enqueue(run_id, [(file_info["path"], file_info["size"], file_info["mtime"], file_info["duration"])], totals["fed"])
+			totals["fed"] += 1
+			pipe.feed({"fi": file_info, "idx": totals["fed"]})
+
+		try:
+			for dir_idx, root_dir in enumerate(valid_dirs, 1):
+				print(f"\n{'='*80}")
+				print(f"📁 Directory {dir_idx}/{len(valid_dirs)}: {root_dir}  (pipelined)")
+				print(f"{'='*80}")
+				scan_folder(root_dir, File_extn, sort_keys_cfg, SCAN_PARALLEL, MAX_SCAN_WORKRS, on_file=feed)
+			print(f"\n📊 Scan done: {totals['fed']} file(s) queued, finishing the encodes...\n")
+			pipe.close()
+			if lane is not None:
+				_close_remux_lane(lane)
+		finally:
+			stop.set()
+		print(f"\n   Pipeline stages:\n{pipe.report()}")
+
+	return totals["saved"], totals["procs"], totals["skipt"], totals["errod"]
+
+
+def _draining() -> bool:
+	ctl = Control.CONTROL
+	return ctl is not None and ctl.draining.is_set()
+
+def _no_new_jobs() -> bool:
+	"""Control drain, or --until / --budget past the drain point: no further file is started."""
+	if _draining():
+		safe_print("\n🎛  Draining: no new jobs, waiting for the running ones.")
+		return True
+	if Deadline.WINDOW is None or not Deadline.WINDOW.closed():
+		return False
+	safe_print(f"\n⏰ Deadline near: no new jobs. {Deadline.WINDOW.summary()}")
+	return True
+
+def _bump_record(path: str) -> Optional[Dict[str, Any]]:
+	"""File record for a path bumped from the control channel (probed now, like the scan does)."""
+	try:
+		st = os.stat(path)
+	except OSError as e:
+		safe_print(f"   [Warning] Bump: {e}")
+		return None
+	fi = {"path": path, "size": st.st_size, "mtime": st.st_mtime, "name": Path(path).name,
+		  "date": datetime.fromtimestamp(st.st_mtime), "duration": 0.0}
+	metadata = _load_metadata(fi)
+	if not metadata:
+		safe_print(f"   [Warning] Bump: {path}: no stream metadata, not queued")
+		return None
+	if hasattr(metadata, "duration"):
+		fi["metadata"], fi["duration"] = metadata.__dict__, metadata.duration
+	else:
+		fi["metadata"] = metadata
+		fi["duration"] = float(metadata.get("duration") or (metadata.get("format", {}) or {}).get("duration", 0.0) or 0.0)
+	return fi
+
+def _with_bumps(files: Iterable[Any]) -> Iterator[Any]:
+	"""Yields files in order, a path bumped from the control channel first; each file only once."""
+	it = iter(files)
+	while True:
+		ctl = Control.CONTROL
+		path = ctl.take_bump() if ctl is not None else None
+		if path:
+			fi = _bump_record(path)
+			if fi is not None:
+				yield fi
+			continue
+		fi = next(it, None)
+		if fi is None:
+			return
+		if ctl is not None and ctl.was_bumped(fi["path"]):
+			continue
+		yield fi
+
+def _prefetch_ahead(files: Iterable[Any], elsewhere: Optional[Callable[[Any], bool]] = None) -> Iterator[Any]:
+	"""Yields the files elsewhere(fi) doesn't claim (the remux lane's), each handed to Staging
+	STAGING_AHEAD files before its turn (no look-ahead while staging is off)."""
+	ahead = deque()
+	n = STAGING_AHEAD if Staging.STAGER is not None else 0
+	for fi in files:
+		if elsewhere is not None and elsewhere(fi):
+			continue
+		Staging.prefetch(fi["path"])
+		ahead.append(fi)
+		if len(ahead) > n:
+			yield ahead.popleft()
+	yield from ahead
+
+def _with_handbacks(files: Iterable[Any], handed_back: Deque[Any], lane: Optional[threading.Thread]) -> Iterator[Any]:
+	"""Yields files, each file the remux lane handed back first; at the end waits for the lane and yields the rest."""
+	for fi in files:
+		while handed_back:
+			yield handed_back.popleft()
+		yield fi
+	if lane is not None:
+		lane.join()
+	while handed_back:
+		yield handed_back.popleft()
+
+def _slot() -> ContextManager[None]:
+	"""A worker slot from the control channel ("workers N"); no limit of its own without it."""
+	ctl = Control.CONTROL
+	return ctl.slots.hold() if ctl is not None else nullcontext()
+
+def _process_in_slot(*args: Any) -> Tuple[int, int, int, int]:
+	with _slot():
+		if _draining():
+			_job_end(args[0]["path"], 0, 0, 0, 0, outcome="drained")
+			return 0, 0, 0, 0		# Drained while waiting for its slot: stays queued
+		return process_file(*args)
+
+# =============================================================================
+# REMUX LANE
+# =============================================================================
+
+def _remux_planned(file_info: Any) -> bool:
+	"""REMUX_LANE: the file's estimated plan is a copy-only remux (or only the skip key), so the remux lane takes it."""
+	if Path(file_info["path"]).stem.endswith(".temp"):
+		return False
+	try:
+		est = file_info.get("est")
+		if est is None:
+			metadata = file_info.get("metadata")
+			if metadata is None:
+				metadata = _load_metadata(file_info)
+			if not metadata:
+				return False
+			est = FFMpeg.estimate_job(file_info["path"], metadata)
+	except Exception:
+		return False		# process_file reports it
+	return est.lane == Scheduler.LANE_REMUX
+
+def _remux_jobs(jobs: List[Tuple[Any, List[str]]], task_id: str) -> List[Tuple[int, int, int, int]]:
+	"""Remuxes planned copy-only jobs in one ffmpeg run and swaps each output in -> (saved, procs, skipt, errod) per job."""
+	for fi, _ in jobs:
+		Job_store.mark(fi["path"], Job_store.ENCODING)
+	t0 = time.perf_counter()
+	outs = FFMpeg.remux_run([(fi["path"], cmd) for fi, cmd in jobs], task_id)
+	safe_print(f"   [{task_id}] Remuxed {sum(1 for o in outs if o)}/{len(jobs)} file(s) in {hm_tm(time.perf_counter() - t0)}")
+	res = []
+	for (fi, _), out in zip(jobs, outs):
+		saved = procs = skipt = errod = 0
+		if out:
+			Job_store.mark(fi["path"], Job_store.VERIFYING)
+			r = FFMpeg.clean_up(fi["path"], out, False, de_bug, task_id)
+			if r != -1:
+				saved, procs = r, 1
+		if not procs:
+			if _record_not_worth(fi): skipt = 1
+			else: errod = 1
+		res.append((saved, procs, skipt, errod))
+	return res
+
+def _remux_lane(finish: Callable[[Dict[str, Any], Tuple[int, int, int, int]], None],
+				handback: Optional[Callable[[Any], None]] = None) -> Scheduler.BatchLane:
+	"""REMUX_LANE: the copy-only lane of both run_files and run_pipeline.
+
+	An item is {"fi": file record}, planned in the lane, or a job the pipeline's plan stage already
+	planned ({"fi", "cmd", ...}). The lane records how each one ended (_job_end), then passes it on
+	to finish(item, (saved, procs, skipt, errod)). A file whose plan re-encodes after all goes to
+	handback(fi) for the encode queue, unfinished.
+	"""
+	return Scheduler.BatchLane(lambda batch: _remux_batch(batch, finish, handback), REMUX_WORKERS, REMUX_BATCH,
+							   REMUX_BATCH_MB * 1024 * 1024, "remux")
+
+def _close_remux_lane(lane: Scheduler.BatchLane) -> None:
+	lane.close()
+	if lane.items:
+		safe_print(f"\n   Remux lane: {lane.items} file(s) in {lane.batches} batch(es) of up to {REMUX_BATCH}")
+
+def _remux_plan(item: Dict[str, Any], task_id: str, handback: Optional[Callable[[Any], None]]) -> Optional[Tuple[int, int, int, int]]:
+	"""Plans a lane item like the pipeline's plan stage: sets item["cmd"] for a copy-only remux, hands
+	a re-encode back, else ends the job -> its result (None while the job goes on)."""
+	fi = item["fi"]
+	path = fi["path"]
+	safe_print(f"\n{path}\n +Start: [{datetime.now().strftime('%H:%M:%S')}]  Remux lane [{task_id}], {hm_sz(fi['size'])}")
+	metadata = fi.get("metadata")
+	if metadata is None:
+		metadata = _load_metadata(fi)
+	ff_cmd, skip_it, logs = FFMpeg.parse_finfo(path, metadata, de_bug)
+	for line in logs:
+		safe_print(line)
+	Job_store.mark(path, Job_store.PLANNED)
+	tagged = None if skip_it else _tag_in_place(fi, metadata, task_id)
+	if skip_it or tagged or not ff_cmd:
+		_job_end(path, 0, 0, 1, 0, tagged)
+		return 0, 0, 1, 0
+	if not FFMpeg.remux_only(ff_cmd):
+		if handback is None:
+			raise RuntimeError("re-encode plan in the remux lane")		# Planned items are copy-only
+		safe_print(f"   [{task_id}] The plan re-encodes after all: back to the encode queue")
+		handback(fi)
+		return None
+	item["cmd"] = _deadline_gate(fi, metadata, ff_cmd, _encode_threads(metadata, ff_cmd), task_id)
+	if item["cmd"] is None:
+		_job_end(path, 0, 0, 1, 0, "refused")
+		return 0, 0, 1, 0
+	return None
+
+def _remux_batch(items: List[Dict[str, Any]], finish: Callable[[Dict[str, Any], Tuple[int, int, int, int]], None],
+				 handback: Optional[Callable[[Any], None]] = None) -> None:
+	"""Runs one lane batch: plans the items that need it (skipped and tag-only ones end here), the rest share one ffmpeg run."""
+	task_id = f"R{int(threading.current_thread().name.rsplit('_', 1)[-1]) + 1}"
+	jobs = []
+	for item in items:
+		path = item["fi"]["path"]
+		planned = "cmd" in item
+		ctl = Control.CONTROL
+		if not planned and ctl is not None and ctl.was_bumped(path):
+			continue		# Bumped meanwhile: the encode queue runs it
+		if _draining():
+			_job_end(path, 0, 0, 0, 0, "drained")
+			finish(item, (0, 0, 0, 0))
+			continue
+		if not planned and Deadline.WINDOW is not None and Deadline.WINDOW.closed():
+			_job_end(path, 0, 0, 1, 0, "refused")
+			finish(item, (0, 0, 1, 0))
+			continue
+		try:
+			res = None if planned else _remux_plan(item, task_id, handback)
+		except Exception as e:
+			safe_print(f"\n[CRITICAL] {e}\n{traceback.format_exc()}")
+			_job_end(path, 0, 0, 0, 1, error=str(e))
+			res = (0, 0, 0, 1)
+		if res is not None:
+			finish(item, res)
+		elif "cmd" in item:
+			jobs.append(item)
+	if not jobs:
+		return
+	try:
+		results = _remux_jobs([(item["fi"], item.pop("cmd")) for item in jobs], task_id)
+	except Exception as e:
+		safe_print(f"\n[CRITICAL] Remux batch: {e}\n{traceback.format_exc()}")
+		results = [(0, 0, 0, 1)] * len(jobs)
+	for item, res in zip(jobs, results):
+		_job_end(item["fi"]["path"], *res)
+		finish(item, res)
+
+def _start_remux_lane(files: Iterable[Any], tally: Callable[[Tuple[int, int, int, int]], None],
+					  planned: Callable[[Any], bool], handback: Callable[[Any], None]) -> threading.Thread:
+	"""REMUX_LANE (run_files): feeds the files planned(fi) picks to the lane from a thread (join it to wait for them)."""
+	lane = _remux_lane(lambda item, res: tally(res), handback)
+	def feed() -> None:
+		try:
+			for fi in files:
+				if _draining() or (Deadline.WINDOW is not None and Deadline.WINDOW.closed()):
+					break
+				if planned(fi):
+					lane.submit({"fi": fi}, int(fi["size"]))
+		finally:
+			_close_remux_lane(lane)
+	t = threading.Thread(target=feed, name="remux-feed", daemon=True)
+	t.start()
+	return t
+
+def run_files(files: Any, fl_nmb: int, predict: bool = True) -> Tuple[int, int, int, int]:
+	"""Runs process_file over files (parallel or sequential) -> (saved, procs, skipt, errod).
+
+	With REMUX_LANE, copy-only files run meanwhile in the remux lane instead of waiting for their turn.
+	"""
+	saved = procs = skipt = errod = 0
+	lock = threading.Lock()
+
+	def tally(res: Tuple[int, int, int, int]) -> None:
+		nonlocal saved, procs, skipt, errod
+		with lock:
+			s, p, sk, e = res
+			saved += s
+			procs += p
+			skipt += sk
+			errod += e
+
+			# Summary (thread-safe print)
+			lbl = "Lost" if saved < 0 else "Saved"
+			safe_print(f"  |To_do: {fl_nmb-(procs+skipt+errod)}|OK: {procs}|Errors: {errod}|Skipt: {skipt}|{lbl}: {hm_sz(saved)} |")
+
+	# The lane feeder and the encode queue both ask _remux_planned about every file: the first one
+	# computes it (a metadata load in scale / resume mode), the second takes the answer
+	answers: Dict[str, bool] = {}
+	def remux_planned(fi: Any) -> bool:
+		path = fi["path"]
+		with lock:
+			if path in answers:
+				return answers.pop(path)
+		res = _remux_planned(fi)
+		with lock:
+			if answers.pop(path, None) is None:
+				answers[path] = res
+		return res
+
+	# Files the lane planned as re-encodes after all come back to the encode queue (CPU budget, worker slots)
+	handed_back: Deque[Any] = deque()
+	def handback(fi: Any) -> None:
+		Staging.prefetch(fi["path"])
+		handed_back.append(fi)
+
+	lane = _start_remux_lane(files, tally, remux_planned, handback) if REMUX_LANE and fl_nmb > 0 else None
+	queue = _with_bumps(_with_handbacks(_prefetch_ahead(files, remux_planned if lane is not None else None), handed_back, lane))
+
+	# Process files (parallel or sequential)
+	if WORK_PARALLEL and fl_nmb > 0 and MAX_WORKERS >= 1:
+		# Pool sized for the most workers the control channel may ask for; the slots keep it at the current count
+		ctl = Control.CONTROL
+		pool = MAX_WORKERS_CAP if ctl is not None else MAX_WORKERS
+		with ThreadPoolExecutor(max_workers=pool) as ex:
+			# Bounded submission: only 2 x MAX_WORKERS file records (and their metadata) in flight;
+			# with the control channel one per slot, so a bumped path takes the next free slot
+			futures = set()
+			for i, fi in enumerate(queue):
+				if _no_new_jobs():
+					break
+				futures.add(ex.submit(_process_in_slot, fi, i+1, fl_nmb, f"T{(i%pool)+1}", predict))
+				while len(futures) >= (ctl.slots.limit if ctl is not None else MAX_WORKERS * 2):
+					# Timed wait with the control channel on: "workers N" and bump act without waiting for a job to end
+					done, futures = wait(futures, timeout=CONTROL_POLL_S if ctl is not None else None, return_when=FIRST_COMPLETED)
+					for f in done: tally(f.result())
+			for f in as_completed(futures):
+				tally(f.result())
+	else:
+		for i, each in enumerate(queue):
+			if _no_new_jobs():
+				break
+			tally(process_file(each, i+1, fl_nmb, "T1", predict))
+	if lane is not None:
+		lane.join()
+	for fi in handed_back:
+		_job_end(fi["path"], 0, 0, 0, 0, outcome="drained")		# Stopped before their turn: stay queued
+	return saved, procs, skipt, errod
+
+
+def _open_job_store(valid_dirs: List[str]) -> Tuple[Optional[Job_store.JobStore], Optional[str], Optional[File_table.FileTable]]:
+	"""JOB_STORE: opens the store, repairs interrupted swaps -> (store, run id, open jobs to resume or None)."""
+	if not JOB_STORE:
+		return None, None, None
+	try:
+		store = Job_store.STORE = Job_store.JobStore(JOB_DB)
+	except Exception as e:
+		print(f"⚠️  Warning: Job store unavailable ({e}), running without it.")
+		return None, None, None
+	for path, state, note in Job_store.repair_swaps(store):
+		print(f"\033[93m   Interrupted swap: {path}: {note} -> {state}\033[0m")
+	store.srik_reset()
+	run_id = store.unfinished_run() if RESUME_QUEUE else None
+	if run_id is None:
+		return store, store.start_run(valid_dirs), None
+
+	# Open jobs of the interrupted run, metadata reloaded from the scan cache per file (like scale mode)
+	table = File_table.FileTable()
+	for path, size, mtime, duration, state in store.open_jobs(run_id):
+		if os.path.exists(path):
+			table.append(path, size, mtime, duration or 0.0, File_table.F_LAZY)
+		else:
+			store.mark(path, Job_store.FAILED, outcome="gone", error="source no longer exists")
+	return store, run_id, table
+
 def main(argv=None) -> int:
 	"""Main entry point for the transcoding batch job."""
+	ap = argparse.ArgumentParser(description="Batch HEVC transcode of ROOT_DIRS.")
+	ap.add_argument("--until", metavar="HH:MM", help="maintenance window: start only jobs predicted to finish by then")
+	ap.add_argument("--budget", metavar="7h", help="maintenance window of this length (e.g. 7h, 90m, 1h30m)")
+	args = ap.parse_args(argv)
+
 	print(f"\n+Main Start: [{time.strftime('%H:%M:%S')}]")
+	try:
+		win = Deadline.open_window(args.until, args.budget, MAX_WORKERS if WORK_PARALLEL else 1)
+	except ValueError as e:
+		print(f"Error: {e}")
+		return 1
+	if win:
+		print(f"   {win.summary()}")
 	
 	if not shutil.which("ffmpeg"):
 		print(f"Error: ffmpeg not found.")
@@ -362,56 +1231,82 @@ def main(argv=None) -> int:
 	# Ensure directories exist
 	os.makedirs(EXCEPT_DIR, exist_ok=True)
 	
+	# Job store: finish or roll back swaps a crash interrupted, then resume an unfinished run's queue
+	store, run_id, resume = _open_job_store(valid_dirs)
+
 	# Clean up temp files
 	for p in RUN_TMP.glob("*"):
 		try:
 			p.unlink()
 		except:
 			pass
+	if Chunk_encode.prune_resume_dirs():
+		print(f"   Removed stale resume dir(s) older than {RESUME_KEEP_DAYS} days.")
 
 	# Process each validated directory
-	all_files: List[Dict[str, Any]] = []
-	for dir_idx, root_dir in enumerate(valid_dirs, 1):
-		print(f"\n{'='*80}")
-		print(f"📁 Directory {dir_idx}/{len(valid_dirs)}: {root_dir}")
-		print(f"{'='*80}")
+	if SCALE_MODE:
+		try:
+			_metadata_cache()
+		except Exception as e:
+			print(f"\n❌ Scale mode needs the scan cache, which failed to open: {e}")
+			return 1
+	# Control channel: drain / pause / resume / workers N / bump PATH while the batch runs
+	if CONTROL_CHANNEL:
+		ctl = Control.open_control(MAX_WORKERS if WORK_PARALLEL else 1)
+		print(f"   Control: commands go in {ctl.path} (python Control.py drain | pause | resume | workers N | bump PATH)")
+
+	if STAGING:
+		stager = Staging.open_staging()
+		print(f"   Staging: sources on {', '.join(STAGING_FROM)} storage are copied to {stager.root} ({STAGING_BUDGET_GB} GB budget, {STAGING_AHEAD} ahead)")
+
+	if resume is not None:
+		print(f"\n📊 Resuming run {run_id}: {len(resume)} open job(s), no rescan\n")
+		if win:
+			win.queued_media_s = sum(resume.duration)
+		saved, procs, skipt, errod = run_files(resume, len(resume))
+	elif PIPELINE:
+		saved, procs, skipt, errod = run_pipeline(valid_dirs, run_id)
+	else:
+		all_files: Union[List[Dict[str, Any]], File_table.FileTable] = File_table.FileTable() if SCALE_MODE else []
+		for dir_idx, root_dir in enumerate(valid_dirs, 1):
+			print(f"\n{'='*80}")
+			print(f"📁 Directory {dir_idx}/{len(valid_dirs)}: {root_dir}")
+			print(f"{'='*80}")
 		
-		fl_lst = scan_folder(root_dir, File_extn, sort_keys_cfg, SCAN_PARALLEL, MAX_SCAN_WORKRS)
-		all_files.extend(fl_lst)
-		print(f"   Found {len(fl_lst)} file(s) in this directory.")
+			fl_lst = scan_folder(root_dir, File_extn, sort_keys_cfg, SCAN_PARALLEL, MAX_SCAN_WORKRS)
+			all_files.extend(fl_lst)
+			print(f"   Found {len(fl_lst)} file(s) in this directory.")
 	
-	fl_nmb = len(all_files)
-	print(f"\n📊 Total files to process across all directories: {fl_nmb}\n")
-	saved = procs = skipt = errod = 0
+		fl_nmb = len(all_files)
+		print(f"\n📊 Total files to process across all directories: {fl_nmb}\n")
+		if JOB_ORDER == "gain" and fl_nmb:
+			print(f"{job_order_report(all_files)}\n")	# Also puts all folders in one gain order
+		if win:
+			win.queued_media_s = sum(float(fi["duration"] or 0) for fi in all_files)
+		if store is not None:
+			store.enqueue(run_id, ((fi["path"], fi["size"], fi["mtime"], fi["duration"]) for fi in all_files))
+		saved, procs, skipt, errod = run_files(all_files, fl_nmb)
 
-	# Process files (parallel or sequential)
-	if WORK_PARALLEL and fl_nmb > 0 and MAX_WORKERS >= 1:
-		with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
-			futures = {
-				ex.submit(process_file, fi, i+1, fl_nmb, f"T{(i%MAX_WORKERS)+1}"): fi 
-				for i, fi in enumerate(all_files)
-			}
-			for f in as_completed(futures):
-				s, p, sk, e = f.result()
-				saved += s
-				procs += p
-				skipt += sk
-				errod += e
-				
-				# Summary for Parallel (Thread-safe print)
-				lbl = "Lost" if saved < 0 else "Saved"
-				safe_print(f"  |To_do: {fl_nmb-(procs+skipt+errod)}|OK: {procs}|Errors: {errod}|Skipt: {skipt}|{lbl}: {hm_sz(saved)} |")
-	else:
-		for i, each in enumerate(all_files):
-			s, p, sk, e = process_file(each, i+1, fl_nmb, "T1")
-			saved += s
-			procs += p
-			skipt += sk
-			errod += e
-			
-			# Summary for Sequential
-			lbl = "Lost" if saved < 0 else "Saved"
-			safe_print(f"  |To_do: {fl_nmb-(procs+skipt+errod)}|OK: {procs}|Errors: {errod}|Skipt: {skipt}|{lbl}: {hm_sz(saved)} |")
+	deferred = _take_deferred()
+	if deferred and not _draining():
+		print(f"\n📊 Deferred low-gain file(s) (predicted saving below {PREDICT_MIN_KB_PER_CPU_S} KB/CPU-s): {len(deferred)}\n")
+		totals = run_files(deferred, len(deferred), predict=False)
+		saved, procs, skipt, errod = (x + y for x, y in zip((saved, procs, skipt, errod), totals))
+	if PREDICT_ENCODES and (acc := Predict.accuracy()):
+		print(f"   {acc}")
+	if win:
+		print(f"   {win.summary()}")
+
+	Control.close_control()
+	if summary := Staging.close_staging():
+		print(f"   {summary}")
+	if _META_CACHE is not None:
+		_META_CACHE.close()
+	if store is not None:
+		store.finish_run(run_id, {"saved": saved, "procs": procs, "skipt": skipt, "errod": errod})
+		print(f"   Job store: run {run_id}: {store.counts(run_id)}")
+		store.close()
+		Job_store.STORE = None
 
 	print(f"\n-Main Done: [{time.strftime('%H:%M:%S')}] Processed:{procs} Skipped:{skipt} Errors:{errod}")
 	if PAUSE_ON_EXIT:
@@ -35,6 +35,7 @@ WORK_DIR.mkdir(parents=True, exist_ok=True)
 RUN_TOKEN = "".join(random.choices(string.ascii_lowercase + string.digits, k=4))
 RUN_TMP = WORK_DIR / f"__N_tmp_{RUN_TOKEN}"
 RUN_TMP.mkdir(parents=True, exist_ok=True)
+SRC_TMP_NAME = f".__N_tmp_{RUN_TOKEN}"		# This run's hidden temp dir on each source filesystem (FFMpeg.temp_output)
 
 def _cleanup_run_tmp() -> None:
 	try:
@@ -76,6 +77,8 @@ AUTO_SIZE_GUARD         = True      # Enable checks to prevent excessive file si
 INFLATE_MAX_BY          = 35        # %: Reject if output grows by more than this percentage (if AUTO_SIZE_GUARD=True)
 MAX_ABS_GROW_MB         = None      # MB: Reject if output grows by more than this absolute size (None=disabled)
 FORCE_BIGGER            = False     # If True, bypass "Too Large" guards (useful for specific quality targets)
+SIZE_GUARD_MIN_PCT      = 10        # %: Live size projection only counts after this much of the encode
+SIZE_GUARD_WINDOW       = 20        # Progress samples (0.5 s each) the projection must stay above the limit before it aborts
 
 # Intelligent "Too Small" Check Thresholds (Used in clean_up)
 MIN_SIZE_RATIO_FLOOR    = 0.05      # Absolute minimum allowed size ratio (e.g., 0.05% of original)
@@ -90,6 +93,54 @@ SCAN_PARALLEL           = True      # Use threads for scanning/probing files
 MAX_SCAN_WORKRS         = max(1, int(CPU_COUNT * 0.7))  # Max threads for scanning
 WORK_PARALLEL           = False     # Use threads for processing files (Set to True for parallel encodes)
 MAX_WORKERS             = max(1, int(CPU_COUNT * 0.6))  # Max threads for processing (if WORK_PARALLEL=True)
+ENCODE_CPU_BUDGET       = True      # Parallel encodes share ENCODE_CPUS threads: each gets -threads / x265 pools sized to its resolution
+ENCODE_CPUS             = CPU_COUNT # Threads all concurrent encodes may use together (limits how many run at once)
+CHUNK_ENCODE            = False     # Long files: split the video at keyframes, encode the chunks in parallel, join (checked; falls back to one encode)
+CHUNK_MIN_DURATION_S    = 3600      # Chunked encode: only files at least this long (seconds)
+CHUNK_SECONDS           = 600       # Chunked encode: target chunk length (cuts move to the next keyframe)
+CHUNK_WORKERS           = max(1, CPU_COUNT // 8)        # Chunked encode: chunks encoded at once
+RESUME_ENCODES          = False     # Long encodes run as checkpointed chunks in RESUME_DIR: a rerun after a crash / kill continues (opt-in: per-chunk 2-pass, joined by a stream copy)
+RESUME_MIN_DURATION_S   = 3600      # Resumable encode: only files at least this long (seconds)
+RESUME_KEEP_DAYS        = 14        # Resume dirs of abandoned jobs are deleted after this many days
+RESUME_DIR              = WORK_DIR / "__resume"         # Persistent (not RUN_TMP): survives restarts
+PREDICT_ENCODES         = False     # Encode a few short samples first and skip / defer files with a poor saving per CPU-second
+PREDICT_SAMPLES         = 3         # Predictor: samples per file (encoded in parallel, spread over the file)
+PREDICT_SAMPLE_S        = 10        # Predictor: seconds per sample
+PREDICT_MIN_DURATION_S  = 300       # Predictor: only files at least this long (seconds)
+PREDICT_MIN_KB_PER_CPU_S = 16       # Predictor: KB saved per CPU-second below which a file isn't worth it
+PREDICT_ACTION          = "defer"   # Predictor: "skip" low-gain files, or "defer" them to the end of the run
+PREDICT_LOG             = WORK_DIR / "predictions.jsonl"  # Predictions next to the real results (accuracy tracking)
+JOB_ORDER               = "size"    # "size": sort_keys_cfg order; "gain": expected bytes saved per CPU-second first, remux / audio-only fast lane on top
+DEADLINE_DRAIN_S        = 300       # --until / --budget: no new job starts this many seconds before the deadline
+DEADLINE_SAFETY         = 1.2       # --until / --budget: a job is started only if predicted time x this fits the window
+DEADLINE_BEHIND         = 1.5       # --until / --budget: queue needing this x the time left counts as far behind
+DEADLINE_FAST_PRESET    = "fast"    # --until / --budget: x265 preset used while far behind (None = keep the planned one)
+SPEED_HISTORY           = WORK_DIR / "encode_speed.json"  # Measured encode speed per encoder / preset / resolution
+JOB_STORE               = True      # Trans_code: job states, swap journal and SRIK in a SQLite job store (crash-safe, resumable)
+JOB_DB                  = WORK_DIR / "jobs.db"          # Job store file (persistent, not RUN_TMP)
+RESUME_QUEUE            = True      # Job store: a run that was interrupted is resumed from its queue (no rescan)
+SKIP_TAG_IN_PLACE       = True      # Compliant MP4s that only lack SKIP_KEY get it written into the file's moov (Mp4_tag), not a full rewrite
+SKIP_TAG_KEEP_FASTSTART = True      # In-place tag: a faststart MP4 with no free space after moov is marked in the scan cache instead (False: moov moves to the end)
+REMUX_LANE              = True      # Copy-only plans run in their own I/O-bound lane next to the encodes, not queued behind them
+REMUX_WORKERS           = 4         # Remux lane: ffmpeg remuxes at once (disk bound, apart from the encode workers)
+REMUX_BATCH             = 8         # Remux lane: most files one ffmpeg run remuxes (batches form while every remux worker is busy)
+REMUX_BATCH_MB          = 2048      # Remux lane: files batched together up to this total size; bigger files run alone
+OUTPUT_LAYOUT           = "reserve" # MP4 outputs: "reserve" (moov space reserved up front with -moov_size: one write, moov first), "faststart" (moov moved to the front after the encode: the whole file written twice), "fragmented" (fMP4: one write, for streaming consumers), "end" (moov last)
+MOOV_RESERVE_MARGIN     = 1.1       # OUTPUT_LAYOUT "reserve": the moov is sized for this x the source duration
+TEMP_NEAR_SOURCE        = True      # Encode / remux outputs are written on the source's filesystem (hidden per-run dir), so the swap is a rename, not a copy
+TEMP_FREE_RESERVE_MB    = 1024      # Temp next to the source: free space left over besides the output's worst-case size, else RUN_TMP is used
+STAGING                 = False     # Trans_code: copy the next queued sources from slow storage (STAGING_FROM) to a local scratch disk while the current jobs encode; encodes read the copy
+STAGING_DIR             = WORK_DIR / "__stage"          # Staging: scratch dir on a local SSD (a per-run subdir, removed at the end)
+STAGING_BUDGET_GB       = 100       # Staging: most GB of staged copies at once (finished ones are evicted least recently used first)
+STAGING_AHEAD           = 2         # Staging: copies made ahead of their job (besides the ones encoding)
+STAGING_FROM            = ("net",)  # Staging: device kinds whose files are staged (Scheduler.device_kind: net, hdd, ssd, unknown)
+CONTROL_CHANNEL         = True      # Trans_code: watch CONTROL_FILE for drain / pause / resume / workers N / bump PATH
+CONTROL_FILE            = WORK_DIR / "trans_code.ctl"   # Control channel commands, one per line (python Control.py ...)
+CONTROL_POLL_S          = 1.0       # Control channel: seconds between looks at CONTROL_FILE
+MAX_WORKERS_CAP         = max(MAX_WORKERS, CPU_COUNT)   # Control channel: most workers "workers N" may set
+PIPELINE                = False     # Trans_code: scan -> plan -> encode -> verify -> clean_up as concurrent stages (encodes start during the scan; files go in scan order, not sorted)
+PIPE_QUEUE_DEPTH        = 4         # Pipeline: items waiting in each stage queue before the stage before it blocks
+PIPE_STATS_S            = 60        # Pipeline: seconds between stage stats reports (0 = only at the end)
 
 # --- File Lock Retry Logic (Windows) ---
 RENAME_ATTEMPTS         = 6         # How many times to retry file rename/move on lock error
@@ -120,6 +171,20 @@ ADDITIONAL_PRESET                   = "fast"    # Preset for speed_up video re-e
 ALLOW_GROWTH_SAME_RES_PCT           = 33.0
 
 CHECK_CORRUPTION            = False  # Enable slower, more thorough corruption check during scan
+
+# --- Scan Cache ---
+SCAN_CACHE_ENGINE       = "sqlite"  # "sqlite" (indexed, incremental commits) or "json" (legacy scan_cache.json)
+SCAN_CACHE_BATCH        = 200       # Probe results per SQLite commit while a scan runs
+PROBE_FAIL_RETRY_H      = 7 * 24    # Hours before an unchanged file that failed to probe is tried again (None = never)
+SCAN_DIR_MANIFEST       = "stat"    # Reuse unchanged folders: "stat" (no listing, files re-stat'ed), "mtime" (dir stat only: misses files rewritten in place), "listing" (also compare names), None = off
+SCAN_WALK_WORKERS       = 8         # Concurrent directory listings while walking (helps NAS/SMB latency; 1 = serial)
+PROBE_LOCALITY          = True      # Probe in on-disk order (per-device queues sorted by inode / folder)
+PROBE_HDD_LANES         = 2         # Concurrent probes per spinning disk (SSD / network mounts use MAX_SCAN_WORKRS)
+PROBE_ROTATIONAL        = None      # None = detect per device (Linux sysfs), True / False = treat every device as HDD / SSD
+PROBE_NATIVE            = True      # Parse MP4 / Matroska headers in-process; ffprobe only for what that parser can't handle
+PROBE_TIERED            = True      # ffprobe: shallow pass (small probesize, planner fields only) for MP4 / Matroska, deep pass when needed
+SCALE_MODE              = False     # Trans_code: compact file table, metadata reloaded from the scan cache when planned (1M+ files)
+MAX_PROBE_INFLIGHT      = 1024      # Scale mode: probe jobs queued at once (bounds pending futures / results)
 IS_WIN                      = platform.system() == "Windows"
 CREATE_NEW_PROCESS_GROUP    = 0x00000200 if IS_WIN else 0
 
@@ -12,6 +12,8 @@ from pathlib import Path
 from babelfish import Language
 from subliminal.exceptions import GuessingError
 
+import Media_walk
+
 # -------------------------------------------------------------------
 # CONFIGURATION - EDIT THESE VALUES
 # -------------------------------------------------------------------
@@ -20,6 +22,8 @@ Scan_Dirs = [r"F:\Media\TV"]
 
 LANGUAGES_TO_FIND = ['eng', 'rom', 'fra', 'heb']
 
+WALK_WORKERS = 8  # Concurrent directory listings while scanning (network shares)
+
 EXCLUDE_KEYWORDS = [
 	'interview', 'making of', 'extra', 'blooper', 'deleted scene',
 	'alternate take', 'anatomy of', 'teaser', 'trailer', 'featurette',
@@ -82,35 +86,36 @@ def filter_and_scan_videos(root_dirs: list[str]) -> list:
 		if not root_dir.is_dir():
 			print(f"\nWARNING: Directory not found, skipping: {root_dir_str}")
 			continue
-		for root, _, files in os.walk(root_dir):
-			total_files += len(files)
-			spinner_char = spinner_chars[i % len(spinner_chars)]
-			relative_path = str(Path(root).relative_to(root_dir.parent))
-			prefix = f' {spinner_char} Scanning: .\\'
-			max_path_len = terminal_width - len(prefix) - 1
-			if len(relative_path) > max_path_len:
-				relative_path = "..." + relative_path[-(max_path_len - 3):]
-			line_content = f'{prefix}{relative_path}'
-			sys.stdout.write(' ' * (terminal_width - 1) + '\r')
-			sys.stdout.write(f'{line_content}\r')
-			sys.stdout.flush()
-			i += 1
-			for filename in files:
-				file_path = Path(root) / filename
-				if file_path.suffix.lower() in video_extensions:
-					filename_lower = filename.lower()
-					if any(keyword in filename_lower for keyword in EXCLUDE_KEYWORDS):
-						skipped_count += 1
-						continue
-					try:
-						video = subliminal.Video.fromname(str(file_path))
-						video_objects.append(video)
-					except (GuessingError, OSError):
-						skipped_count += 1
-						pass
+		last_dir = None
+		for entry in Media_walk.walk_media(str(root_dir), video_extensions, workers=WALK_WORKERS, sort=True):
+			total_files += 1
+			root = os.path.dirname(entry.path)
+			if root != last_dir:
+				last_dir = root
+				spinner_char = spinner_chars[i % len(spinner_chars)]
+				relative_path = str(Path(root).relative_to(root_dir.parent))
+				prefix = f' {spinner_char} Scanning: .\\'
+				max_path_len = terminal_width - len(prefix) - 1
+				if len(relative_path) > max_path_len:
+					relative_path = "..." + relative_path[-(max_path_len - 3):]
+				line_content = f'{prefix}{relative_path}'
+				sys.stdout.write(' ' * (terminal_width - 1) + '\r')
+				sys.stdout.write(f'{line_content}\r')
+				sys.stdout.flush()
+				i += 1
+			filename_lower = entry.name.lower()
+			if any(keyword in filename_lower for keyword in EXCLUDE_KEYWORDS):
+				skipped_count += 1
+				continue
+			try:
+				video = subliminal.Video.fromname(entry.path)
+				video_objects.append(video)
+			except (GuessingError, OSError):
+				skipped_count += 1
+				pass
 	print(' ' * (terminal_width - 1) + '\r')
 	print("Scan complete.")
-	print(f"Found {total_files} total files, skipped {skipped_count} (extras/unparsable).")
+	print(f"Found {total_files} video files, skipped {skipped_count} (extras/unparsable).")
 	print(f"Ready to process {len(video_objects)} standard movies/episodes.\n")
 	return video_objects
 
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""Shared test setup: the repo modules import from the repo root, with WORK_DIR in a throwaway dir."""
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("ONE_TRANS_WORK_DIR", tempfile.mkdtemp(prefix="trans_code_tests_"))	# Before Utils is imported
+
+FFMPEG = shutil.which("ffmpeg")
+needs_ffmpeg = pytest.mark.skipif(FFMPEG is None, reason="ffmpeg not installed")
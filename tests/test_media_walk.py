@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Directory manifests (Media_walk): unchanged folders skip the listing, files rewritten in place are still seen."""
+import os
+
+def _rewrite_in_place(path, data: bytes) -> None:
+	d_mtime = os.stat(os.path.dirname(path)).st_mtime_ns
+	with open(path, "r+b") as f:		# Same inode, same name: the directory entry doesn't change
+		f.seek(0, os.SEEK_END)
+		f.write(data)
+	st = os.stat(path)
+	os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))		# Coarse-clock filesystems
+	assert os.stat(os.path.dirname(path)).st_mtime_ns == d_mtime
+
+def _walk(root, cache, mode):
+	import Media_walk
+	return {os.path.basename(e.path): e for e in Media_walk.walk_media(str(root), {".mkv"}, cache, mode)}
+
+def test_stat_mode_sees_a_file_rewritten_in_place(tmp_path):
+	import Scan_cache
+	media = tmp_path / "media"
+	media.mkdir()
+	(media / "a.mkv").write_bytes(b"x" * 100)
+	(media / "b.mkv").write_bytes(b"y" * 100)
+	cache = Scan_cache.SqliteScanCache(tmp_path / "cache.db", 1)
+
+	first = _walk(media, cache, "stat")
+	_rewrite_in_place(str(media / "a.mkv"), b"tag" * 10)
+
+	assert _walk(media, cache, "mtime")["a.mkv"].size == 100		# "mtime" trusts the manifest
+	again = _walk(media, cache, "stat")
+	st = os.stat(media / "a.mkv")
+	assert (again["a.mkv"].size, again["a.mkv"].mtime_ns) == (st.st_size, st.st_mtime_ns)
+	assert again["b.mkv"] == first["b.mkv"]
+	assert _walk(media, cache, "mtime")["a.mkv"].size == st.st_size		# The re-stat was saved
+	cache.close()
+
+def test_stat_mode_drops_a_vanished_file(tmp_path):
+	import Scan_cache
+	media = tmp_path / "media"
+	media.mkdir()
+	(media / "a.mkv").write_bytes(b"x" * 100)
+	cache = Scan_cache.SqliteScanCache(tmp_path / "cache.db", 1)
+	_walk(media, cache, "stat")
+	m = cache.dir_get(str(media))
+	m["files"].append(["gone.mkv", 1, 1, 1, 1])		# Listed, but no longer on disk
+	cache.dir_put(str(media), m)
+	assert set(_walk(media, cache, "stat")) == {"a.mkv"}
+	cache.close()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""In-place MP4 comment edit (Mp4_tag) on ffmpeg-made files: box layout, what ffmpeg reads back, crash safety."""
+import os
+import shutil
+import struct
+import subprocess as sp
+
+import pytest
+
+from conftest import FFMPEG, needs_ffmpeg
+
+import Mp4_tag
+
+NEW = "Trans_code: already compliant"
+
+def _make(path, *args) -> str:
+	sp.run([FFMPEG, "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=size=160x120:rate=10", "-t", "1",
+			"-c:v", "mpeg4", "-metadata", "comment=old", *args, str(path)], check=True)
+	return str(path)
+
+def _layout(path):
+	with open(path, "rb") as f:
+		return [k.decode() for k, _, _, _ in Mp4_tag._read_boxes(f, 0, os.path.getsize(path))]
+
+def _ffmpeg_comment(path):
+	"""The comment as ffmpeg reads it (None if it can't read the file)."""
+	p = sp.run([FFMPEG, "-v", "error", "-i", path, "-f", "ffmetadata", "-"], capture_output=True, text=True)
+	if p.returncode != 0:
+		return None
+	return next((l.split("=", 1)[1] for l in p.stdout.splitlines() if l.startswith("comment=")), "")
+
+def _decodes(path) -> bool:
+	p = sp.run([FFMPEG, "-v", "error", "-i", path, "-f", "null", "-"], capture_output=True, text=True)
+	return p.returncode == 0 and not p.stderr.strip()
+
+@needs_ffmpeg
+def test_moov_at_end_is_appended_and_the_old_one_retired(tmp_path):
+	path = _make(tmp_path / "a.mp4")
+	assert _layout(path)[-2:] == ["mdat", "moov"]
+	how, _ = Mp4_tag.set_comment(path, NEW)
+	assert how == "tail"
+	assert _layout(path)[-3:] == ["mdat", "free", "moov"]
+	assert Mp4_tag.read_comment(path) == NEW == _ffmpeg_comment(path)
+	assert _decodes(path)
+
+@needs_ffmpeg
+def test_reserved_moov_is_rewritten_in_its_room(tmp_path):
+	path = _make(tmp_path / "a.mp4", "-moov_size", "65536")
+	size, before = os.path.getsize(path), _layout(path)
+	assert before[:3] == ["ftyp", "moov", "free"]
+	how, _ = Mp4_tag.set_comment(path, NEW)
+	assert how == "free"
+	assert os.path.getsize(path) == size		# The appended copy is cut off again
+	assert _layout(path)[:3] == ["ftyp", "moov", "free"] and _layout(path).index("mdat") > 1		# Still faststart
+	assert Mp4_tag.read_comment(path) == NEW == _ffmpeg_comment(path)
+	assert _decodes(path)
+
+@needs_ffmpeg
+def test_faststart_without_room_is_refused_unless_allowed(tmp_path):
+	path = _make(tmp_path / "a.mp4", "-movflags", "+faststart")
+	data = open(path, "rb").read()
+	with pytest.raises(Mp4_tag.TagError):
+		Mp4_tag.set_comment(path, NEW * 4)
+	assert open(path, "rb").read() == data		# Refused before any write
+	how, _ = Mp4_tag.set_comment(path, NEW * 4, keep_faststart=False)
+	assert how == "tail" and _layout(path)[-1] == "moov"
+	assert _ffmpeg_comment(path) == NEW * 4
+
+@needs_ffmpeg
+def test_iso_meta_comment_is_replaced_not_duplicated(tmp_path):
+	path = _make(tmp_path / "a.mp4")
+	Mp4_tag.set_comment(path, NEW)
+	with open(path, "rb") as f:
+		moov = Mp4_tag._load_moov(f, os.path.getsize(path))[1]
+	udta, = [b for k, b in Mp4_tag._children(moov, 8) if k == b"udta"]
+	meta, = [b for k, b in Mp4_tag._children(udta, 8) if k == b"meta"]
+	assert meta[8:12] == bytes(4)		# ISO full box: version / flags kept
+	ilst, = [b for k, b in Mp4_tag._children(meta, 12) if k == b"ilst"]
+	assert [k for k, _ in Mp4_tag._children(ilst, 8)].count(Mp4_tag.CMT) == 1
+
+@needs_ffmpeg
+def test_quicktime_udta_comment_gives_way_to_the_new_one(tmp_path):
+	path = _make(tmp_path / "a.mov")
+	assert Mp4_tag.read_comment(path) is None and _ffmpeg_comment(path) == "old"		# udta/©cmt, no ilst
+	Mp4_tag.set_comment(path, NEW)
+	assert Mp4_tag.read_comment(path) == NEW == _ffmpeg_comment(path)
+	with open(path, "rb") as f:
+		moov = Mp4_tag._load_moov(f, os.path.getsize(path))[1]
+	udta, = [b for k, b in Mp4_tag._children(moov, 8) if k == b"udta"]
+	assert Mp4_tag.CMT not in [k for k, _ in Mp4_tag._children(udta, 8)]
+
+def test_quicktime_style_meta_keeps_its_layout():
+	box = Mp4_tag._box
+	hdlr = box(b"hdlr", bytes(8) + b"mdirappl" + bytes(9))
+	item = box(Mp4_tag.CMT, box(b"data", struct.pack(">II", 1, 0) + b"old"))
+	meta = box(b"meta", hdlr + box(b"ilst", item))		# QuickTime: no version / flags field
+	moov = box(b"moov", box(b"mvhd", bytes(100)) + box(b"udta", meta))
+	out = Mp4_tag.with_comment(moov, NEW)
+	udta, = [b for k, b in Mp4_tag._children(out, 8) if k == b"udta"]
+	meta, = [b for k, b in Mp4_tag._children(udta, 8) if k == b"meta"]
+	assert meta[12:16] == b"hdlr"
+	ilst, = [b for k, b in Mp4_tag._children(meta, 8) if k == b"ilst"]
+	(kind, item), = Mp4_tag._children(ilst, 8)
+	assert kind == Mp4_tag.CMT and item.endswith(NEW.encode())
+
+@needs_ffmpeg
+@pytest.mark.parametrize("layout", [(), ("-moov_size", "65536")], ids=["moov-at-end", "reserved"])
+def test_a_crash_between_writes_leaves_a_valid_file(tmp_path, monkeypatch, layout):
+	src = _make(tmp_path / "src.mp4", *layout)
+	syncs = []
+	monkeypatch.setattr(Mp4_tag, "_sync", lambda f: syncs.append(1) or (f.flush(), os.fsync(f.fileno())))
+	Mp4_tag.set_comment(shutil.copy(src, tmp_path / "count.mp4"), NEW)
+	n_syncs = len(syncs)
+	assert n_syncs >= 2
+
+	for n in range(n_syncs):
+		path = shutil.copy(src, tmp_path / f"crash{n}.mp4")
+		calls = []
+		def crash(f, n=n, calls=calls):
+			if len(calls) == n:
+				raise OSError("power cut")
+			calls.append(1)
+			f.flush()
+		monkeypatch.setattr(Mp4_tag, "_sync", crash)
+		with pytest.raises(OSError):
+			Mp4_tag.set_comment(path, NEW)
+		assert _ffmpeg_comment(path) in ("old", NEW), f"unreadable after {n} sync(s)"
+		assert Mp4_tag.read_comment(path) in ("old", NEW)
+		assert _decodes(path)
+
+@needs_ffmpeg
+@pytest.mark.parametrize("layout", [(), ("-moov_size", "65536")], ids=["moov-at-end", "reserved"])
+def test_a_torn_write_leaves_a_playable_file(tmp_path, monkeypatch, layout):
+	src = _make(tmp_path / "src.mp4", *layout)
+	put = Mp4_tag._put
+	big = []
+	monkeypatch.setattr(Mp4_tag, "_put", lambda f, off, data: big.append(len(data) > 8) or put(f, off, data))
+	Mp4_tag.set_comment(shutil.copy(src, tmp_path / "count.mp4"), NEW)
+	torn_at = [i for i, b in enumerate(big) if b]		# Box headers (8 bytes) are single-sector writes
+
+	for n in torn_at:
+		path = shutil.copy(src, tmp_path / f"torn{n}.mp4")
+		calls = []
+		def torn(f, off, data, n=n, calls=calls):
+			if len(calls) == n:
+				put(f, off, data[:len(data) // 2])
+				raise OSError("power cut")
+			calls.append(1)
+			return put(f, off, data)
+		monkeypatch.setattr(Mp4_tag, "_put", torn)
+		with pytest.raises(OSError):
+			Mp4_tag.set_comment(path, NEW)
+		assert _ffmpeg_comment(path) in ("old", NEW), f"unreadable after write {n} was torn"
+		assert _decodes(path)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Control-channel pause (FFMpeg.ChildProcessManager): only pausable processes freeze, none escapes it."""
+import sys
+import time
+import threading
+
+import pytest
+
+psutil = pytest.importorskip("psutil")
+pytest.importorskip("charset_normalizer")
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="SIGSTOP / process groups")
+
+SLEEP = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+def _stopped(proc) -> bool:
+	for _ in range(50):
+		if psutil.Process(proc.pid).status() == psutil.STATUS_STOPPED:
+			return True
+		time.sleep(0.02)
+	return False
+
+@pytest.fixture
+def mgr():
+	import os
+	import FFMpeg
+	m = FFMpeg.ChildProcessManager()
+	yield m, (lambda pausable: m.start(SLEEP, pausable, preexec_fn=os.setsid))
+	m.resume()
+	m.terminate_all()
+
+def test_pause_freezes_encodes_but_not_probes(mgr):
+	m, start = mgr
+	encode, probe = start(True), start(False)
+	assert m.pause() == 1
+	assert _stopped(encode)
+	assert not _stopped(probe)
+	m.resume()
+	assert psutil.Process(encode.pid).status() != psutil.STATUS_STOPPED
+
+def test_process_started_while_paused_waits_for_resume(mgr):
+	m, start = mgr
+	m.pause()
+	started = []
+	t = threading.Thread(target=lambda: started.append(start(True)), daemon=True)
+	t.start()
+	t.join(0.3)
+	assert not started
+	assert start(False) is not None		# A probe doesn't wait
+	m.resume()
+	t.join(5)
+	assert started
+
+def test_paused_time_is_counted(mgr):
+	m, _ = mgr
+	p0 = m.paused_s()
+	m.pause()
+	time.sleep(0.2)
+	assert m.paused_s() - p0 >= 0.2		# A running pause counts
+	m.resume()
+	p1 = m.paused_s()
+	time.sleep(0.1)
+	assert m.paused_s() == p1
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""In-process probe (Probe_native) against ffprobe on ffmpeg-made files: same planner fields, or a fallback."""
+import re
+import json
+import shutil
+import subprocess as sp
+
+import pytest
+
+from conftest import FFMPEG, needs_ffmpeg
+
+import Probe_native
+
+FFPROBE = shutil.which("ffprobe")
+LAVFI_V = ["-f", "lavfi", "-i", "testsrc2=size=160x120:rate=25"]
+LAVFI_A = ["-f", "lavfi", "-i", "sine=r=48000"]
+ORDERS  = {"top coded first": "tb", "bottom coded first": "bt", "top first": "tt", "bottom first": "bb"}
+
+def _has_encoders(*names) -> bool:
+	out = sp.run([FFMPEG, "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+	return all(re.search(rf"^ \S+ {re.escape(n)} ", out, re.M) for n in names)
+
+def _interlaced(order):
+	return order if order in ("tt", "bb", "tb", "bt") else None		# What FFMpeg.parse_video acts on
+
+def _planner_view(streams, duration):
+	"""The fields parse_finfo reads, normalised for comparison."""
+	out = []
+	for s in streams:
+		v = {"type": s.get("codec_type"), "codec": s.get("codec_name"), "language": (s.get("tags") or {}).get("language")}
+		if v["type"] == "video":
+			v.update(size=(int(s["width"]), int(s["height"])), pix_fmt=s.get("pix_fmt"),
+					 interlaced=_interlaced(s.get("field_order")))
+		elif v["type"] == "audio":
+			v.update(sample_rate=int(s["sample_rate"]), channels=int(s["channels"]))
+		out.append(v)
+	return out, round(float(duration), 1)
+
+def _reference(path):
+	"""ffprobe's view of the file; with no ffprobe binary, what ffmpeg prints for the input."""
+	if FFPROBE:
+		data = json.loads(sp.run([FFPROBE, "-v", "error", "-show_streams", "-show_format", "-of", "json", path],
+								 capture_output=True, text=True, check=True).stdout)
+		return _planner_view(data["streams"], data["format"]["duration"])
+	log = sp.run([FFMPEG, "-hide_banner", "-i", path], capture_output=True, text=True).stderr
+	h, m, sec = re.search(r"Duration: (\d+):(\d+):([\d.]+)", log).groups()
+	streams = []
+	for lang, kind, codec, rest in re.findall(r"Stream #0:\d+(?:\[\w+\])?(?:\((.{3})\))?: (\w+): (\w+)(.*)", log):
+		s = {"codec_type": kind.lower(), "codec_name": codec, "tags": {"language": lang} if lang else {}}
+		if kind == "Video":
+			s["pix_fmt"] = re.search(r", ((?:yuv|gray|nv|p01)\w*)", rest).group(1)
+			s["width"], s["height"] = re.search(r", (\d+)x(\d+)", rest).groups()
+			s["field_order"] = next((o for k, o in ORDERS.items() if k in rest), None)
+		elif kind == "Audio":
+			s["sample_rate"], layout = re.search(r"(\d+) Hz, ([^,]+)", rest).groups()
+			named = {"mono": 1, "stereo": 2, "quad": 4, "5.1": 6, "5.1(side)": 6, "7.1": 8}
+			s["channels"] = named.get(layout) or int(layout.split()[0])
+		streams.append(s)
+	return _planner_view(streams, int(h) * 3600 + int(m) * 60 + float(sec))
+
+def _native(path):
+	data = Probe_native.probe(path)
+	return data and _planner_view(data["streams"], data["format"]["duration"])
+
+CASES = {
+	"mp4-h264-aac": ("mp4", ("libx264", "aac"), LAVFI_V + LAVFI_A + ["-c:v", "libx264", "-c:a", "aac", "-ac", "2",
+					 "-metadata:s:a", "language=eng"]),
+	"mp4-hevc10-ac3": ("mp4", ("libx265", "ac3"), LAVFI_V + LAVFI_A + ["-c:v", "libx265", "-pix_fmt", "yuv420p10le",
+					   "-c:a", "ac3", "-ac", "6"]),
+	"mp4-aac-low-rate": ("mp4", ("aac",), LAVFI_A + ["-c:a", "aac", "-ar", "22050", "-ac", "1"]),		# Sync extension: no SBR
+	"mkv-vp8-opus-srt": ("mkv", ("libvpx", "libopus"), LAVFI_V + LAVFI_A + ["-i", "{srt}", "-map", "0", "-map", "1",
+						 "-map", "2", "-c:v", "libvpx", "-c:a", "libopus", "-c:s", "srt", "-metadata:s:a", "language=fra",
+						 "-metadata:s:s", "language=ger"]),
+	"mkv-h264-mp3": ("mkv", ("libx264", "libmp3lame"), LAVFI_V + LAVFI_A + ["-c:v", "libx264", "-c:a", "libmp3lame"]),
+	"mkv-aac": ("mkv", ("aac",), LAVFI_A + ["-c:a", "aac", "-ac", "2"]),
+	"mov-mac-language": ("mov", ("mpeg4",), LAVFI_V + ["-c:v", "mpeg4", "-metadata:s:v", "language=jpn"]),		# mdhd code 11
+	"mov-english": ("mov", ("mpeg4",), LAVFI_V + ["-c:v", "mpeg4", "-metadata:s:v", "language=eng"]),		# mdhd code 0
+	"mov-no-language": ("mov", ("mpeg4",), LAVFI_V + ["-c:v", "mpeg4"]),		# mdhd 0x7fff
+	**{f"mkv-mpeg2-{o}": ("mkv", ("mpeg2video",), LAVFI_V + ["-c:v", "mpeg2video", "-flags", "+ildct+ilme", "-field_order", o])
+	   for o in ("tt", "bb", "tb", "bt", "progressive")},
+}
+
+@needs_ffmpeg
+@pytest.mark.parametrize("name", list(CASES))
+def test_native_probe_matches_ffprobe(tmp_path, name):
+	ext, encoders, args = CASES[name]
+	if not _has_encoders(*encoders):
+		pytest.skip(f"ffmpeg built without {', '.join(encoders)}")
+	srt = tmp_path / "s.srt"
+	srt.write_text("1\n00:00:00,000 --> 00:00:00,500\nHallo\n")
+	path = str(tmp_path / f"{name}.{ext}")
+	sp.run([FFMPEG, "-v", "error", "-y", *[a.format(srt=srt) for a in args], "-t", "1", path], check=True)
+	native = _native(path)
+	assert native is not None, "fell back to ffprobe"
+	assert native == _reference(path)
+
+@needs_ffmpeg
+def test_interlaced_h264_without_container_flags_falls_back(tmp_path):
+	if not _has_encoders("libx264"):
+		pytest.skip("ffmpeg built without libx264")
+	path = str(tmp_path / "i.mp4")
+	sp.run([FFMPEG, "-v", "error", "-y", *LAVFI_V, "-t", "1", "-c:v", "libx264", "-x264-params", "interlaced=1:tff=1", path],
+		   check=True)
+	assert _reference(path)[0][0]["interlaced"] == "tt"		# Only the frames say so
+	assert Probe_native.probe(path) is None
+
+def _asc(bits: str) -> bytes:
+	bits = bits.replace(" ", "")
+	bits += "0" * (-len(bits) % 8)
+	return int(bits, 2).to_bytes(len(bits) // 8, "big")
+
+# AudioSpecificConfigs patched into an ffmpeg-made MP4: (channels, rate) as ffmpeg reported them
+@pytest.mark.parametrize("asc, expected", [
+	(_asc("00010 0011 0010 000"), (2, 48000)),									# LC
+	(_asc("00010 0111 0001 000 01010110111 00101 0"), (1, 22050)),				# LC, sync extension: no SBR
+	(_asc("00010 0111 0001 000 01010110111 00101 1 0100"), (2, 44100)),		# LC, sync extension: SBR (mono -> PS)
+	(_asc("00101 0111 0001 0100 00010 000"), (2, 44100)),						# HE-AAC, mono core
+	(_asc("00101 0111 0010 0100 00010 000"), (2, 44100)),						# HE-AAC
+	(_asc("11101 0111 0001 0100 00010 000"), (2, 44100)),						# HE-AAC v2 (PS)
+], ids=["lc", "lc-no-sbr", "lc-sync-sbr", "he-mono", "he-stereo", "he-v2"])
+def test_aac_config_gives_the_decoder_output(asc, expected):
+	assert Probe_native._aac_channels(asc) == expected
+
+def test_low_rate_aac_without_sbr_signalling_falls_back():
+	with pytest.raises(Probe_native.Unsupported):
+		Probe_native._aac_channels(_asc("00010 0110 0001 000"))		# 24 kHz: implicit SBR would make it 48 kHz
+
+def _streams_found(path, probesize, analyze_us) -> int:
+	log = sp.run([FFMPEG, "-hide_banner", "-probesize", probesize, "-analyzeduration", analyze_us, "-i", path],
+				 capture_output=True, text=True).stderr
+	return len(re.findall(r"^\s*Stream #0:\d+", log, re.M))
+
+@needs_ffmpeg
+def test_mid_file_stream_skips_the_shallow_tier(tmp_path, monkeypatch):
+	pytest.importorskip("psutil")
+	pytest.importorskip("charset_normalizer")
+	import FFMpeg
+	# MPEG-PS whose audio runs from 8 s to 12 s: past the shallow probesize, and gone again by the tail
+	path = str(tmp_path / "mid.mpg")
+	sp.run([FFMPEG, "-v", "error", "-y", *LAVFI_V, "-itsoffset", "8", "-f", "lavfi", "-i", "sine=d=4", "-t", "22",
+			"-map", "0", "-map", "1", "-c:v", "mpeg2video", "-b:v", "3M", "-maxrate", "3M", "-bufsize", "1M", "-c:a", "mp2",
+			path], check=True)
+	assert _streams_found(path, Probe_native.SHALLOW_PROBESIZE, Probe_native.SHALLOW_ANALYZE_US) == 1
+	assert _streams_found(path, Probe_native.DEEP_PROBESIZE, Probe_native.DEEP_ANALYZE_US) == 2
+
+	mp4 = str(tmp_path / "a.mp4")
+	sp.run([FFMPEG, "-v", "error", "-y", *LAVFI_V, "-t", "1", "-c:v", "mpeg4", mp4], check=True)
+	tiers = []
+	monkeypatch.setattr(FFMpeg, "PROBE_NATIVE", False)
+	monkeypatch.setattr(FFMpeg, "PROBE_TIERED", True)
+	monkeypatch.setattr(FFMpeg, "_ffprobe_tier", lambda exe, f, tier: tiers.append((f, tier)) or (None, "FFprobe failed: test"))
+	FFMpeg.ffprobe_run(path)
+	FFMpeg.ffprobe_run(mp4)
+	assert tiers == [(path, "deep"), (mp4, "shallow"), (mp4, "deep")]
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Resumable chunked encode (Chunk_encode): killed mid-job and rerun, it must match a one-piece encode."""
+import subprocess as sp
+
+from pathlib import Path
+
+import pytest
+
+from conftest import FFMPEG, needs_ffmpeg
+
+pytest.importorskip("psutil")
+pytest.importorskip("charset_normalizer")
+
+def _has_x265() -> bool:
+	out = sp.run([FFMPEG, "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+	return "libx265" in out
+
+@needs_ffmpeg
+def test_killed_encode_resumes_to_the_single_shot_result(tmp_path):
+	if not _has_x265():
+		pytest.skip("ffmpeg built without libx265")
+	import Benchmarks
+
+	# 12 s in 2 s chunks with 1 s GOPs: six chunks, killed once the first one is checkpointed
+	r = Benchmarks.resume_check(tmp_path, 12, 2, kill_after=1, size="160x120", gop=24)
+
+	assert r["killed"], "the encode finished before it could be killed"
+	assert 1 <= r["checkpointed"] < 6
+	assert "already done" in r["resume_log"], r["resume_log"]
+	assert not r["missing"]
+	assert r["frames"]["resumed"] == r["frames"]["single"] == r["frames"]["source"]
+	assert abs(r["durations"]["resumed"] - r["durations"]["single"]) <= 0.1
+	assert r["layouts"]["resumed"] == r["layouts"]["single"]
+
+@needs_ffmpeg
+def test_staged_chunk_encode_reads_the_copy_and_keeps_the_resume_key(tmp_path, monkeypatch):
+	if not _has_x265():
+		pytest.skip("ffmpeg built without libx265")
+	import shutil
+	import FFMpeg
+	import Chunk_encode
+
+	src, staged = tmp_path / "src.mkv", tmp_path / "stage" / "00001_src.mkv"
+	sp.run([FFMPEG, "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=size=160x120:rate=24", "-t", "4",
+			"-c:v", "libx264", "-preset", "ultrafast", "-qp", "0", "-g", "24", str(src)], check=True)
+	staged.parent.mkdir()
+	shutil.copyfile(src, staged)
+	monkeypatch.setattr(Chunk_encode, "RESUME_ENCODES", True)
+	monkeypatch.setattr(Chunk_encode, "CHUNK_ENCODE", False)
+	monkeypatch.setattr(Chunk_encode, "CHUNK_SECONDS", 2)
+
+	reads, keys = [], []
+	split, count, job_dir = Chunk_encode._split, Chunk_encode.count_frames, Chunk_encode.job_dir
+	monkeypatch.setattr(Chunk_encode, "_split", lambda path, *a: reads.append(path) or split(path, *a))
+	monkeypatch.setattr(Chunk_encode, "count_frames", lambda path: reads.append(path) or count(path))
+	monkeypatch.setattr(Chunk_encode, "job_dir", lambda path, cmd: keys.append(cmd) or job_dir(path, cmd))
+
+	meta, _, _ = FFMpeg.ffprobe_run(str(src), FFMpeg.FFPROBE, False, False)
+	cmd, _, _ = FFMpeg.parse_finfo(str(src), meta, False)
+	out = Chunk_encode.chunk_encode(str(src), cmd, meta.duration, False, "T1", local=str(staged))
+	assert out
+	Path(out).unlink()
+	assert str(src) not in reads, "the NAS source was read for the split / frame count"
+	assert keys == [cmd] and str(staged) not in keys[0]
+
+def test_resume_key_ignores_a_preset_swap(tmp_path):
+	import Chunk_encode
+	src = tmp_path / "src.mkv"
+	src.write_bytes(b"\x1a\x45\xdf\xa3" + bytes(range(256)) * 64)
+	cmd = ["ffmpeg", "-i", str(src), "-map", "0:0", "-c:v:0", "libx265", "-preset", "slow", "-crf", "24"]
+	fast = [x if x != "slow" else "veryfast" for x in cmd]
+	other = [x if x != "24" else "26" for x in cmd]
+	assert Chunk_encode.job_dir(str(src), cmd) == Chunk_encode.job_dir(str(src), fast)
+	assert Chunk_encode.job_dir(str(src), cmd) != Chunk_encode.job_dir(str(src), other)
+
+def test_chunk_layout(monkeypatch):
+	import Chunk_encode
+	monkeypatch.setattr(Chunk_encode, "CHUNK_SECONDS", 600)
+	assert Chunk_encode.chunk_times(3600, 1) == [600.0, 1200.0, 1800.0, 2400.0, 3000.0]
+	assert Chunk_encode.chunk_times(1200, 4) == [300.0, 600.0, 900.0]		# More workers than chunk lengths
+	assert Chunk_encode.chunk_times(100, 1) == []
+
+@needs_ffmpeg
+def test_resume_state_from_another_source_starts_over(tmp_path, monkeypatch, capsys):
+	if not _has_x265():
+		pytest.skip("ffmpeg built without libx265")
+	import json
+	import FFMpeg
+	import Chunk_encode
+
+	src = tmp_path / "src.mkv"
+	sp.run([FFMPEG, "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=size=160x120:rate=24", "-t", "4",
+			"-c:v", "libx264", "-preset", "ultrafast", "-qp", "0", "-g", "24", str(src)], check=True)
+	monkeypatch.setattr(Chunk_encode, "RESUME_ENCODES", True)
+	monkeypatch.setattr(Chunk_encode, "CHUNK_SECONDS", 2)
+	meta, _, _ = FFMpeg.ffprobe_run(str(src), FFMpeg.FFPROBE, False, False)
+	cmd, _, _ = FFMpeg.parse_finfo(str(src), meta, False)
+
+	# A stale checkpoint whose frame counts don't match this source's split
+	work = Chunk_encode.job_dir(str(src), cmd)
+	work.mkdir(parents=True)
+	times = Chunk_encode.chunk_times(meta.duration, 1)
+	(work / "manifest.json").write_text(json.dumps({"source": str(src), "times": times, "frames": [1] * (len(times) + 1), "total": len(times) + 1}))
+	(work / "enc_0000.mp4").write_bytes(b"stale")
+	(work / "enc_0000.ok").write_text(json.dumps({"frames": 1}))
+
+	out = Chunk_encode.chunk_encode(str(src), cmd, meta.duration, False, "T1")
+	log = capsys.readouterr().out
+	assert "does not match the source: starting over" in log
+	assert out and Chunk_encode.count_frames(out) == Chunk_encode.count_frames(str(src))
+	Path(out).unlink()
+	assert not work.exists()		# Finished: the resume dir is gone
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""In-place SKIP_KEY tag (Trans_code._tag_in_place): the next scan must find the tagged record."""
+import os
+import subprocess as sp
+
+import pytest
+
+from conftest import FFMPEG, needs_ffmpeg
+
+pytest.importorskip("psutil")
+pytest.importorskip("charset_normalizer")
+
+@needs_ffmpeg
+def test_tagged_file_is_a_cache_hit_on_rescan(tmp_path, monkeypatch):
+	import FFMpeg
+	import Mp4_tag
+	import Scan_cache
+	import Media_walk
+	import Trans_code
+
+	media = tmp_path / "media"
+	media.mkdir()
+	src = media / "a.mp4"
+	sp.run([FFMPEG, "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=size=160x120:rate=10", "-t", "1",
+			"-c:v", "mpeg4", str(src)], check=True)		# moov at the end: tagged by appending
+
+	cache = Scan_cache.SqliteScanCache(tmp_path / "cache.db", 1)
+	monkeypatch.setattr(Trans_code, "_META_CACHE", cache)
+	monkeypatch.setattr(Trans_code, "SCAN_DIR_MANIFEST", "mtime")
+
+	# 1st scan: the walk writes the directory manifest, the probe record goes under the old key
+	entry, = Media_walk.walk_media(str(media), {".mp4"}, cache, "mtime")
+	metadata = {"format": {"size": str(entry.size), "duration": "1.0", "tags": {}}, "streams": []}
+	cache.put(Scan_cache.cache_key(entry.path, entry.size, entry.mtime), Scan_cache.make_record(metadata),
+			  entry.path, entry.size, entry.mtime)
+	fi = {"path": entry.path, "size": entry.size, "mtime": entry.mtime}
+
+	FFMpeg.srik_update(entry.path, plan={"tag_only": True})
+	try:
+		assert Trans_code._tag_in_place(fi, metadata, "T1") == "tagged"
+	finally:
+		FFMpeg.srik_clear(entry.path)
+	assert Mp4_tag.read_comment(entry.path) == Trans_code.SKIP_KEY
+
+	# 2nd scan: the directory's mtime is unchanged, so the walk answers from the manifest
+	st = os.stat(entry.path)
+	again, = Media_walk.walk_media(str(media), {".mp4"}, cache, "mtime")
+	assert (again.size, again.mtime_ns) == (st.st_size, st.st_mtime_ns)
+	hit = cache.get(Scan_cache.cache_key(again.path, again.size, again.mtime))
+	assert hit is not None
+	assert hit["metadata"]["format"]["tags"]["comment"] == Trans_code.SKIP_KEY
+	cache.close()